@@ -0,0 +1,131 @@
+# backend/benchmarks/bench_audio_io.py
+"""
+Microbenchmark: temp-file round trips vs in-memory buffers for the three
+per-turn audio hand-offs (STT upload, local STT input, TTS WAV encode).
+
+Run from backend/:  python -m benchmarks.bench_audio_io [--iterations N] [--dir PATH]
+
+--dir lets you point the temp-file variant at the same disk the container
+uses (e.g. a slow overlay filesystem) instead of the host's /tmp.
+"""
+import io
+import os
+import time
+import wave
+import argparse
+import tempfile
+
+import numpy as np
+
+
+def _utterance_bytes(seconds: float = 4.0) -> bytes:
+    # Roughly what MediaRecorder sends for a few seconds of speech
+    return os.urandom(int(seconds * 16000 * 2))
+
+
+def _tts_samples(seconds: float = 3.0) -> np.ndarray:
+    t = np.arange(int(seconds * 22050)) / 22050
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _encode_wav(target, samples: np.ndarray, sample_rate: int = 22050):
+    """
+    WAV encode with soundfile when installed (what tts_generator uses),
+    falling back to the stdlib wave module.
+    """
+    try:
+        import soundfile as sf
+        sf.write(target, samples, sample_rate, format="WAV")
+    except ImportError:
+        pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+        with wave.open(target, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm.tobytes())
+
+
+# -- STT upload (cloud_stt.speech_to_text) ----------------------------------
+
+def stt_upload_tempfile(audio: bytes, tmp_dir: str):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=tmp_dir) as tmp_file:
+        tmp_file.write(audio)
+        path = tmp_file.name
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.unlink(path)
+
+
+def stt_upload_memory(audio: bytes, tmp_dir: str):
+    return ("audio.wav", audio)
+
+
+# -- Local STT input (audio_processor.transcribe_audio) ---------------------
+
+def local_stt_tempfile(audio: bytes, tmp_dir: str):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm", dir=tmp_dir) as tmp_file:
+        tmp_file.write(audio)
+        path = tmp_file.name
+    with open(path, "rb") as f:
+        f.read()
+    os.unlink(path)
+
+
+def local_stt_memory(audio: bytes, tmp_dir: str):
+    io.BytesIO(audio).read()
+
+
+# -- TTS WAV encode (tts_generator.text_to_speech) --------------------------
+
+def tts_encode_tempfile(samples: np.ndarray, tmp_dir: str):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=tmp_dir) as tmp_file:
+        name = tmp_file.name
+    _encode_wav(name, samples)
+    with open(name, "rb") as f:
+        data = f.read()
+    os.unlink(name)
+    return data
+
+
+def tts_encode_memory(samples: np.ndarray, tmp_dir: str):
+    buffer = io.BytesIO()
+    _encode_wav(buffer, samples)
+    return buffer.getvalue()
+
+
+def _time(func, arg, tmp_dir: str, iterations: int) -> float:
+    func(arg, tmp_dir)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg, tmp_dir)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--dir", default=None, help="directory for the temp-file variant")
+    args = parser.parse_args()
+
+    audio = _utterance_bytes()
+    samples = _tts_samples()
+    cases = [
+        ("STT upload", stt_upload_tempfile, stt_upload_memory, audio),
+        ("local STT input", local_stt_tempfile, local_stt_memory, audio),
+        ("TTS WAV encode", tts_encode_tempfile, tts_encode_memory, samples),
+    ]
+
+    print(f"{'path':<18}{'temp file (us)':>16}{'in memory (us)':>16}{'saved (us)':>12}")
+    total_saved = 0.0
+    for name, with_file, in_memory, arg in cases:
+        file_us = _time(with_file, arg, args.dir, args.iterations)
+        memory_us = _time(in_memory, arg, args.dir, args.iterations)
+        total_saved += file_us - memory_us
+        print(f"{name:<18}{file_us:>16.1f}{memory_us:>16.1f}{file_us - memory_us:>12.1f}")
+    print(f"{'per turn':<18}{'':>16}{'':>16}{total_saved:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# backend/benchmarks/bench_crisis.py
+"""
+Microbenchmark: crisis detection cost vs lexicon size.
+
+Compares the Aho-Corasick detector with the old per-keyword substring scan
+for lexicons of growing size. The detector's time per utterance should
+stay flat as the lexicon grows, while the naive scan grows linearly.
+
+Run from backend/:  python -m benchmarks.bench_crisis [--iterations N]
+"""
+import random
+import string
+import time
+import argparse
+
+from utils.crisis_detector import CrisisDetector, load_lexicon, normalize
+
+UTTERANCE = (
+    "Honestly I've been feeling really overwhelmed at work lately, and my "
+    "sleep has been terrible. I keep thinking about everything I have to do "
+    "and I can't seem to switch off at night, it's exhausting."
+)
+
+
+def _synthetic_lexicon(size: int, seed: int = 7) -> dict:
+    """
+    The real lexicon padded with random multi-word phrases up to size.
+    """
+    rng = random.Random(seed)
+    lexicon = {category: list(phrases) for category, phrases in load_lexicon().items()}
+    filler = []
+    while sum(len(p) for p in lexicon.values()) + len(filler) < size:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(rng.randint(2, 4))]
+        filler.append(" ".join(words))
+    lexicon["synthetic"] = filler
+    return lexicon
+
+
+def _naive_scan(phrases, text: str) -> bool:
+    lowered = text.lower()
+    return any(phrase in lowered for phrase in phrases)
+
+
+def _time_per_call(func, iterations: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sizes", default="4,100,1000,5000,20000")
+    args = parser.parse_args()
+
+    print(f"utterance: {len(UTTERANCE)} chars, normalize alone: "
+          f"{_time_per_call(lambda: normalize(UTTERANCE), args.iterations):.1f} us")
+    print(f"{'phrases':>8}{'build (ms)':>12}{'automaton (us)':>16}{'naive (us)':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        lexicon = _synthetic_lexicon(size)
+        phrases = [p for group in lexicon.values() for p in group]
+
+        start = time.perf_counter()
+        detector = CrisisDetector(lexicon)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        automaton_us = _time_per_call(lambda: detector.scan(UTTERANCE), args.iterations)
+        naive_us = _time_per_call(lambda: _naive_scan(phrases, UTTERANCE), args.iterations)
+        print(f"{detector.phrase_count:>8}{build_ms:>12.1f}{automaton_us:>16.1f}{naive_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
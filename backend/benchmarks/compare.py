@@ -0,0 +1,84 @@
+# backend/benchmarks/compare.py
+"""
+Compares two benchmark result files written by benchmarks.run_suite.
+
+Run from backend/:
+  python -m benchmarks.compare BASE.json NEW.json [--metric p50_ms] [--threshold 10]
+
+Prints one row per benchmark with the relative change and exits with
+status 1 if any benchmark got slower than the threshold (in percent),
+so it can gate CI. Changes smaller than --min-delta-ms are treated as
+noise whatever their percentage.
+"""
+import sys
+import json
+import argparse
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        report = json.load(f)
+    return report
+
+
+def _label(report: dict) -> str:
+    return f"{report.get('commit', '?')}{'-dirty' if report.get('dirty') else ''}"
+
+
+def compare(base: dict, new: dict, metric: str, threshold: float, min_delta_ms: float):
+    """
+    Returns (rows, regressions). Each row is (name, base, new, change %, verdict).
+    """
+    rows, regressions = [], []
+    base_results, new_results = base["results"], new["results"]
+    for name in sorted(set(base_results) | set(new_results)):
+        old, cur = base_results.get(name), new_results.get(name)
+        if old is None or cur is None:
+            rows.append((name, old and old.get(metric), cur and cur.get(metric), None, "added" if old is None else "removed"))
+            continue
+        if "skipped" in old or "skipped" in cur:
+            rows.append((name, old.get(metric), cur.get(metric), None, "skipped"))
+            continue
+        before, after = old[metric], cur[metric]
+        change = (after - before) / before * 100.0 if before else 0.0
+        verdict = ""
+        if abs(after - before) >= min_delta_ms:
+            if change > threshold:
+                verdict = "REGRESSION"
+                regressions.append(name)
+            elif change < -threshold:
+                verdict = "improved"
+        rows.append((name, before, after, change, verdict))
+    return rows, regressions
+
+
+def _fmt(value) -> str:
+    return f"{value:.4f}" if isinstance(value, (int, float)) else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p50_ms", help="e.g. p50_ms, p95_ms, mean_ms")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.001)
+    args = parser.parse_args()
+
+    base, new = _load(args.base), _load(args.new)
+    if base.get("fake_upstreams") != new.get("fake_upstreams"):
+        print("warning: runs used different fake upstream settings; upstream and e2e numbers are not comparable\n")
+
+    rows, regressions = compare(base, new, args.metric, args.threshold, args.min_delta_ms)
+    print(f"{'benchmark':<52}{_label(base):>14}{_label(new):>14}{'change':>10}")
+    for name, before, after, change, verdict in rows:
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<52}{_fmt(before):>14}{_fmt(after):>14}{change_text:>10}  {verdict}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0f}% in {args.metric}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
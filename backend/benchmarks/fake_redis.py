@@ -0,0 +1,186 @@
+# backend/benchmarks/fake_redis.py
+"""
+A small in-memory stand-in for a Redis server, enough for the session
+store: PING, AUTH, SELECT, GET, SET (with EX/PX), DEL, EXISTS, EXPIRE,
+TTL, DBSIZE, FLUSHDB and QUIT over RESP2, with pipelining. Optional
+per-command latency makes batching effects visible in benchmarks.
+
+Run standalone from backend/:
+  python -m benchmarks.fake_redis [--port 6390] [--password secret] [--latency-ms 1]
+and start the server with SESSION_STORE=redis and the printed SESSION_REDIS_URL.
+"""
+import time
+import argparse
+import threading
+import socketserver
+from typing import Dict, List, Optional, Tuple
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Replies to a pipeline go out one by one; don't let Nagle hold them back
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.authenticated = self.server.password is None
+
+    def handle(self):
+        while True:
+            try:
+                command = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if command is None:
+                return
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            reply = self.server.execute(self, command)
+            self.wfile.write(reply)
+            self.wfile.flush()
+            if command and command[0].upper() == b"QUIT":
+                return
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet or redis-cli --pipe
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            header = self.rfile.readline()
+            if not header.startswith(b"$"):
+                raise ValueError("expected a bulk string")
+            args.append(self.rfile.read(int(header[1:]) + 2)[:-2])
+        return args
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(message: str) -> bytes:
+    return f"-{message}\r\n".encode("utf-8")
+
+
+OK = b"+OK\r\n"
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Serves from a daemon thread; all databases live in one dict keyed by (db, key)."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None,
+                 latency_ms: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.password = password
+        self.latency = latency_ms / 1000.0
+        self.data: Dict[Tuple[int, bytes], Tuple[bytes, Optional[float]]] = {}
+        self.commands: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def start(self) -> "FakeRedis":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _get(self, db: int, key: bytes) -> Optional[bytes]:
+        entry = self.data.get((db, key))
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[(db, key)]
+            return None
+        return entry[0]
+
+    def execute(self, client: _Handler, args: List[bytes]) -> bytes:
+        if not args:
+            return _error("ERR empty command")
+        name, args = args[0].upper().decode("ascii", "replace"), args[1:]
+        db = getattr(client, "db", 0)
+        with self._lock:
+            self.commands[name] = self.commands.get(name, 0) + 1
+            if name == "AUTH":
+                if self.password is not None and args and args[-1].decode() == self.password:
+                    client.authenticated = True
+                    return OK
+                return _error("WRONGPASS invalid username-password pair")
+            if not client.authenticated:
+                return _error("NOAUTH Authentication required.")
+            if name == "PING":
+                return b"+PONG\r\n" if not args else _bulk(args[0])
+            if name == "QUIT":
+                return OK
+            if name == "SELECT":
+                client.db = int(args[0])
+                return OK
+            if name == "GET":
+                return _bulk(self._get(db, args[0]))
+            if name == "SET":
+                expires = None
+                options = [a.upper() for a in args[2:]]
+                if b"EX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+                elif b"PX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000.0
+                self.data[(db, args[0])] = (args[1], expires)
+                return OK
+            if name == "DEL":
+                removed = sum(1 for key in args if self.data.pop((db, key), None) is not None)
+                return b":%d\r\n" % removed
+            if name == "EXISTS":
+                return b":%d\r\n" % sum(1 for key in args if self._get(db, key) is not None)
+            if name == "EXPIRE":
+                value = self._get(db, args[0])
+                if value is None:
+                    return b":0\r\n"
+                self.data[(db, args[0])] = (value, time.monotonic() + int(args[1]))
+                return b":1\r\n"
+            if name == "TTL":
+                if self._get(db, args[0]) is None:
+                    return b":-2\r\n"
+                expires = self.data[(db, args[0])][1]
+                return b":%d\r\n" % (-1 if expires is None else int(expires - time.monotonic()))
+            if name == "DBSIZE":
+                return b":%d\r\n" % sum(1 for (entry_db, _) in self.data if entry_db == db)
+            if name == "FLUSHDB":
+                for key in [k for k in self.data if k[0] == db]:
+                    del self.data[key]
+                return OK
+        return _error(f"ERR unknown command '{name}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every command")
+    args = parser.parse_args()
+
+    server = FakeRedis(args.host, args.port, args.password, args.latency_ms).start()
+    print(f"export SESSION_REDIS_URL={server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
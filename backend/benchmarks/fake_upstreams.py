@@ -0,0 +1,414 @@
+# backend/benchmarks/fake_upstreams.py
+"""
+Local stand-ins for the paid upstream APIs, so the pipeline can be
+benchmarked and load-tested offline:
+
+  groq        POST /openai/v1/chat/completions   (JSON and SSE streaming)
+              POST /openai/v1/audio/transcriptions
+              POST /openai/v1/audio/speech        (WAV)
+  elevenlabs  GET  /v1/voices, POST /v1/text-to-speech/<voice_id>  (MP3)
+  google      GET  /translate_tts                 (MP3)
+
+Each provider gets its own server (so per-provider metrics stay
+separate) with configurable latency, jitter, error injection and rate
+limits (429 with Retry-After, and Groq's x-ratelimit-* quota headers on
+every response). Latency can be scaled per requested model
+(--model-latency), so smaller models answer faster as they do upstream. The backend is pointed at them through
+GROQ_BASE_URL, ELEVEN_BASE_URL and GOOGLE_TTS_URL, which must be set
+before utils modules are imported.
+
+Run standalone from backend/:
+  python -m benchmarks.fake_upstreams [--latency-ms 150] [--jitter-ms 50] [--error-rate 0.02]
+and export the printed variables in the shell that starts the server.
+"""
+import io
+import re
+import json
+import time
+import wave
+import random
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+REPLIES = (
+    "That sounds really hard, and it makes sense that you feel worn out. What has been weighing on you the most?",
+    "Thank you for telling me. It takes courage to say that out loud. How long have you been feeling this way?",
+    "I hear you. Wanting a break from all of it is very human. What would a small bit of rest look like today?",
+    "It sounds like you have been carrying a lot on your own. Is there someone you feel safe talking to?",
+)
+TRANSCRIPTS = (
+    "I have been feeling really overwhelmed at work lately",
+    "I can't sleep and my mind keeps racing at night",
+    "My friend said something that really hurt me yesterday",
+    "I just feel tired all the time and I don't know why",
+    "Yeah, okay. Thank you",
+    "I guess so",
+)
+
+# Spoken audio per character of input, roughly a calm speaking rate
+SPEECH_MS_PER_CHAR = 60
+SPEECH_SAMPLE_RATE = 24000
+MP3_BYTES_PER_SECOND = 16000  # 128 kbit/s
+
+
+@dataclass
+class FaultConfig:
+    """Latency and failure behaviour of one fake upstream."""
+    latency_ms: float = 0.0        # before the first byte of the response
+    jitter_ms: float = 0.0         # uniform extra delay in [0, jitter_ms]
+    error_rate: float = 0.0        # fraction of requests answered with error_status
+    error_status: int = 500
+    token_delay_ms: float = 0.0    # between SSE chunks of a streamed completion
+    upload_kbps: float = 0.0       # request bodies take this long to arrive (0 = instant)
+    rate_limit_rps: float = 0.0    # per route; past it requests get 429 + Retry-After (0 = none)
+    model_latency: str = ""        # "model=factor,...": scales latency and token delay for that model
+    seed: Optional[int] = None
+
+
+# The requested model, in a JSON body or a multipart form field
+_MODEL_FIELD = re.compile(rb'"model":\s*"([^"]+)"|name="model"\r\n\r\n([^\r]+)')
+
+
+def tone_wav(duration_s: float) -> bytes:
+    """Quiet tone, so the client has real audio to decode and play."""
+    t = np.arange(int(duration_s * SPEECH_SAMPLE_RATE)) / SPEECH_SAMPLE_RATE
+    samples = (3000 * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SPEECH_SAMPLE_RATE)
+        out.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def _mp3(duration_s: float) -> bytes:
+    # ID3 tag plus filler: enough for format sniffing and realistic sizes
+    return b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * int(duration_s * MP3_BYTES_PER_SECOND / 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Like real API front ends; otherwise header and body writes hit delayed ACKs
+    disable_nagle_algorithm = True
+    server: "FakeUpstream"
+    # x-ratelimit-* headers for the response being sent
+    _quota: Dict[str, str] = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        for name, value in self._quota.items():
+            self.send_header(name, value)
+        super().end_headers()
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload, status: int = 200):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def _handle(self, method: str):
+        self._quota = {}
+        body = self._body() if method == "POST" else b""
+        if body and self.server.config.upload_kbps:
+            # The client's uplink, which is what a bigger upload costs
+            time.sleep(len(body) * 8 / (self.server.config.upload_kbps * 1000.0))
+        route = self.server.routes.get((method, self.path.split("?")[0]))
+        if route is None and method == "POST" and self.path.startswith("/v1/text-to-speech/"):
+            route = "elevenlabs_speech"
+        if route is None:
+            self._send_json({"error": "not found"}, 404)
+            return
+        self.server.count(route)
+        retry_after, self._quota = self.server.rate_limited(route)
+        if retry_after is not None:
+            self.send_response(429)
+            self.send_header("Retry-After", f"{retry_after:.2f}")
+            self.send_header("Content-Type", "application/json")
+            body = b'{"error": {"message": "rate limit exceeded", "type": "requests"}}'
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        status = self.server.delay_or_fail(self.server.model_scale(body))
+        if status:
+            self._send_json({"error": {"message": "injected failure"}}, status)
+            return
+        getattr(self, route)(body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    # -- groq ------------------------------------------------------------------
+
+    def chat(self, body: bytes):
+        request = json.loads(body or b"{}")
+        reply = self.server.next_reply()
+        if not request.get("stream"):
+            self._send_json({"choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = self.server.config.token_delay_ms * self.server.model_scale(body) / 1000.0
+        words = reply.split(" ")
+        for index, word in enumerate(words):
+            token = word if index == 0 else " " + word
+            event = json.dumps({"choices": [{"index": 0, "delta": {"content": token}}]})
+            self._write_chunk(f"data: {event}\n\n".encode())
+            if delay:
+                time.sleep(delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def transcription(self, body: bytes):
+        text = self.server.next_transcript()
+        if b'name="response_format"\r\n\r\ntext' in body:
+            self._send(200, text.encode(), "text/plain")
+        else:
+            self._send_json({"text": text})
+
+    def groq_speech(self, body: bytes):
+        text = json.loads(body or b"{}").get("input", "")
+        self._send(200, self.server.speech_wav(text), "audio/wav")
+
+    # -- elevenlabs / google -----------------------------------------------------
+
+    def voices(self, body: bytes):
+        self._send_json({"voices": [{"voice_id": "21m00Tcm4TlvDq8ikWAM", "name": "Rachel", "category": "premade"}]})
+
+    def elevenlabs_speech(self, body: bytes):
+        text = json.loads(body or b"{}").get("text", "")
+        self._send(200, _mp3(len(text) * SPEECH_MS_PER_CHAR / 1000.0), "audio/mpeg")
+
+    def google_speech(self, body: bytes):
+        self._send(200, _mp3(2.0), "audio/mpeg")
+
+
+ROUTES = {
+    "groq": {
+        ("POST", "/openai/v1/chat/completions"): "chat",
+        ("POST", "/openai/v1/audio/transcriptions"): "transcription",
+        ("POST", "/openai/v1/audio/speech"): "groq_speech",
+    },
+    "elevenlabs": {
+        ("GET", "/v1/voices"): "voices",
+    },
+    "google": {
+        ("GET", "/translate_tts"): "google_speech",
+    },
+}
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """One fake provider on its own port, served from a daemon thread."""
+    daemon_threads = True
+
+    def __init__(self, provider: str, config: FaultConfig, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.provider = provider
+        self.routes = ROUTES[provider]
+        self.config = config
+        self.requests: Dict[str, int] = {}
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._wav_cache: Dict[int, bytes] = {}
+        # route -> (tokens, last refill), a bucket of rate_limit_rps per route
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._model_scales = {
+            name.strip(): float(factor)
+            for name, _, factor in (item.partition("=") for item in config.model_latency.split(","))
+            if name.strip() and factor
+        }
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstream":
+        self._thread = threading.Thread(target=self.serve_forever, name=f"fake-{self.provider}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, route: str):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def rate_limited(self, route: str) -> Tuple[Optional[float], Dict[str, str]]:
+        """
+        None if the request is within the route's rate, else the Retry-After
+        in seconds; and the quota headers to send, as Groq does (the limit,
+        what is left of it, and how long until it is full again).
+        """
+        rate = self.config.rate_limit_rps
+        if not rate:
+            return None, {}
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(route, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            retry_after = None
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                retry_after = (1.0 - tokens) / rate
+            self._buckets[route] = (tokens, now)
+        limit = max(1, int(rate))
+        return retry_after, {
+            "x-ratelimit-limit-requests": str(limit),
+            "x-ratelimit-remaining-requests": str(int(tokens)),
+            "x-ratelimit-reset-requests": f"{(limit - tokens) / rate:.3f}s",
+        }
+
+    def model_scale(self, body: bytes) -> float:
+        """The --model-latency factor for the model a request names, 1.0 if none applies."""
+        if not self._model_scales or not body:
+            return 1.0
+        match = _MODEL_FIELD.search(body)
+        if match is None:
+            return 1.0
+        return self._model_scales.get((match.group(1) or match.group(2)).decode(errors="replace"), 1.0)
+
+    def delay_or_fail(self, scale: float = 1.0) -> int:
+        """Sleeps the configured latency (times scale); returns an error status to inject, or 0."""
+        with self._lock:
+            jitter = self._rng.uniform(0, self.config.jitter_ms) if self.config.jitter_ms else 0.0
+            failed = self.config.error_rate and self._rng.random() < self.config.error_rate
+        delay = (self.config.latency_ms + jitter) * scale / 1000.0
+        if delay:
+            time.sleep(delay)
+        return self.config.error_status if failed else 0
+
+    def next_reply(self) -> str:
+        # Numbered so replies never repeat and the TTS cache can't hide synthesis cost
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        return f"{REPLIES[number % len(REPLIES)]} ({number})"
+
+    def next_transcript(self) -> str:
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        return TRANSCRIPTS[number % len(TRANSCRIPTS)]
+
+    def speech_wav(self, text: str) -> bytes:
+        # Audio length tracks text length; quantized so encodes can be reused
+        tenths = max(1, len(text) * SPEECH_MS_PER_CHAR // 100)
+        with self._lock:
+            audio = self._wav_cache.get(tenths)
+        if audio is None:
+            audio = tone_wav(tenths / 10.0)
+            with self._lock:
+                self._wav_cache[tenths] = audio
+        return audio
+
+
+def start_fake_upstreams(config: Optional[FaultConfig] = None,
+                         overrides: Optional[Dict[str, FaultConfig]] = None,
+                         host: str = "127.0.0.1", base_port: int = 0) -> Dict[str, FakeUpstream]:
+    """
+    Starts one fake server per provider. overrides replaces the shared
+    config for individual providers (e.g. a slow or flaky groq only).
+    """
+    config = config or FaultConfig()
+    overrides = overrides or {}
+    servers = {}
+    for offset, provider in enumerate(ROUTES):
+        port = base_port + offset if base_port else 0
+        servers[provider] = FakeUpstream(provider, overrides.get(provider, config), host, port).start()
+    return servers
+
+
+def upstream_env(servers: Dict[str, FakeUpstream]) -> Dict[str, str]:
+    """Environment that points the backend at the fake servers."""
+    return {
+        "GROQ_BASE_URL": servers["groq"].url,
+        "ELEVEN_BASE_URL": f"{servers['elevenlabs'].url}/v1",
+        "GOOGLE_TTS_URL": f"{servers['google'].url}/translate_tts",
+        "GROQ_API_KEY": "fake-groq-key",
+        "ELEVENLABS_API_KEY": "fake-elevenlabs-key",
+        "TTS_PREWARM": "0",
+    }
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("fake upstreams")
+    group.add_argument("--latency-ms", type=float, default=0.0, help="delay before each upstream response")
+    group.add_argument("--jitter-ms", type=float, default=0.0, help="uniform extra delay per response")
+    group.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests that fail")
+    group.add_argument("--error-status", type=int, default=500)
+    group.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed tokens")
+    group.add_argument("--upload-kbps", type=float, default=0.0, help="simulated client uplink for request bodies")
+    group.add_argument("--rate-limit-rps", type=float, default=0.0, help="per-route request rate before 429s")
+    group.add_argument("--model-latency", default="",
+                       help='latency factor per requested model, e.g. "whisper-large-v3-turbo=0.4,llama-3.1-8b-instant=0.3"')
+    group.add_argument("--seed", type=int, default=1234)
+
+
+def fault_config(args: argparse.Namespace) -> FaultConfig:
+    return FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        token_delay_ms=args.token_delay_ms,
+        upload_kbps=args.upload_kbps,
+        rate_limit_rps=args.rate_limit_rps,
+        model_latency=args.model_latency,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900, help="first port; providers use consecutive ports")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    servers = start_fake_upstreams(fault_config(args), host=args.host, base_port=args.port)
+    for name, value in upstream_env(servers).items():
+        print(f"export {name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
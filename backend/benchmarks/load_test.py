@@ -0,0 +1,428 @@
+# backend/benchmarks/load_test.py
+"""
+Concurrent-session load generator and soak test for /ws.
+
+Opens N WebSocket clients that each replay utterances (recorded files or
+synthetic audio) with random think time between turns, and reports turn
+latency percentiles, time to first audio, error rate, event-loop lag and
+server RSS while it runs.
+
+By default it is fully offline: it starts the fake upstreams from
+benchmarks/fake_upstreams.py, launches a uvicorn server pointed at them
+and waits for /health. With --url it drives an already running server
+instead (start that one against the fakes yourself to stay offline).
+
+Run from backend/:
+  python -m benchmarks.load_test --clients 50 --duration 120
+  python -m benchmarks.load_test --clients 10,25,50,100 --duration 60 --slo-p99-ms 1500
+  python -m benchmarks.load_test --clients 40 --duration 3600 --think-min 3 --think-max 10   # soak
+  python -m benchmarks.load_test --utterances 'recordings/*.webm' --latency-ms 200 --jitter-ms 80
+
+A comma-separated --clients runs one stage per value and stops at the
+first stage whose p99 turn latency breaks --slo-p99-ms; the exit status
+is 1 if any stage broke the SLO.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.fake_upstreams import add_fault_arguments, fault_config, start_fake_upstreams, upstream_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_utterances(count: int = 8, seed: int = 7) -> List[bytes]:
+    """WAV clips of 1-4 s; the fake STT does not care what is said."""
+    from utils.streaming_stt import float_to_wav
+    rng = np.random.default_rng(seed)
+    clips = []
+    for _ in range(count):
+        seconds = rng.uniform(1.0, 4.0)
+        t = np.arange(int(seconds * 16000)) / 16000
+        samples = 0.2 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) + 0.01 * rng.standard_normal(len(t))
+        clips.append(float_to_wav(samples.astype(np.float32)))
+    return clips
+
+
+def recorded_utterances(pattern: str) -> List[bytes]:
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise SystemExit(f"No utterance files match {pattern}")
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append(f.read())
+    return clips
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@dataclass
+class Stats:
+    """Turn outcomes, shared by all clients of a stage."""
+    latencies: List[float] = field(default_factory=list)
+    first_audio: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+    turns: int = 0
+    connected: int = 0
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+
+# -- server side ------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_get(url: str, timeout: float = 5.0) -> Tuple[int, str]:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read().decode()
+
+
+def wait_for_health(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode} before becoming healthy")
+        try:
+            status, _ = http_get(f"{base_url}/health", timeout=2.0)
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"{base_url}/health did not answer within {timeout:.0f}s")
+
+
+def start_server(env: Dict[str, str], port: int, log_path: str, launcher: str = "uvicorn") -> subprocess.Popen:
+    """
+    Runs main:app in a child process with the given environment: under the
+    plain uvicorn CLI, or through server.py (launcher="server"), which
+    reads its worker and WebSocket settings from env.
+    """
+    log = open(log_path, "wb")
+    if launcher == "server":
+        command = [sys.executable, "server.py"]
+        env = {"HOST": "127.0.0.1", "PORT": str(port), **env}
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning"]
+    return subprocess.Popen(
+        command,
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """
+    Flattens the Prometheus text format into {'name{labels}': value}.
+    Good enough for the handful of series this tool reads.
+    """
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        try:
+            values[name] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def lag_percentile(before: Dict[str, float], after: Dict[str, float], fraction: float) -> Optional[float]:
+    """
+    Estimates a percentile of event-loop lag over a sampling window from
+    the difference of two histogram scrapes (upper bucket bound).
+    """
+    prefix = 'astra_event_loop_lag_seconds_bucket{le="'
+    buckets = []
+    for key, value in after.items():
+        if key.startswith(prefix):
+            bound = key[len(prefix):-2]
+            buckets.append((float("inf") if bound == "+Inf" else float(bound), value - before.get(key, 0.0)))
+    buckets.sort()
+    total = buckets[-1][1] if buckets else 0
+    if total <= 0:
+        return None
+    for bound, cumulative in buckets:
+        if cumulative >= fraction * total:
+            return bound
+    return None
+
+
+# -- client side -------------------------------------------------------------------
+
+async def run_client(index: int, url: str, args: argparse.Namespace, utterances: List[bytes],
+                     stats: Stats, stop_at: float):
+    import websockets
+
+    rng = random.Random(args.seed + index)
+    hello = None
+    if args.protocol >= 2 or args.stream or args.formats:
+        hello = {"type": "hello", "protocol": args.protocol, "stream": args.stream}
+        if args.formats:
+            hello["formats"] = args.formats.split(",")
+    # Streamed and v2 turns end with turn_end; legacy buffered turns are one message
+    framed = args.protocol >= 2 or args.stream
+    await asyncio.sleep(rng.uniform(0, args.ramp_s))
+    while time.monotonic() < stop_at:
+        try:
+            async with websockets.connect(url, max_size=None, open_timeout=args.turn_timeout) as ws:
+                stats.connected += 1
+                try:
+                    if hello:
+                        await ws.send(json.dumps(hello))
+                        await asyncio.wait_for(ws.recv(), args.turn_timeout)
+                    while time.monotonic() < stop_at:
+                        await run_turn(ws, rng.choice(utterances), framed, args, stats)
+                        await asyncio.sleep(rng.uniform(args.think_min, args.think_max))
+                finally:
+                    stats.connected -= 1
+        except asyncio.TimeoutError:
+            stats.error("timeout")
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            stats.error(type(e).__name__)
+        # Reconnect after a failure, but don't hammer a struggling server
+        await asyncio.sleep(min(1.0, max(0.0, stop_at - time.monotonic())))
+
+
+async def run_turn(ws, audio: bytes, framed: bool, args: argparse.Namespace, stats: Stats):
+    started = time.perf_counter()
+    first_audio = None
+    await ws.send(audio)
+    while True:
+        message = await asyncio.wait_for(ws.recv(), args.turn_timeout)
+        now = time.perf_counter() - started
+        if isinstance(message, bytes):
+            first_audio = first_audio or now
+            continue
+        if message.startswith("ERROR"):
+            stats.error("server_error")
+            return
+        payload = json.loads(message) if message.startswith("{") else {}
+        if payload.get("type") == "turn_cancelled":
+            # No reply is coming (e.g. transcription failed); don't wait out the timeout
+            stats.error("turn_cancelled")
+            return
+        if payload.get("audio"):
+            first_audio = first_audio or now
+        # v1 answers with a single message; v2 ends every turn with turn_end
+        if not framed or payload.get("type") == "turn_end":
+            break
+    stats.turns += 1
+    stats.latencies.append(now)
+    if first_audio is not None:
+        stats.first_audio.append(first_audio)
+
+
+# -- reporting -----------------------------------------------------------------------
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:8.0f}" if value is not None else "       -"
+
+
+async def sample(base_url: str, stats: Stats, stop_at: float, interval: float, samples: List[dict]):
+    """Prints one line per interval and records server-side gauges."""
+    loop = asyncio.get_running_loop()
+    previous = await loop.run_in_executor(None, _scrape, base_url)
+    seen = 0
+    started = time.monotonic()
+    print(f"{'t(s)':>6}{'clients':>9}{'turns/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'lag p99':>9}{'rss MB':>9}")
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(min(interval, max(0.0, stop_at - time.monotonic())))
+        current = await loop.run_in_executor(None, _scrape, base_url)
+        window = stats.latencies[seen:]
+        seen = len(stats.latencies)
+        lag = lag_percentile(previous, current, 0.99) if previous and current else None
+        rss = current.get("process_resident_memory_bytes") if current else None
+        elapsed = time.monotonic() - started
+        samples.append({
+            "t": round(elapsed, 1), "clients": stats.connected, "turns": len(window),
+            "p50_ms": _round_ms(percentile(window, 0.5)), "p99_ms": _round_ms(percentile(window, 0.99)),
+            "errors": stats.error_count, "lag_p99_ms": _round_ms(lag), "rss_bytes": rss,
+        })
+        print(f"{elapsed:6.0f}{stats.connected:9d}{len(window) / interval:9.1f}{_ms(percentile(window, 0.5)):>9}"
+              f"{_ms(percentile(window, 0.99)):>9}{stats.error_count:8d}{_ms(lag):>9}"
+              f"{(rss or 0) / 1e6:9.1f}")
+        previous = current or previous
+
+
+def _scrape(base_url: str) -> Optional[Dict[str, float]]:
+    try:
+        status, text = http_get(f"{base_url}/metrics")
+        return parse_metrics(text) if status == 200 else None
+    except OSError:
+        return None
+
+
+def _round_ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def rss_growth(samples: List[dict]) -> Optional[float]:
+    """Least-squares slope of RSS over the run, in MB per hour."""
+    points = [(s["t"], s["rss_bytes"]) for s in samples if s.get("rss_bytes")]
+    if len(points) < 2:
+        return None
+    t = np.array([p[0] for p in points])
+    rss = np.array([p[1] for p in points])
+    if np.ptp(t) == 0:
+        return None
+    slope = np.polyfit(t, rss, 1)[0]
+    return round(slope * 3600 / 1e6, 2)
+
+
+async def run_stage(clients: int, ws_url: str, base_url: str, args: argparse.Namespace,
+                    utterances: List[bytes]) -> dict:
+    stats = Stats()
+    samples: List[dict] = []
+    before = _scrape(base_url) or {}
+    stop_at = time.monotonic() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        sample(base_url, stats, stop_at, args.sample_interval, samples),
+        *(run_client(i, ws_url, args, utterances, stats, stop_at) for i in range(clients)),
+    )
+    elapsed = time.perf_counter() - started
+    after = _scrape(base_url) or {}
+
+    attempts = stats.turns + stats.error_count
+    result = {
+        "clients": clients,
+        "duration_s": round(elapsed, 1),
+        "turns": stats.turns,
+        "turns_per_s": round(stats.turns / elapsed, 2) if elapsed else 0.0,
+        "errors": stats.errors,
+        "error_rate": round(stats.error_count / attempts, 4) if attempts else 0.0,
+        "turn_ms": {f"p{int(q * 100)}": _round_ms(percentile(stats.latencies, q)) for q in (0.5, 0.9, 0.95, 0.99)},
+        "first_audio_ms": {f"p{int(q * 100)}": _round_ms(percentile(stats.first_audio, q)) for q in (0.5, 0.95, 0.99)},
+        "event_loop_lag_p99_ms": _round_ms(lag_percentile(before, after, 0.99)),
+        "rss_start_mb": round(before.get("process_resident_memory_bytes", 0) / 1e6, 1),
+        "rss_end_mb": round(after.get("process_resident_memory_bytes", 0) / 1e6, 1),
+        "rss_growth_mb_per_hour": rss_growth(samples),
+        "samples": samples,
+    }
+    p99 = result["turn_ms"]["p99"]
+    result["slo_ok"] = args.slo_p99_ms <= 0 or (p99 is not None and p99 <= args.slo_p99_ms
+                                               and result["error_rate"] <= args.max_error_rate)
+    return result
+
+
+def print_summary(result: dict, args: argparse.Namespace):
+    turn, first = result["turn_ms"], result["first_audio_ms"]
+    print(f"\n== {result['clients']} clients, {result['duration_s']}s ==")
+    print(f"turns {result['turns']} ({result['turns_per_s']}/s), error rate {result['error_rate']:.2%} {result['errors'] or ''}")
+    print(f"turn latency ms       p50 {turn['p50']}  p90 {turn['p90']}  p95 {turn['p95']}  p99 {turn['p99']}")
+    print(f"first audio ms        p50 {first['p50']}  p95 {first['p95']}  p99 {first['p99']}")
+    print(f"event loop lag p99 ms {result['event_loop_lag_p99_ms']}")
+    print(f"server RSS MB         {result['rss_start_mb']} -> {result['rss_end_mb']} "
+          f"(trend {result['rss_growth_mb_per_hour']} MB/h)")
+    if args.slo_p99_ms > 0:
+        print(f"SLO p99 <= {args.slo_p99_ms:.0f} ms, errors <= {args.max_error_rate:.1%}: "
+              f"{'OK' if result['slo_ok'] else 'BROKEN'}")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def build_parser(description: str = __doc__) -> argparse.ArgumentParser:
+    """The client and fault options; benchmarks/server_configs.py shares them."""
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", default="20", help="concurrent sessions; comma-separated for a step test")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per stage")
+    parser.add_argument("--ramp-s", type=float, default=5.0, help="spread client start-up over this many seconds")
+    parser.add_argument("--think-min", type=float, default=1.0, help="min seconds between a reply and the next utterance")
+    parser.add_argument("--think-max", type=float, default=3.0)
+    parser.add_argument("--protocol", type=int, default=2, choices=(1, 2))
+    parser.add_argument("--stream", action="store_true", help="request streamed turns")
+    parser.add_argument("--formats", default="", help="reply audio formats to negotiate, e.g. opus,mp3")
+    parser.add_argument("--utterances", default="", help="glob of recorded audio files (default: synthetic WAV)")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p99-ms", type=float, default=0.0, help="p99 turn latency objective (0 = none)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="error rate allowed within the SLO")
+    parser.add_argument("--sample-interval", type=float, default=5.0)
+    parser.add_argument("--output", default="", help="write the results as JSON")
+    add_fault_arguments(parser)
+    return parser
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument("--url", default="", help="existing server, e.g. http://127.0.0.1:8000 (skips fakes)")
+    parser.add_argument("--launcher", default="uvicorn", choices=("uvicorn", "server"),
+                        help="start the server with the uvicorn CLI or through server.py")
+    args = parser.parse_args()
+
+    utterances = recorded_utterances(args.utterances) if args.utterances else synthetic_utterances()
+    servers, process = {}, None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        servers = start_fake_upstreams(fault_config(args))
+        port = _free_port()
+        log_path = os.path.join(tempfile.gettempdir(), f"astra-load-test-{port}.log")
+        process = start_server(upstream_env(servers), port, log_path, args.launcher)
+        base_url = f"http://127.0.0.1:{port}"
+        print(f"server pid {process.pid}, log {log_path}")
+
+    results = []
+    try:
+        wait_for_health(base_url, timeout=60.0, process=process)
+        ws_url = base_url.replace("http", "ws", 1) + "/ws"
+        for clients in (int(c) for c in args.clients.split(",")):
+            result = asyncio.run(run_stage(clients, ws_url, base_url, args, utterances))
+            results.append(result)
+            print_summary(result, args)
+            if not result["slo_ok"]:
+                break
+    finally:
+        if process is not None:
+            stop_server(process)
+        for server in servers.values():
+            server.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "stages": results}, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if any(not r["slo_ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
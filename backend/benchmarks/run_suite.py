@@ -0,0 +1,990 @@
+# backend/benchmarks/run_suite.py
+"""
+Offline benchmark suite for backend/utils and a full /ws voice turn.
+
+Every upstream call goes to the local fakes in benchmarks/fake_upstreams.py,
+so the suite needs no API keys and costs nothing. Results are written as
+JSON (one file per commit by default) for benchmarks.compare to diff.
+
+Groups:
+  micro     pure CPU work on the per-turn hot path
+  upstream  provider clients against the fake Groq/ElevenLabs/Google APIs
+  local     self-hosted models; skipped when their packages are missing
+  e2e       complete websocket turns through main.app
+
+Run from backend/:
+  python -m benchmarks.run_suite [--iterations N] [--group micro,e2e] [--filter groq]
+                                 [--latency-ms 50 --jitter-ms 20 --error-rate 0.05 --upload-kbps 2000]
+                                 [--output PATH]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.fake_upstreams import (
+    TRANSCRIPTS, REPLIES, add_fault_arguments, fault_config, start_fake_upstreams, upstream_env,
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SCHEMA_VERSION = 1
+
+UTTERANCE = TRANSCRIPTS[0]
+REPLY = REPLIES[0]
+CRISIS_UTTERANCE = "Honestly I don't want to live like this anymore, I keep thinking about ending it all"
+
+
+class Skip(Exception):
+    """Raised by a setup function when a benchmark cannot run here."""
+
+
+class Timings(dict):
+    """Extra named durations (seconds) returned by an operation."""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    group: str
+    setup: Callable
+    inner: int = 1
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, group: str = "micro", inner: int = 1):
+    """
+    Registers a setup function. The setup (sync or async) prepares state
+    and returns the operation to time; the operation may be sync or async
+    and may return Timings of extra named durations (e.g. time to first
+    token), recorded as "<name>.<key>".
+    """
+    def decorator(setup: Callable) -> Callable:
+        BENCHMARKS.append(Benchmark(name, group, setup, inner))
+        return setup
+    return decorator
+
+
+def _speech_pcm(seconds: float, sample_rate: int = 16000) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes()
+
+
+def _speech_wav(seconds: float = 2.0) -> bytes:
+    from utils.streaming_stt import float_to_wav, pcm16_to_float
+    return float_to_wav(pcm16_to_float(_speech_pcm(seconds)))
+
+
+def _recording_wav(speech: float = 2.0, silence: float = 1.0, speaking: bool = True,
+                   sample_rate: int = 48000, channels: int = 2) -> bytes:
+    """
+    What a browser WAV recorder uploads: 48 kHz stereo, with room noise
+    around the speech (or only room noise).
+    """
+    import io
+    import wave
+    rng = np.random.default_rng(7)
+    samples = rng.normal(0, 0.002, int((speech + 2 * silence) * sample_rate))
+    if speaking:
+        start = int(silence * sample_rate)
+        t = np.arange(int(speech * sample_rate)) / sample_rate
+        samples[start:start + len(t)] += 0.3 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(np.repeat(pcm, channels).tobytes())
+    return buffer.getvalue()
+
+
+class _Unique:
+    """Numbered variants of a text, so cached layers can't short-circuit."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.count = 0
+
+    def __call__(self) -> str:
+        self.count += 1
+        return f"{self.text} ({self.count})"
+
+
+async def _drain(iterator) -> int:
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+
+# -- micro --------------------------------------------------------------------
+
+@benchmark("crisis_detector.normalize", inner=200)
+def _():
+    from utils.crisis_detector import normalize
+    return lambda: normalize(UTTERANCE)
+
+
+@benchmark("crisis_detector.detect_crisis", inner=200)
+def _():
+    from utils.crisis_detector import detect_crisis
+    return lambda: detect_crisis(UTTERANCE)
+
+
+@benchmark("crisis_detector.detect_crisis.match", inner=200)
+def _():
+    from utils.crisis_detector import detect_crisis
+    if not detect_crisis(CRISIS_UTTERANCE):
+        raise Skip("crisis utterance is not in the lexicon")
+    return lambda: detect_crisis(CRISIS_UTTERANCE)
+
+
+@benchmark("conversation_memory.estimate_tokens", inner=1000)
+def _():
+    from utils.conversation_memory import estimate_tokens
+    return lambda: estimate_tokens(REPLY)
+
+
+@benchmark("conversation_memory.add_exchange_and_history", inner=50)
+async def _():
+    from utils.conversation_memory import ConversationMemory
+
+    async def summarize(previous: str, messages: list) -> str:
+        return "The user has been stressed about work."
+
+    memory = ConversationMemory(summarize=summarize)
+
+    async def op():
+        memory.add_exchange(UTTERANCE, REPLY)
+        memory.history()
+        await asyncio.sleep(0)  # let eviction summaries run
+    return op
+
+
+@benchmark("sentence_stream.iter_sentences", inner=20)
+def _():
+    from utils.sentence_stream import iter_sentences
+    tokens = [word if i == 0 else " " + word for i, word in enumerate((REPLY + " " + REPLIES[1]).split(" "))]
+
+    async def token_stream():
+        for token in tokens:
+            yield token
+
+    async def op():
+        await _drain(iter_sentences(token_stream()))
+    return op
+
+
+@benchmark("tts_cache.make_key", inner=500)
+def _():
+    from utils.tts_cache import make_key
+    return lambda: make_key(REPLY, "groq:Ruby-PlayAI", "playai-tts", "wav")
+
+
+@benchmark("tts_cache.TTSCache.get_hit", inner=500)
+def _():
+    from utils.tts_cache import TTSCache, make_key
+    cache = TTSCache(max_bytes=1 << 24, disk_dir="")
+    key = make_key(REPLY, "voice", "model", "wav")
+    cache.put(key, b"\0" * 64000)
+    return lambda: cache.get(key)
+
+
+@benchmark("tts_cache.TTSCache.put", inner=200)
+def _():
+    from utils.tts_cache import TTSCache, make_key
+    cache = TTSCache(max_bytes=1 << 22, disk_dir="")
+    audio = b"\0" * 64000
+    keys = [make_key(f"{REPLY} {i}", "voice", "model", "wav") for i in range(256)]
+    position = [0]
+
+    def op():
+        cache.put(keys[position[0] % len(keys)], audio)
+        position[0] += 1
+    return op
+
+
+@benchmark("ws_protocol.pack_audio_frame", inner=200)
+def _():
+    from utils.ws_protocol import pack_audio_frame
+    audio = b"\0" * 96000
+    return lambda: pack_audio_frame(7, audio)
+
+
+@benchmark("ws_protocol.unpack_audio_frame", inner=500)
+def _():
+    from utils.ws_protocol import pack_audio_frame, unpack_audio_frame
+    frame = pack_audio_frame(7, b"\0" * 96000)
+    return lambda: unpack_audio_frame(frame)
+
+
+@benchmark("ws_protocol.guess_audio_format", inner=1000)
+def _():
+    from utils.ws_protocol import guess_audio_format
+    audio = b"ID3" + b"\0" * 1000
+    return lambda: guess_audio_format(audio)
+
+
+@benchmark("ws_protocol.audio_message", inner=1000)
+def _():
+    from utils.ws_protocol import audio_message, negotiate_protocol
+    return lambda: audio_message(3, negotiate_protocol(2), REPLY, "wav", 96000)
+
+
+def _scratch_log_output() -> logging.Handler:
+    """Formats like the server and writes (and flushes) every line to a scratch file."""
+    import tempfile
+    from utils.log_pipeline import TEXT_FORMAT, TextFormatter
+    output = logging.StreamHandler(tempfile.TemporaryFile("w"))
+    output.setFormatter(TextFormatter(TEXT_FORMAT))
+    return output
+
+
+def _bench_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(f"benchmarks.{name}")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    log.handlers = [handler]
+    return log
+
+
+def _log_info(log: logging.Logger, *args):
+    # What log.info() does once past the level check; the suite disables logging globally
+    log.handle(log.makeRecord(log.name, logging.INFO, __file__, 0, "Transcribed text: %s", args, None))
+
+
+@benchmark("log_pipeline.direct_info", inner=200)
+def _():
+    log = _bench_logger("direct", _scratch_log_output())
+    return lambda: _log_info(log, UTTERANCE)
+
+
+@benchmark("log_pipeline.queued_info", inner=200)
+def _():
+    import queue
+    import logging.handlers
+    from utils.log_pipeline import ContextFilter, _QueueHandler, redact
+    handler = _QueueHandler(queue.Queue())
+    handler.addFilter(ContextFilter())
+    log = _bench_logger("queued", handler)
+    logging.handlers.QueueListener(handler.queue, _scratch_log_output()).start()
+    return lambda: _log_info(log, redact(UTTERANCE))
+
+
+@benchmark("audio_ingest.prepare_utterance", inner=5)
+def _():
+    from utils.audio_ingest import prepare_utterance
+    audio = _recording_wav()
+    return lambda: prepare_utterance(audio)
+
+
+@benchmark("streaming_stt.pcm16_to_float", inner=100)
+def _():
+    from utils.streaming_stt import pcm16_to_float
+    pcm = _speech_pcm(1.0)
+    return lambda: pcm16_to_float(pcm)
+
+
+@benchmark("streaming_stt.float_to_wav", inner=50)
+def _():
+    from utils.streaming_stt import float_to_wav, pcm16_to_float
+    samples = pcm16_to_float(_speech_pcm(3.0))
+    return lambda: float_to_wav(samples)
+
+
+@benchmark("streaming_stt.EnergyEndpointer.frame_levels", inner=100)
+def _():
+    from utils.streaming_stt import EnergyEndpointer, pcm16_to_float
+    endpointer = EnergyEndpointer()
+    samples = pcm16_to_float(_speech_pcm(1.0))
+    return lambda: endpointer.frame_levels(samples)
+
+
+@benchmark("streaming_stt.StreamingRecognizer.feed", inner=20)
+def _():
+    from utils.streaming_stt import StreamingRecognizer
+
+    async def transcribe(samples) -> str:
+        return UTTERANCE
+
+    recognizer = StreamingRecognizer(transcribe=transcribe)
+    chunks = [_speech_pcm(0.1)] * 20 + [b"\0" * 3200] * 10
+    position = [0]
+
+    async def op():
+        transcription = recognizer.feed(chunks[position[0] % len(chunks)])
+        position[0] += 1
+        if transcription is not None:
+            await transcription
+    return op
+
+
+@benchmark("audio_codec.encode.opus", inner=1)
+def _():
+    from utils import audio_codec
+    if not audio_codec.ffmpeg_available():
+        raise Skip("ffmpeg is not installed")
+    from benchmarks.fake_upstreams import tone_wav
+    source = tone_wav(4.0)
+    salt = [0]
+
+    def op():
+        # A different trailing sample each time, so the transcode cache misses
+        salt[0] += 1
+        audio = source[:-2] + (salt[0] % 32768).to_bytes(2, "little")
+        return audio_codec.encode(audio, "opus", audio_codec.clamp_bitrate("opus"))
+    return op
+
+
+@benchmark("metrics.Histogram.observe", inner=2000)
+def _():
+    from utils import metrics
+    child = metrics.STAGES["turn"]
+    return lambda: child.observe(0.123)
+
+
+@benchmark("metrics.render", inner=10)
+def _():
+    from utils import metrics
+    return metrics.render
+
+
+@benchmark("groq_ai.build_request", inner=500)
+def _():
+    from utils.groq_ai import _build_messages, _build_payload
+    history = [{"role": "user", "content": UTTERANCE}, {"role": "assistant", "content": REPLY}] * 3
+    return lambda: _build_payload(_build_messages(UTTERANCE, history))
+
+
+@benchmark("model_tiering.llm_tier", inner=1000)
+def _():
+    from utils.model_tiering import llm_tier
+    messages = [UTTERANCE, "okay, thanks", "I keep thinking about the funeral and I can't sleep"]
+    position = [0]
+
+    def op():
+        position[0] += 1
+        return llm_tier(messages[position[0] % len(messages)])
+    return op
+
+
+@benchmark("provider_router.call.overhead", inner=50)
+def _():
+    from utils.provider_router import ProviderRouter
+
+    async def instant(text: str) -> str:
+        return text
+
+    router = ProviderRouter("bench", default="")
+    router.register("instant", instant)
+    return lambda: router.call(UTTERANCE)
+
+
+def _session_state() -> dict:
+    from utils.conversation_memory import ConversationMemory
+    memory = ConversationMemory()
+    for index in range(4):
+        memory.add_exchange(TRANSCRIPTS[index % len(TRANSCRIPTS)], REPLIES[index % len(REPLIES)])
+    return {"memory": memory.snapshot()}
+
+
+async def _session_store(backend: str):
+    import tempfile
+    from utils import session_store
+    if backend == "memory":
+        return session_store.MemorySessionStore()
+    if backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="astra-bench-"), "sessions.db")
+        store = session_store.SQLiteSessionStore(path)
+    else:
+        from benchmarks.fake_redis import FakeRedis
+        store = session_store.RedisSessionStore(FakeRedis().start().url)
+    await store.start()
+    return store
+
+
+def _register_session_store_benchmarks(backend: str, group: str):
+    # Per-turn cost: sqlite and redis only buffer here, the flusher does the I/O
+    @benchmark(f"session_store.{backend}.save", group=group, inner=200)
+    async def _():
+        from utils import session_store
+        store, state, token = await _session_store(backend), _session_state(), session_store.new_token()
+        return lambda: store.save(token, state)
+
+    # Resume cost: a load that has to go to storage
+    @benchmark(f"session_store.{backend}.load", group=group, inner=50)
+    async def _():
+        from utils import session_store
+        store, token = await _session_store(backend), session_store.new_token()
+        await store.save(token, _session_state())
+        if hasattr(store, "flush"):
+            await store.flush()
+        return lambda: store.load(token)
+
+    if backend != "memory":
+        @benchmark(f"session_store.{backend}.flush_32", group=group)
+        async def _():
+            from utils import session_store
+            store, state = await _session_store(backend), _session_state()
+            tokens = [session_store.new_token() for _ in range(32)]
+
+            async def op():
+                for token in tokens:
+                    await store.save(token, state)
+                await store.flush()
+            return op
+
+
+_register_session_store_benchmarks("memory", "micro")
+_register_session_store_benchmarks("sqlite", "micro")
+
+
+# -- upstream (fake APIs) -----------------------------------------------------
+
+@benchmark("http_client.request", group="upstream")
+def _():
+    from utils import http_client
+    url = f"{http_client.ELEVEN_BASE_URL}/voices"
+    return lambda: http_client.request("GET", url)
+
+
+@benchmark("rate_limiter.acquire", inner=1000)
+def _():
+    from utils.rate_limiter import TokenBucket
+    # Unlimited and unpaused: the cost every upstream request pays
+    return TokenBucket("bench").acquire
+
+
+class _RateLimitedBurst:
+    """
+    A burst of concurrent requests against a fake API that allows
+    rate_limit_rps per second and answers the rest with 429 + Retry-After.
+    Any request that still fails counts as an error.
+    """
+
+    def __init__(self, requests: int, rate_limit_rps: float, configured: bool):
+        from benchmarks.fake_upstreams import FakeUpstream, FaultConfig
+        from utils import http_client
+        self.requests = requests
+        self.server = FakeUpstream("elevenlabs", FaultConfig(rate_limit_rps=rate_limit_rps)).start()
+        self.url = f"{self.server.url}/v1/voices"
+        bucket = http_client._bucket(self.url)
+        # Configured: the client knows the limit up front (RATE_LIMITS); otherwise it learns from the 429s
+        bucket.rate = rate_limit_rps if configured else None
+        bucket.burst = bucket.tokens = rate_limit_rps
+
+    async def __call__(self):
+        from utils import http_client
+        responses = await asyncio.gather(*(http_client.request("GET", self.url) for _ in range(self.requests)),
+                                         return_exceptions=True)
+        failed = sum(1 for r in responses if isinstance(r, BaseException) or r.status_code != 200)
+        if failed:
+            raise RuntimeError(f"{failed} of {self.requests} requests failed")
+
+    def close(self):
+        self.server.stop()
+
+
+@benchmark("rate_limiter.burst.reactive", group="upstream")
+def _():
+    return _RateLimitedBurst(40, 20.0, configured=False)
+
+
+@benchmark("rate_limiter.burst.configured", group="upstream")
+def _():
+    return _RateLimitedBurst(40, 20.0, configured=True)
+
+
+@benchmark("groq_ai.get_ai_response", group="upstream")
+def _():
+    from utils.groq_ai import get_ai_response
+    return lambda: get_ai_response(UTTERANCE)
+
+
+@benchmark("groq_ai.get_ai_response_async", group="upstream")
+def _():
+    from utils.groq_ai import get_ai_response_async
+    return lambda: get_ai_response_async(UTTERANCE)
+
+
+@benchmark("groq_ai.stream_ai_response", group="upstream")
+def _():
+    from utils.groq_ai import stream_ai_response
+
+    async def op():
+        started = time.perf_counter()
+        first = None
+        async for _ in stream_ai_response(UTTERANCE):
+            if first is None:
+                first = time.perf_counter() - started
+        return Timings(first_token=first)
+    return op
+
+
+@benchmark("groq_ai.summarize_conversation_async", group="upstream")
+def _():
+    from utils.groq_ai import summarize_conversation_async
+    messages = [{"role": "user", "content": UTTERANCE}, {"role": "assistant", "content": REPLY}]
+    return lambda: summarize_conversation_async("", messages)
+
+
+@benchmark("cloud_stt.speech_to_text", group="upstream")
+def _():
+    from utils.cloud_stt import speech_to_text
+    audio = _speech_wav()
+    return lambda: speech_to_text(audio)
+
+
+@benchmark("cloud_stt.transcribe_async", group="upstream")
+def _():
+    from utils.cloud_stt import transcribe_async
+    audio = _speech_wav()
+    return lambda: transcribe_async(audio)
+
+
+def _ingest_then_transcribe(audio: bytes, ingest: bool):
+    from utils.audio_ingest import prepare_utterance
+    from utils.cloud_stt import transcribe_async
+
+    async def op():
+        upload = await prepare_utterance(audio) if ingest else audio
+        if upload is not None:
+            await transcribe_async(upload)
+    return op
+
+
+# The same 48 kHz stereo recording uploaded as-is and after ingest
+@benchmark("stt_upload.speech.raw", group="upstream")
+def _():
+    return _ingest_then_transcribe(_recording_wav(), ingest=False)
+
+
+@benchmark("stt_upload.speech.ingested", group="upstream")
+def _():
+    return _ingest_then_transcribe(_recording_wav(), ingest=True)
+
+
+@benchmark("stt_upload.silence.raw", group="upstream")
+def _():
+    return _ingest_then_transcribe(_recording_wav(speaking=False), ingest=False)
+
+
+@benchmark("stt_upload.silence.ingested", group="upstream")
+def _():
+    return _ingest_then_transcribe(_recording_wav(speaking=False), ingest=True)
+
+
+@benchmark("cloud_stt.speech_to_text_async", group="upstream")
+def _():
+    from utils.cloud_stt import speech_to_text_async
+    audio = _speech_wav()
+    return lambda: speech_to_text_async(audio)
+
+
+@benchmark("groq_tts.text_to_speech", group="upstream")
+def _():
+    from utils.groq_tts import text_to_speech
+    text = _Unique(REPLY)
+    return lambda: text_to_speech.__wrapped__(text())
+
+
+@benchmark("groq_tts.text_to_speech_async", group="upstream")
+def _():
+    from utils.groq_tts import text_to_speech_async
+    text = _Unique(REPLY)
+    return lambda: text_to_speech_async.__wrapped__(text())
+
+
+@benchmark("groq_tts.text_to_speech_async.cached", group="upstream", inner=100)
+async def _():
+    from utils.groq_tts import text_to_speech_async
+    await text_to_speech_async(REPLY)
+    return lambda: text_to_speech_async(REPLY)
+
+
+@benchmark("cloud_tts.text_to_speech", group="upstream")
+def _():
+    from utils.cloud_tts import text_to_speech
+    text = _Unique(REPLY)
+    return lambda: text_to_speech.__wrapped__(text())
+
+
+@benchmark("free_tts.text_to_speech", group="upstream")
+def _():
+    from utils.free_tts import text_to_speech
+    text = _Unique(REPLY)
+    return lambda: text_to_speech.__wrapped__(text())
+
+
+@benchmark("providers.llm.call", group="upstream")
+def _():
+    from utils import providers
+    router = providers.build_router("llm")
+    return lambda: router.call(UTTERANCE, [])
+
+
+@benchmark("providers.tts.call", group="upstream")
+def _():
+    from utils import providers
+    router = providers.build_router("tts")
+    text = _Unique(REPLY)
+    return lambda: router.call(text())
+
+
+_register_session_store_benchmarks("redis", "upstream")
+
+
+# -- local models -------------------------------------------------------------
+
+def _require(module: str):
+    try:
+        __import__(module)
+    except ImportError:
+        raise Skip(f"{module} is not installed")
+
+
+@benchmark("local_ai.get_ai_response", group="local")
+def _():
+    _require("ollama")
+    from utils import local_ai
+    if local_ai.get_ai_response(UTTERANCE) == local_ai.FALLBACK_RESPONSE:
+        raise Skip("ollama server is not reachable")
+    return lambda: local_ai.get_ai_response(UTTERANCE)
+
+
+def _ollama_turns(conversation: Optional[str]):
+    """
+    One streamed turn per call in a growing conversation, timed to the
+    first token. With a conversation id each turn continues the previous
+    turn's evaluated context; without one the whole history is resent.
+    """
+    _require("ollama")
+    from utils import local_ai
+    from utils.conversation_memory import ConversationMemory, current_conversation
+    if local_ai.get_ai_response(UTTERANCE) == local_ai.FALLBACK_RESPONSE:
+        raise Skip("ollama server is not reachable")
+    memory = ConversationMemory()
+
+    async def op():
+        token = current_conversation.set(conversation)
+        try:
+            started = time.perf_counter()
+            first = None
+            reply = []
+            async for text in local_ai.stream_ai_response(UTTERANCE, memory.history()):
+                if first is None:
+                    first = time.perf_counter() - started
+                reply.append(text)
+        finally:
+            current_conversation.reset(token)
+        memory.add_exchange(UTTERANCE, "".join(reply))
+        return Timings(first_token=first)
+    return op
+
+
+@benchmark("local_ai.stream_ai_response.continued", group="local")
+def _():
+    return _ollama_turns("benchmark")
+
+
+@benchmark("local_ai.stream_ai_response.full_history", group="local")
+def _():
+    return _ollama_turns(None)
+
+
+@benchmark("audio_processor.transcribe_audio_array", group="local")
+def _():
+    _require("faster_whisper")
+    from utils.audio_processor import transcribe_audio_array
+    from utils.streaming_stt import pcm16_to_float
+    samples = pcm16_to_float(_speech_pcm(3.0))
+    return lambda: transcribe_audio_array(samples, 16000)
+
+
+@benchmark("local_stt_engine.transcribe_array", group="local")
+async def _():
+    _require("faster_whisper")
+    from utils.local_stt_engine import get_local_stt_engine
+    from utils.streaming_stt import pcm16_to_float
+    engine = get_local_stt_engine()
+    await engine.start()
+    samples = pcm16_to_float(_speech_pcm(3.0))
+    return lambda: engine.transcribe_array(samples)
+
+
+@benchmark("tts_generator.text_to_speech", group="local")
+def _():
+    _require("TTS")
+    from utils.tts_generator import text_to_speech
+    text = _Unique(REPLY)
+    return lambda: text_to_speech.__wrapped__(text())
+
+
+@benchmark("local_tts_engine.synthesize", group="local")
+async def _():
+    _require("TTS")
+    from utils.local_tts_engine import get_local_tts_engine
+    engine = get_local_tts_engine()
+    await engine.start()
+    text = _Unique(REPLY)
+    return lambda: engine.synthesize(text())
+
+
+# -- end to end ---------------------------------------------------------------
+
+def _ws_turn(client, hello: Optional[dict]):
+    """
+    One connection per benchmark, one utterance per op. Returns a callable
+    that runs a turn and reports time to the first audio payload.
+    """
+    audio = _speech_wav(1.0)
+    session = client.websocket_connect("/ws")
+    websocket = session.__enter__()
+    if hello:
+        websocket.send_text(json.dumps(hello))
+        websocket.receive_json()
+
+    def op():
+        started = time.perf_counter()
+        first_audio = None
+        websocket.send_bytes(audio)
+        while True:
+            message = websocket.receive()
+            if message.get("bytes") is not None:  # v2 binary audio frame
+                first_audio = first_audio or time.perf_counter() - started
+                continue
+            text = message.get("text") or ""
+            payload = json.loads(text) if text.startswith("{") else {}
+            if payload.get("audio"):  # v1 reply or segment with base64 audio
+                first_audio = first_audio or time.perf_counter() - started
+            # v1 answers with a single message; v2 ends every turn with turn_end
+            if hello is None or payload.get("type") == "turn_end":
+                break
+        return Timings(first_audio=first_audio)
+
+    op.close = lambda: session.__exit__(None, None, None)
+    return op
+
+
+@benchmark("ws.turn.buffered_v1", group="e2e")
+def _():
+    return _ws_turn(_test_client(), None)
+
+
+@benchmark("ws.turn.buffered_v2", group="e2e")
+def _():
+    return _ws_turn(_test_client(), {"type": "hello", "protocol": 2, "stream": False})
+
+
+@benchmark("ws.turn.streamed_v2", group="e2e")
+def _():
+    return _ws_turn(_test_client(), {"type": "hello", "protocol": 2, "stream": True})
+
+
+@benchmark("startup.import_main", group="e2e")
+def _():
+    # A fresh interpreter importing the app: the cold-start cost before uvicorn can listen
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, STARTUP_MODE="lazy", STARTUP_FAILURE_SLEEP="0")
+    command = [sys.executable, "-c", "import main"]
+    return lambda: subprocess.run(command, cwd=backend_dir, env=env, check=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+_client = None
+
+
+def _test_client():
+    global _client
+    if _client is None:
+        from fastapi.testclient import TestClient
+        import main
+        _client = TestClient(main.app)
+        _client.__enter__()
+    return _client
+
+
+# -- runner -------------------------------------------------------------------
+
+def summarize(samples: List[float], errors: int = 0) -> Dict[str, Any]:
+    ordered = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000.0
+
+    mean = statistics.fmean(ordered)
+    return {
+        "samples": len(ordered),
+        "errors": errors,
+        "mean_ms": round(mean * 1000.0, 4),
+        "stdev_ms": round(statistics.pstdev(ordered) * 1000.0, 4),
+        "min_ms": round(ordered[0] * 1000.0, 4),
+        "p50_ms": round(percentile(0.50), 4),
+        "p95_ms": round(percentile(0.95), 4),
+        "p99_ms": round(percentile(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000.0, 4),
+        "ops_per_s": round(1.0 / mean, 2) if mean else None,
+    }
+
+
+async def _call(func: Callable):
+    result = func()
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def measure(bench: Benchmark, iterations: int, warmup: int) -> Dict[str, Dict]:
+    try:
+        op = await _call(bench.setup)
+    except Skip as e:
+        return {bench.name: {"skipped": str(e)}}
+
+    extras: Dict[str, List[float]] = {}
+    samples: List[float] = []
+    errors = 0
+    try:
+        for index in range(warmup + iterations):
+            started = time.perf_counter()
+            for _ in range(bench.inner):
+                try:
+                    result = await _call(op)
+                except Exception:
+                    errors += 1
+                    result = None
+            elapsed = (time.perf_counter() - started) / bench.inner
+            if index < warmup:
+                continue
+            samples.append(elapsed)
+            if isinstance(result, Timings):
+                for key, value in result.items():
+                    if value is not None:
+                        extras.setdefault(key, []).append(value)
+    finally:
+        close = getattr(op, "close", None)
+        if close:
+            close()
+
+    results = {bench.name: summarize(samples, errors)}
+    for key, values in extras.items():
+        results[f"{bench.name}.{key}"] = summarize(values)
+    return results
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _selected(args: argparse.Namespace) -> List[Benchmark]:
+    groups = set(args.group.split(",")) if args.group else None
+    filters = [f for f in (args.filter or "").split(",") if f]
+    return [
+        b for b in BENCHMARKS
+        if (groups is None or b.group in groups) and (not filters or any(f in b.name for f in filters))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30, help="timed samples per benchmark")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--group", default="", help="comma-separated: micro,upstream,local,e2e")
+    parser.add_argument("--filter", default="", help="comma-separated substrings of benchmark names")
+    parser.add_argument("--output", default="", help="result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    parser.add_argument("--verbose", action="store_true", help="show backend logs (noisy with --error-rate)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    selected = _selected(args)
+    if args.list:
+        for bench in selected:
+            print(f"{bench.group:<9} {bench.name}")
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    if not args.verbose:
+        # Injected failures are expected; the error counts are in the results
+        logging.disable(logging.CRITICAL)
+    config = fault_config(args)
+    servers = start_fake_upstreams(config)
+    # Must happen before any utils module is imported: URLs are read at import
+    os.environ.update(upstream_env(servers))
+
+    results: Dict[str, Dict] = {}
+
+    async def run_in_process():
+        from utils import http_client
+        await http_client.startup_http_client()
+        try:
+            for bench in selected:
+                if bench.group == "e2e":
+                    continue
+                results.update(await measure(bench, args.iterations, args.warmup))
+                _print_result(bench.name, results)
+        finally:
+            await http_client.shutdown_http_client()
+
+    async def run_end_to_end():
+        for bench in selected:
+            if bench.group == "e2e":
+                results.update(await measure(bench, args.iterations, args.warmup))
+                _print_result(bench.name, results)
+
+    asyncio.run(run_in_process())
+    # The app runs its own event loop (and upstream client) under the TestClient
+    asyncio.run(run_end_to_end())
+    if _client is not None:
+        _client.__exit__(None, None, None)
+    for server in servers.values():
+        server.stop()
+
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = bool(_git("status", "--porcelain", "--untracked-files=no"))
+    report = {
+        "schema": SCHEMA_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "iterations": args.iterations,
+        "fake_upstreams": asdict(config),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nwrote {output}")
+
+
+def _print_result(name: str, results: Dict[str, Dict]):
+    for key in sorted(k for k in results if k == name or k.startswith(name + ".")):
+        result = results[key]
+        if "skipped" in result:
+            print(f"{key:<52} skipped: {result['skipped']}")
+        else:
+            errors = f"  errors={result['errors']}" if result["errors"] else ""
+            print(f"{key:<52} p50 {result['p50_ms']:>10.4f} ms  p95 {result['p95_ms']:>10.4f} ms{errors}")
+
+
+if __name__ == "__main__":
+    main()
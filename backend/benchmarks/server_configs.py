@@ -0,0 +1,122 @@
+# backend/benchmarks/server_configs.py
+"""
+Compares server configurations under the same /ws load.
+
+For each configuration it starts server.py against the fake upstreams
+with that configuration's environment, runs the load_test stages (same
+clients, utterances and think time) and stops it with SIGTERM, so the
+drain is exercised too. Then it prints one row per configuration and
+client count.
+
+Run from backend/:
+  python -m benchmarks.server_configs --clients 50,100 --duration 60
+  python -m benchmarks.server_configs --configs baseline,tuned --clients 200 --duration 120 --latency-ms 150
+  python -m benchmarks.server_configs --list
+
+Configurations (see CONFIGS; any server.py setting can be added there):
+  baseline   asyncio loop, h11, per-message-deflate on, 1 worker
+             (what `uvicorn main:app` gives without the [standard] extras)
+  deflate    uvloop and httptools, deflate on, 1 worker
+  tuned      uvloop and httptools, deflate off, 1 worker
+  workers    tuned, one worker per available core (WEB_CONCURRENCY=auto)
+
+Notes on reading the results:
+- The load clients run in this process. With several workers the client
+  side can become the limit before the server does; compare turns/s with
+  this process's CPU (top) and spread clients over machines (load_test.py
+  --url against a server started with server.py) if it is pegged.
+- Event-loop lag and RSS come from /metrics, which is answered by one
+  worker; with several workers they describe whichever worker answered.
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from typing import Dict, List
+
+from benchmarks.fake_upstreams import fault_config, start_fake_upstreams, upstream_env
+from benchmarks.load_test import (
+    _free_port, build_parser, recorded_utterances, run_stage, start_server, stop_server,
+    synthetic_utterances, wait_for_health,
+)
+
+CONFIGS: Dict[str, Dict[str, str]] = {
+    "baseline": {"WEB_CONCURRENCY": "1", "UVICORN_LOOP": "asyncio", "UVICORN_HTTP": "h11",
+                 "WS_PER_MESSAGE_DEFLATE": "1"},
+    "deflate": {"WEB_CONCURRENCY": "1", "UVICORN_LOOP": "uvloop", "UVICORN_HTTP": "httptools",
+                "WS_PER_MESSAGE_DEFLATE": "1"},
+    "tuned": {"WEB_CONCURRENCY": "1", "UVICORN_LOOP": "uvloop", "UVICORN_HTTP": "httptools",
+              "WS_PER_MESSAGE_DEFLATE": "0"},
+    "workers": {"WEB_CONCURRENCY": "auto", "UVICORN_LOOP": "uvloop", "UVICORN_HTTP": "httptools",
+                "WS_PER_MESSAGE_DEFLATE": "0"},
+}
+
+
+def run_config(name: str, env: Dict[str, str], servers, args, utterances: List[bytes]) -> List[dict]:
+    port = _free_port()
+    log_path = os.path.join(tempfile.gettempdir(), f"astra-server-{name}-{port}.log")
+    # Server logs at warning so its own logging doesn't weigh on the comparison
+    process = start_server({**upstream_env(servers), "LOG_LEVEL": "WARNING", **env}, port, log_path, "server")
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"\n### {name}: {' '.join(f'{k}={v}' for k, v in env.items())} (pid {process.pid}, log {log_path})")
+    results = []
+    try:
+        wait_for_health(base_url, timeout=60.0, process=process)
+        ws_url = base_url.replace("http", "ws", 1) + "/ws"
+        for clients in (int(c) for c in args.clients.split(",")):
+            result = asyncio.run(run_stage(clients, ws_url, base_url, args, utterances))
+            result["config"] = name
+            results.append(result)
+    finally:
+        stop_server(process)
+    return results
+
+
+def print_table(results: List[dict]):
+    print(f"\n{'config':<10}{'clients':>8}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'audio p50':>10}{'errors':>8}{'lag p99':>9}")
+    for r in results:
+        turn = r["turn_ms"]
+        print(f"{r['config']:<10}{r['clients']:>8}{r['turns_per_s']:>9}{str(turn['p50']):>9}{str(turn['p95']):>9}"
+              f"{str(turn['p99']):>9}{str(r['first_audio_ms']['p50']):>10}{r['error_rate']:>8.2%}"
+              f"{str(r['event_loop_lag_p99_ms']):>9}")
+
+
+def main():
+    parser = build_parser(__doc__)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="comma-separated names from CONFIGS")
+    parser.add_argument("--list", action="store_true", help="print the configurations and exit")
+    args = parser.parse_args()
+    if args.list:
+        for name, env in CONFIGS.items():
+            print(f"{name:<10}{' '.join(f'{k}={v}' for k, v in env.items())}")
+        return
+    names = [n.strip() for n in args.configs.split(",") if n.strip()]
+    unknown = [n for n in names if n not in CONFIGS]
+    if unknown:
+        raise SystemExit(f"Unknown configuration(s): {', '.join(unknown)}; --list shows them")
+
+    utterances = recorded_utterances(args.utterances) if args.utterances else synthetic_utterances()
+    servers = start_fake_upstreams(fault_config(args))
+    results = []
+    try:
+        for name in names:
+            results.extend(run_config(name, CONFIGS[name], servers, args, utterances))
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    print_table(results)
+    if args.output:
+        for result in results:
+            result.pop("samples", None)
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "configs": {n: CONFIGS[n] for n in names}, "results": results}, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if any(not r["slo_ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,10 @@ import logging
 import time
 import os
 
-# Set up basic logging to see errors clearly
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from utils.log_pipeline import configure_logging, redact
+
+# Log records are written by a background thread, never on the event loop
+configure_logging()
 logger = logging.getLogger(__name__)
 
 try:
@@ -13,38 +15,173 @@ try:
     # Import core dependencies first
     from fastapi import FastAPI, WebSocket, WebSocketDisconnect
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, PlainTextResponse
     import json
     import asyncio
     import base64
+    import importlib
+    import uuid
     from dotenv import load_dotenv
     
     logger.info("Core dependencies imported successfully")
+
+    # Load environment variables from .env file, before any module reads its settings
+    logger.info("Loading environment variables...")
+    load_dotenv()
+
+    # "lazy" starts listening right away and loads the providers (and any
+    # local models) in a background warmup gated by /ready; "eager" does
+    # all of that before the server accepts a connection.
+    STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+    # How long a session opened during warmup waits for it to finish
+    WARMUP_WAIT_TIMEOUT = float(os.getenv("WARMUP_WAIT_TIMEOUT", "60"))
     
     # Now import your utility modules with individual try-catch
     try:
-        from utils.cloud_stt import speech_to_text
+        from utils.cloud_stt import speech_to_text_async
         logger.info("cloud_stt imported successfully")
     except Exception as e:
-        logger.error(f"Failed to import cloud_stt: {e}")
+        logger.error("Failed to import cloud_stt: %s", e)
         raise
     
     try:
-        from utils.groq_tts import text_to_speech
+        from utils.groq_tts import text_to_speech_async
         logger.info("cloud_tts imported successfully")
     except Exception as e:
-        logger.error(f"Failed to import cloud_tts: {e}")
+        logger.error("Failed to import cloud_tts: %s", e)
         raise
     
     try:
-        from utils.groq_ai import get_ai_response
+        from utils.groq_ai import get_ai_response_async, summarize_conversation_async, FALLBACK_RESPONSES
         logger.info("groq_ai imported successfully")
     except Exception as e:
-        logger.error(f"Failed to import groq_ai: {e}")
+        logger.error("Failed to import groq_ai: %s", e)
         raise
 
-    # Load environment variables from .env file
-    logger.info("Loading environment variables...")
-    load_dotenv()
+    try:
+        from utils.sentence_stream import iter_sentences
+        logger.info("sentence_stream imported successfully")
+    except Exception as e:
+        logger.error("Failed to import sentence_stream: %s", e)
+        raise
+
+    try:
+        from utils.crisis_detector import detect_crisis, get_crisis_detector
+        logger.info("crisis_detector imported successfully")
+    except Exception as e:
+        logger.error("Failed to import crisis_detector: %s", e)
+        raise
+
+    try:
+        from utils.conversation_memory import ConversationMemory, current_conversation
+        logger.info("conversation_memory imported successfully")
+    except Exception as e:
+        logger.error("Failed to import conversation_memory: %s", e)
+        raise
+
+    try:
+        from utils import tts_cache
+        logger.info("tts_cache imported successfully")
+    except Exception as e:
+        logger.error("Failed to import tts_cache: %s", e)
+        raise
+
+    try:
+        from utils import ws_protocol
+        logger.info("ws_protocol imported successfully")
+    except Exception as e:
+        logger.error("Failed to import ws_protocol: %s", e)
+        raise
+
+    try:
+        from utils import audio_codec
+        logger.info("audio_codec imported successfully")
+    except Exception as e:
+        logger.error("Failed to import audio_codec: %s", e)
+        raise
+
+    try:
+        from utils import metrics
+        logger.info("metrics imported successfully")
+    except Exception as e:
+        logger.error("Failed to import metrics: %s", e)
+        raise
+
+    try:
+        from utils.turn_scheduler import TurnScheduler, Turn
+        logger.info("turn_scheduler imported successfully")
+    except Exception as e:
+        logger.error("Failed to import turn_scheduler: %s", e)
+        raise
+
+    try:
+        from utils import session_store
+        logger.info("session_store imported successfully")
+    except Exception as e:
+        logger.error("Failed to import session_store: %s", e)
+        raise
+
+    try:
+        from utils import http_client
+        logger.info("http_client imported successfully")
+    except Exception as e:
+        logger.error("Failed to import http_client: %s", e)
+        raise
+
+    try:
+        from utils import rate_limiter
+        logger.info("rate_limiter imported successfully")
+    except Exception as e:
+        logger.error("Failed to import rate_limiter: %s", e)
+        raise
+
+    try:
+        from utils import model_tiering
+        logger.info("model_tiering imported successfully")
+    except Exception as e:
+        logger.error("Failed to import model_tiering: %s", e)
+        raise
+
+    try:
+        from utils import session_memory
+        logger.info("session_memory imported successfully")
+    except Exception as e:
+        logger.error("Failed to import session_memory: %s", e)
+        raise
+
+    try:
+        from utils import providers
+        logger.info("providers imported successfully")
+    except Exception as e:
+        logger.error("Failed to import providers: %s", e)
+        raise
+
+    stt_router = llm_router = tts_router = None
+
+    def build_routers():
+        """
+        Imports the configured backends. Local ones pull in faster-whisper
+        or Coqui, which is most of a cold start.
+        """
+        global stt_router, llm_router, tts_router
+        stt_router = providers.get_router("stt")
+        llm_router = providers.get_router("llm")
+        tts_router = providers.get_router("tts")
+        logger.info("provider routers created successfully")
+
+    if STARTUP_MODE == "eager":
+        try:
+            build_routers()
+        except Exception as e:
+            logger.error("Failed to create provider routers: %s", e)
+            raise
+
+    CRISIS_RESPONSE = "I hear that you're in immense pain, and that worries me. Your safety is the most important thing. Please, right now, reach out to a human professional at the National Suicide Prevention Lifeline by calling or texting 988. I am here with you."
+
+    # Fixed phrases synthesized into the TTS cache at startup. local_ai's
+    # fallback reply is identical to groq_ai's generic one.
+    PREWARM_PHRASES = (CRISIS_RESPONSE, *FALLBACK_RESPONSES, "Test message")
+    TTS_PREWARM = os.getenv("TTS_PREWARM", "1") == "1"
 
     # Initialize App
     logger.info("Creating FastAPI app...")
@@ -66,6 +203,127 @@ try:
         allow_headers=["*"],
     )
 
+    # Read at scrape time from state the cache and the provider routers already keep
+    TTS_CACHE_GAUGE = metrics.gauge("astra_tts_cache", "TTS cache counters and size", ["field"])
+    CIRCUIT_GAUGE = metrics.gauge("astra_circuit_open", "1 while a provider's circuit breaker is not closed", ["stage", "provider"])
+    SESSION_AUDIO_GAUGE = metrics.gauge(
+        "astra_session_audio_bytes", "Audio held for open sessions: uploads awaiting transcription, streaming recognizer buffers", ["kind"])
+    background_tasks = set()
+    # Set once warmup has finished, whether or not it succeeded
+    warmup_done = asyncio.Event()
+    startup_state = {"ready": False, "error": None, "draining": False}
+    # Open sessions' options by websocket, for draining on shutdown and /debug/memory
+    live_sessions = {}
+
+    def register_state_gauges():
+        cache = tts_cache.get_tts_cache()
+        for field in ("hits", "misses", "disk_hits", "entries", "bytes"):
+            TTS_CACHE_GAUGE.labels(field).set_function(lambda field=field: cache.stats()[field])
+        for stage, router in (("stt", stt_router), ("llm", llm_router), ("tts", tts_router)):
+            for provider in router.providers:
+                CIRCUIT_GAUGE.labels(stage, provider.name).set_function(
+                    lambda breaker=provider.breaker: 0 if breaker.state == breaker.CLOSED else 1
+                )
+        SESSION_AUDIO_GAUGE.labels("uploads").set_function(
+            lambda: sum(s["usage"].held_bytes for s in live_sessions.values()))
+        SESSION_AUDIO_GAUGE.labels("recognizer").set_function(
+            lambda: sum(s["recognizer"].buffered_bytes for s in live_sessions.values() if s["recognizer"]))
+
+    async def warmup():
+        """
+        Everything a turn needs that accepting a connection doesn't.
+        """
+        if stt_router is None:
+            # In a thread so /live and /ready keep answering during heavy imports
+            await asyncio.to_thread(build_routers)
+        await asyncio.to_thread(importlib.import_module, "utils.streaming_stt")
+        await asyncio.to_thread(importlib.import_module, "utils.audio_ingest")
+        register_state_gauges()
+        # Open the database or connection before the first session tries to resume
+        await session_store.get_session_store().start()
+        # Build the crisis automaton now rather than on the first turn
+        get_crisis_detector()
+        if providers.uses("stt", "local"):
+            # Load the resident Whisper models before the first utterance
+            from utils.local_stt_engine import get_local_stt_engine
+            await get_local_stt_engine().start()
+        if providers.uses("tts", "coqui"):
+            # Same for Coqui: no user should wait for a model load
+            from utils.local_tts_engine import get_local_tts_engine
+            await get_local_tts_engine().start()
+        if providers.uses("llm", "ollama"):
+            # Have Ollama load the model (and keep it loaded) before the first turn
+            from utils.local_ai import load_model
+            await load_model()
+        if TTS_PREWARM and os.getenv("GROQ_API_KEY"):
+            # Off the startup path: the server accepts connections meanwhile. Kept in
+            # background_tasks so it isn't garbage-collected mid-run and is cancelled on shutdown.
+            background_tasks.add(asyncio.create_task(tts_cache.prewarm(PREWARM_PHRASES, tts_router.call)))
+        startup_state["ready"] = True
+        seconds = metrics.record_startup("ready")
+        logger.info("Ready for sessions %.2fs after process start (%s startup)", seconds, STARTUP_MODE)
+
+    async def background_warmup():
+        try:
+            await warmup()
+        except Exception as e:
+            startup_state["error"] = str(e)
+            logger.error("Warmup failed, /ready will report 503: %s", e)
+            logger.error(traceback.format_exc())
+        finally:
+            warmup_done.set()
+
+    @app.on_event("startup")
+    async def startup_event():
+        # Build the pooled upstream client once, before any session connects
+        await http_client.startup_http_client()
+        background_tasks.add(asyncio.create_task(metrics.monitor_event_loop_lag()))
+        if STARTUP_MODE == "eager":
+            await warmup()
+            warmup_done.set()
+        else:
+            background_tasks.add(asyncio.create_task(background_warmup()))
+        seconds = metrics.record_startup("serving")
+        logger.info("Accepting connections %.2fs after process start", seconds)
+
+    async def drain_sessions(timeout: float):
+        """
+        Graceful shutdown, called by server.py before uvicorn closes the
+        connections: stops taking sessions (/ready turns 503), gives turns
+        in flight up to timeout seconds to finish, then closes the sockets
+        with 1012 (service restart) so clients reconnect elsewhere and
+        resume with their session token.
+        """
+        startup_state["draining"] = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        logger.info("Draining %s sessions (up to %.0fs)", len(live_sessions), timeout)
+        while loop.time() < deadline and not all(s["scheduler"].idle for s in live_sessions.values()):
+            await asyncio.sleep(0.1)
+        cut_off = sum(1 for s in live_sessions.values() if not s["scheduler"].idle)
+        if cut_off:
+            logger.warning("Drain timed out with %s turns still in flight", cut_off)
+        for websocket in list(live_sessions):
+            try:
+                await websocket.close(code=1012)
+            except Exception:
+                pass
+
+    app.state.drain = drain_sessions
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        for task in background_tasks:
+            task.cancel()
+        background_tasks.clear()
+        # Flush batched session writes before the process goes away
+        await session_store.close_session_store()
+        await http_client.shutdown_http_client()
+        from utils import local_stt_engine, local_tts_engine
+        for engine in (local_stt_engine._engine, local_tts_engine._engine):
+            if engine is not None:
+                await engine.stop()
+
     @app.middleware("http")
     async def add_forwarded_for_header(request, call_next):
         if "x-forwarded-for" in request.headers:
@@ -76,18 +334,344 @@ try:
         response = await call_next(request)
         return response
 
+    async def handle_control_message(websocket: WebSocket, text: str, session_options: dict):
+        """
+        Applies a JSON control message from the client, e.g.
+        {"type": "hello", "protocol": 2, "stream": true} to opt into binary
+        audio frames and streamed turns, or {"stt": "stream"} to send
+        16-bit PCM chunks for incremental recognition. "formats" lists the
+        reply audio formats the client can play, most preferred first
+        (e.g. ["opus", "mp3", "wav"]), with an optional "bitrate_kbps".
+        A hello may carry the "session" token from an earlier hello reply to
+        resume that conversation. {"type": "stop"} cancels the reply being
+        generated.
+
+        Returns the final transcription, not yet awaited, when the message
+        ended an utterance ({"type": "end_of_speech"}), otherwise None.
+        """
+        try:
+            control = json.loads(text)
+        except ValueError:
+            logger.warning("Ignoring non-JSON text message from client")
+            return None
+
+        if control.get("type") == "hello":
+            session_options["stream"] = bool(control.get("stream", False))
+            session_options["protocol"] = ws_protocol.negotiate_protocol(control.get("protocol", ws_protocol.LEGACY_PROTOCOL))
+            session_options["format"] = audio_codec.negotiate_format(control.get("formats"))
+            session_options["bitrate"] = audio_codec.clamp_bitrate(session_options["format"], control.get("bitrate_kbps"))
+            resumed = await open_session(control.get("session"), session_options)
+            if control.get("stt") == "stream":
+                # Preloaded by warmup; imported here to keep numpy off the cold start
+                from utils.streaming_stt import StreamingRecognizer, STREAM_SAMPLE_RATE
+                sample_rate = int(control.get("sample_rate", STREAM_SAMPLE_RATE))
+
+                async def send_partial(partial_text: str):
+                    await websocket.send_json({"type": "partial_transcript", "text": partial_text})
+
+                session_options["recognizer"] = StreamingRecognizer(sample_rate=sample_rate, on_partial=send_partial)
+            else:
+                session_options["recognizer"] = None
+            stt_mode = "stream" if session_options["recognizer"] else "utterance"
+            logger.info(
+                "Client hello: protocol=%s stream=%s stt=%s format=%s",
+                session_options["protocol"], session_options["stream"], stt_mode, session_options["format"] or "native",
+            )
+            await websocket.send_json({
+                "type": "hello",
+                "protocol": session_options["protocol"],
+                "stream": session_options["stream"],
+                "stt": stt_mode,
+                "format": session_options["format"] or "native",
+                "bitrate_kbps": session_options["bitrate"],
+                "session": session_options["session"],
+                "resumed": resumed,
+            })
+        elif control.get("type") == "end_of_speech":
+            if session_options["recognizer"] is not None:
+                return session_options["recognizer"].flush()
+        elif control.get("type") == "stop":
+            if session_options["scheduler"].stop():
+                logger.info("Client stopped the reply in flight")
+        else:
+            logger.warning("Unknown control message type: %s", control.get('type'))
+        return None
+
+    async def open_session(requested_token, session_options: dict) -> bool:
+        """
+        Resumes the conversation stored under the client's token, or starts
+        a new one. Sessions are only stored once a client has said hello,
+        since legacy clients have no way to present the token again.
+        Returns whether a stored conversation was resumed.
+        """
+        if session_options["session"]:
+            return False
+        if session_store.valid_token(requested_token):
+            try:
+                state = await session_store.get_session_store().load(requested_token)
+                if state is not None:
+                    session_options["memory"].restore(state["memory"])
+                    session_options["session"] = requested_token
+                    metrics.SESSIONS_RESUMED.inc()
+                    logger.info("Resumed session with %s stored messages", len(state['memory']['turns']))
+                    return True
+            except Exception as e:
+                logger.warning("Could not resume session, starting a new one: %s", e)
+        session_options["session"] = session_store.new_token()
+        return False
+
+    async def save_session(session_options: dict):
+        # Buffered by the store; no I/O on the turn's path
+        if session_options["session"]:
+            state = {"memory": session_options["memory"].snapshot()}
+            await session_store.get_session_store().save(session_options["session"], state)
+
+    def session_priority(session_options: dict) -> int:
+        """Where the session's upstream requests queue when the providers rate-limit us."""
+        if session_options["crisis"]:
+            return rate_limiter.CRISIS
+        if session_options["turn"] == 0:
+            # Nobody should wait through a rate-limit burst for their very first reply
+            return rate_limiter.FIRST_TURN
+        return rate_limiter.NORMAL
+
+    async def transcribe_utterance(audio_bytes: bytes) -> str:
+        logger.info("Received audio data, length: %s bytes", len(audio_bytes))
+        # Loaded by warmup; kept off the import path because of NumPy
+        from utils.audio_ingest import prepare_utterance
+        # 16 kHz mono, silence trimmed; None means no speech, so STT is skipped
+        audio_bytes = await prepare_utterance(audio_bytes)
+        if audio_bytes is None:
+            return ""
+        with metrics.time_stage("stt"):
+            user_text = await stt_router.call(audio_bytes)
+        logger.info("Transcribed text: %s", redact(user_text))
+        return user_text
+
+    async def run_turn(websocket: WebSocket, turn: Turn, memory: ConversationMemory, session_options: dict):
+        """
+        Everything after transcription: crisis check, reply generation and
+        synthesis, and the conversation memory update. Runs as a task of
+        the session's TurnScheduler, so it can be cancelled at any await.
+        """
+        metrics.INFLIGHT_TURNS.inc()
+        timings = metrics.collect_stage_timings()
+        try:
+            with metrics.time_stage("turn"):
+                await _run_turn(websocket, turn, memory, session_options)
+        finally:
+            metrics.INFLIGHT_TURNS.dec()
+        logger.info(
+            "Turn %s finished in %.0f ms", session_options["turn"], timings.get("turn", 0.0) * 1000,
+            extra={"stage": "turn", "timings_ms": {k: round(v * 1000, 1) for k, v in timings.items()}},
+        )
+
+    async def _run_turn(websocket: WebSocket, turn: Turn, memory: ConversationMemory, session_options: dict):
+        user_text = turn.text
+        with metrics.time_stage("crisis"):
+            crisis = detect_crisis(user_text)
+        # A crisis puts the rest of the session at the front of any rate-limit queue
+        session_options["crisis"] = session_options["crisis"] or bool(crisis)
+        rate_limiter.start_turn(session_priority(session_options))
+        if crisis:
+            logger.warning("Crisis language detected (categories: %s)", ', '.join(crisis.categories))
+            await websocket.send_text(f"CRISIS_RESPONSE:{CRISIS_RESPONSE}")
+            if session_options["protocol"] >= ws_protocol.BINARY_PROTOCOL:
+                # Binary clients also hear it; the audio is prewarmed in the cache
+                session_options["turn"] += 1
+                crisis_audio = await synthesize(CRISIS_RESPONSE, session_options)
+                await send_audio_segment(websocket, session_options, 0, CRISIS_RESPONSE, crisis_audio)
+                await send_turn_end(websocket, session_options, CRISIS_RESPONSE, 1 if crisis_audio else 0, crisis=True)
+            metrics.TURNS.labels("crisis").inc()
+            return
+
+        session_options["turn"] += 1
+        conversation_history = memory.history()
+        if session_options["stream"]:
+            logger.info("Streaming response from Groq AI...")
+            ai_text_response = await run_streaming_turn(websocket, user_text, conversation_history, session_options, turn.spoken)
+            metrics.TURNS.labels("stream").inc()
+        else:
+            logger.info("Sending request to Groq AI...")
+            ai_text_response = await run_buffered_turn(websocket, user_text, conversation_history, session_options, turn.spoken)
+            metrics.TURNS.labels("buffered").inc()
+        
+        memory.add_exchange(user_text, ai_text_response)
+
+    async def send_audio_segment(websocket: WebSocket, session_options: dict, seq: int, text: str, audio_bytes: bytes):
+        """
+        Sends one synthesized segment in the session's wire format: a JSON
+        header plus a raw binary frame (v2) or base64 inside JSON (v1).
+        """
+        if session_options["protocol"] >= ws_protocol.BINARY_PROTOCOL:
+            if not audio_bytes:
+                return
+            frame_seq = session_options["next_seq"]
+            session_options["next_seq"] += 1
+            with metrics.time_stage("encode"):
+                header = ws_protocol.audio_message(
+                    session_options["turn"], frame_seq, text, ws_protocol.guess_audio_format(audio_bytes), len(audio_bytes)
+                )
+                frame = ws_protocol.pack_audio_frame(frame_seq, audio_bytes)
+            with metrics.time_stage("send"):
+                await websocket.send_json(header)
+                await websocket.send_bytes(frame)
+            metrics.AUDIO_OUT_BYTES.observe(len(frame))
+        else:
+            with metrics.time_stage("encode"):
+                encoded = base64.b64encode(audio_bytes).decode('utf-8') if audio_bytes else None
+            with metrics.time_stage("send"):
+                await websocket.send_json({
+                    "type": "segment",
+                    "seq": seq,
+                    "text": text,
+                    "audio": encoded,
+                    "format": ws_protocol.guess_audio_format(audio_bytes) if audio_bytes else None,
+                })
+            metrics.AUDIO_OUT_BYTES.observe(len(encoded) if encoded else 0)
+
+    async def send_turn_end(websocket: WebSocket, session_options: dict, text: str, segments: int, crisis: bool = False):
+        message = {
+            "type": "turn_end",
+            "turn": session_options["turn"],
+            "text": text,
+            "segments": segments,
+        }
+        if crisis:
+            message["crisis"] = True
+        await websocket.send_json(message)
+
+    async def run_buffered_turn(websocket: WebSocket, user_text: str, conversation_history: list,
+                                session_options: dict, spoken: list) -> str:
+        """
+        Original one-shot turn: full completion, full synthesis, one reply.
+        The reply text is appended to spoken once it has been sent.
+        """
+        started = time.perf_counter()
+        with metrics.time_stage("llm"):
+            ai_text_response = await llm_router.call(user_text, conversation_history)
+        logger.info("AI Response: %s", redact(ai_text_response))
+
+        logger.info("Generating speech with ElevenLabs...")
+        audio_bytes = await synthesize(ai_text_response, session_options)
+
+        if session_options["protocol"] >= ws_protocol.BINARY_PROTOCOL:
+            await send_audio_segment(websocket, session_options, 0, ai_text_response, audio_bytes)
+            spoken.append(ai_text_response)
+            await send_turn_end(websocket, session_options, ai_text_response, 1 if audio_bytes else 0)
+            logger.info("Sent text and binary audio response to client")
+        elif audio_bytes:
+            with metrics.time_stage("encode"):
+                response_data = {
+                    "text": ai_text_response,
+                    "audio": base64.b64encode(audio_bytes).decode('utf-8'),
+                    "format": ws_protocol.guess_audio_format(audio_bytes),
+                }
+            with metrics.time_stage("send"):
+                await websocket.send_json(response_data)
+            metrics.AUDIO_OUT_BYTES.observe(len(response_data["audio"]))
+            spoken.append(ai_text_response)
+            logger.info("Sent text and audio response to client")
+        else:
+            await websocket.send_text(f"AI_RESPONSE:{ai_text_response}")
+            spoken.append(ai_text_response)
+        if audio_bytes:
+            metrics.TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - started)
+        return ai_text_response
+
+    async def synthesize(text: str, session_options: dict) -> bytes:
+        """
+        Speech for text in the session's negotiated audio format.
+        """
+        with metrics.time_stage("tts"):
+            audio_bytes = await tts_router.call(text)
+        return await audio_codec.encode(audio_bytes, session_options["format"], session_options["bitrate"])
+
+    async def run_streaming_turn(websocket: WebSocket, user_text: str, conversation_history: list,
+                                 session_options: dict, spoken: list) -> str:
+        """
+        Streamed turn: LLM tokens are cut into sentences, each sentence is
+        synthesized as soon as it is complete, and the audio segments are
+        sent to the client in order while later sentences are still being
+        generated. Sentences are appended to spoken as they are sent.
+        """
+        pending = asyncio.Queue()
+        sentences = []
+        started = time.perf_counter()
+
+        async def produce():
+            try:
+                # Covers the whole generation, which overlaps synthesis of earlier sentences
+                with metrics.time_stage("llm"):
+                    # Failed over to the next backend if a stream fails before its first token
+                    tokens = llm_router.stream(user_text, conversation_history)
+                    async for sentence in iter_sentences(tokens):
+                        sentences.append(sentence)
+                        await pending.put((sentence, asyncio.create_task(synthesize(sentence, session_options))))
+            finally:
+                await pending.put(None)
+
+        producer = asyncio.create_task(produce())
+        seq = 0
+        try:
+            while True:
+                item = await pending.get()
+                if item is None:
+                    break
+                sentence, tts_task = item
+                audio_bytes = await tts_task
+                await send_audio_segment(websocket, session_options, seq, sentence, audio_bytes)
+                spoken.append(sentence)
+                if seq == 0 and audio_bytes:
+                    metrics.TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - started)
+                seq += 1
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            # Don't leave synthesis running for a client that has gone away
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+        ai_text_response = " ".join(sentences)
+        logger.info("AI Response: %s", redact(ai_text_response))
+        await send_turn_end(websocket, session_options, ai_text_response, seq)
+        logger.info("Streamed %s audio segments to client", seq)
+        return ai_text_response
+
     @app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
         try:
+            if startup_state["draining"]:
+                # Shutting down: refuse the handshake so the client tries another instance
+                await websocket.close(code=1013)
+                return
             await websocket.accept()
             logger.info("Client connected via WebSocket")
+
+            if not warmup_done.is_set():
+                # Lazy startup: hold the session until the providers are loaded
+                try:
+                    await asyncio.wait_for(warmup_done.wait(), WARMUP_WAIT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+            if not startup_state["ready"]:
+                if startup_state["error"]:
+                    error_msg = f"ERROR: Server failed to start: {startup_state['error']}"
+                else:
+                    error_msg = "ERROR: Server is still starting up, please try again shortly"
+                logger.error(error_msg)
+                await websocket.send_text(error_msg)
+                return
             
             # Test if API keys are available immediately
             groq_key = os.getenv("GROQ_API_KEY")
             elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
             
-            logger.info(f"GROQ_API_KEY available: {bool(groq_key)}")
-            logger.info(f"ELEVENLABS_API_KEY available: {bool(elevenlabs_key)}")
+            logger.info("GROQ_API_KEY available: %s", bool(groq_key))
+            logger.info("ELEVENLABS_API_KEY available: %s", bool(elevenlabs_key))
             
             if not groq_key:
                 error_msg = "ERROR: GROQ_API_KEY not set in environment variables"
@@ -101,55 +685,128 @@ try:
                 await websocket.send_text(error_msg)
                 return
             
-            conversation_history = []
+            # Token-budgeted history; older turns are summarized in the background
+            memory = ConversationMemory(summarize=summarize_conversation_async)
+            metrics.ACTIVE_SESSIONS.inc()
+            # Per-connection options, set by the client's "hello" control message
+            session_options = {
+                "stream": False,
+                "protocol": ws_protocol.LEGACY_PROTOCOL,
+                "turn": 0,
+                "next_seq": 0,
+                "recognizer": None,
+                "scheduler": None,
+                "memory": memory,
+                "session": None,
+                "format": None,
+                "bitrate": None,
+                "crisis": False,
+                "conversation": None,
+                "usage": session_memory.SessionUsage(),
+            }
+            usage = session_options["usage"]
+
+            async def transcribe(audio_bytes: bytes) -> str:
+                # Each utterance is its own task, so this only sets its STT request's priority and wait budget
+                rate_limiter.start_turn(session_priority(session_options))
+                usage.utterances += 1
+                usage.held_bytes += len(audio_bytes)
+                try:
+                    return await transcribe_utterance(audio_bytes)
+                finally:
+                    usage.held_bytes -= len(audio_bytes)
+
+            async def respond(turn: Turn):
+                await run_turn(websocket, turn, memory, session_options)
+                await save_session(session_options)
+
+            async def turn_cancelled(turn: Turn, reason: str):
+                if turn.spoken:
+                    # The user heard part of the reply before cutting in
+                    memory.add_exchange(turn.text, " ".join(turn.spoken))
+                    await save_session(session_options)
+                if session_options["protocol"] >= ws_protocol.BINARY_PROTOCOL:
+                    await websocket.send_json({"type": "turn_cancelled", "turn": session_options["turn"], "reason": reason})
+                elif reason == "no_speech":
+                    # Legacy clients only know AI_RESPONSE/ERROR text and would wait for a reply forever
+                    await websocket.send_text("ERROR: Didn't catch that, please try again")
+
+            async def final_transcript(transcription) -> str:
+                # Runs as a scheduler task, so the receive loop keeps reading stop and barge-in audio
+                rate_limiter.start_turn(session_priority(session_options))
+                user_text = await transcription
+                if user_text:
+                    logger.info("Transcribed text: %s", redact(user_text))
+                return user_text
+
+            async def turn_failed(error: Exception):
+                await websocket.send_text(f"ERROR: {str(error)}")
+
+            # Set before the scheduler starts so every turn task inherits it
+            conversation_id = uuid.uuid4().hex
+            current_conversation.set(conversation_id)
+            session_options["conversation"] = conversation_id
+
+            # Turns run in the background so a newer utterance or a "stop" can cancel them
+            scheduler = TurnScheduler(transcribe, respond, on_cancel=turn_cancelled, on_error=turn_failed)
+            session_options["scheduler"] = scheduler
+            scheduler.start()
+            live_sessions[websocket] = session_options
             
             try:
                 while True:
-                    data = await websocket.receive_bytes()
-                    logger.info(f"Received audio data, length: {len(data)} bytes")
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
 
-                    user_text = speech_to_text(data)
-                    logger.info(f"Transcribed text: {user_text}")
+                    if message.get("text") is not None:
+                        transcription = await handle_control_message(websocket, message["text"], session_options)
+                        if transcription is not None:
+                            scheduler.submit_transcription(final_transcript(transcription))
+                        continue
 
-                    crisis_keywords = ['kill myself', 'want to die', 'end it all', 'suicide']
-                    if any(keyword in user_text.lower() for keyword in crisis_keywords):
-                        crisis_response = "I hear that you're in immense pain, and that worries me. Your safety is the most important thing. Please, right now, reach out to a human professional at the National Suicide Prevention Lifeline by calling or texting 988. I am here with you."
-                        await websocket.send_text(f"CRISIS_RESPONSE:{crisis_response}")
+                    data = message.get("bytes")
+                    if not data:
+                        continue
+                    metrics.AUDIO_IN_BYTES.observe(len(data))
+                    rejected = session_memory.check_utterance(data)
+                    if rejected:
+                        usage.rejected += 1
+                        logger.warning("%s, refused", rejected)
+                        await websocket.send_text(f"ERROR: {rejected}")
                         continue
+                    usage.received(len(data))
 
-                    logger.info("Sending request to Groq AI...")
-                    ai_text_response = get_ai_response(user_text, conversation_history)
-                    
-                    conversation_history.append({"role": "user", "content": user_text})
-                    conversation_history.append({"role": "assistant", "content": ai_text_response})
-                    
-                    if len(conversation_history) > 8:
-                        conversation_history = conversation_history[-8:]
-
-                    logger.info(f"AI Response: {ai_text_response}")
-
-                    logger.info("Generating speech with ElevenLabs...")
-                    audio_bytes = text_to_speech(ai_text_response)
-                    
-                    if audio_bytes:
-                        response_data = {
-                            "text": ai_text_response,
-                            "audio": base64.b64encode(audio_bytes).decode('utf-8')
-                        }
-                        await websocket.send_json(response_data)
-                        logger.info("Sent text and audio response to client")
+                    recognizer = session_options["recognizer"]
+                    if recognizer is not None:
+                        # Streaming STT: small PCM chunks, endpointing on the server
+                        transcription = recognizer.feed(data)
+                        if transcription is not None:
+                            scheduler.submit_transcription(final_transcript(transcription))
                     else:
-                        await websocket.send_text(f"AI_RESPONSE:{ai_text_response}")
+                        scheduler.submit_audio(data)
+                    # Don't keep the last upload alive while waiting for the next message
+                    message = data = None
 
             except WebSocketDisconnect:
                 logger.info("Client disconnected")
             except Exception as e:
-                logger.error(f"Error in WebSocket communication: {e}")
+                logger.error("Error in WebSocket communication: %s", e)
                 logger.error(traceback.format_exc())
                 await websocket.send_text(f"ERROR: {str(e)}")
+            finally:
+                live_sessions.pop(websocket, None)
+                await scheduler.close()
+                metrics.ACTIVE_SESSIONS.dec()
+                await memory.close()
+                if providers.uses("llm", "ollama"):
+                    from utils.local_ai import forget
+                    forget(conversation_id)
+                # Picks up a summary that finished after the last turn
+                await save_session(session_options)
 
         except Exception as e:
-            logger.error(f"WebSocket endpoint setup failed: {e}")
+            logger.error("WebSocket endpoint setup failed: %s", e)
             logger.error(traceback.format_exc())
             raise
 
@@ -157,6 +814,21 @@ try:
     async def health_check():
         return {"status": "healthy", "service": "astra-backend"}
 
+    @app.get("/live")
+    async def liveness_probe():
+        """Liveness: the process is up and serving requests"""
+        return {"status": "alive"}
+
+    @app.get("/ready")
+    async def readiness_probe():
+        """Readiness: 503 until warmup has loaded the providers, and again while draining"""
+        if startup_state["draining"]:
+            return JSONResponse(status_code=503, content={"status": "draining", "error": None})
+        if startup_state["ready"]:
+            return {"status": "ready", "startup_mode": STARTUP_MODE}
+        status = "failed" if startup_state["error"] else "warming_up"
+        return JSONResponse(status_code=503, content={"status": status, "error": startup_state["error"]})
+
     @app.get("/test-keys")
     async def test_keys():
         """Endpoint to check if API keys are properly set"""
@@ -171,12 +843,10 @@ try:
         """Test if the external APIs are actually working"""
         try:
             # Test Groq API
-            from utils.groq_ai import get_ai_response
-            groq_test = get_ai_response("Hello, are you working?", [])
+            groq_test = await get_ai_response_async("Hello, are you working?", [])
             
             # Test ElevenLabs TTS
-            from utils.groq_tts import text_to_speech  
-            tts_test = text_to_speech("Test message")
+            tts_test = await text_to_speech_async("Test message")
             
             return {
                 "groq_working": bool(groq_test),
@@ -188,16 +858,79 @@ try:
         except Exception as e:
             return {"error": str(e), "traceback": traceback.format_exc()}
 
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        """Prometheus text-format metrics for the voice pipeline"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/providers")
+    async def provider_health():
+        """Rolling latency, error rate and circuit state per backend"""
+        return providers.snapshot()
+
+    @app.get("/model-tiers")
+    async def model_tiers():
+        """Model tiers per stage and each model's recent median latency"""
+        return model_tiering.snapshot()
+
+    @app.get("/tts-cache")
+    async def tts_cache_stats():
+        """Hit/miss counters and size of the TTS audio cache"""
+        return tts_cache.get_tts_cache().stats()
+
+    def session_memory_report(session_options: dict) -> dict:
+        recognizer = session_options["recognizer"]
+        report = {
+            "conversation": session_options["conversation"],
+            "turn": session_options["turn"],
+            "pending_utterances": session_options["scheduler"].pending,
+            **session_options["usage"].as_dict(),
+            "recognizer_bytes": recognizer.buffered_bytes if recognizer else 0,
+            "history_tokens": session_options["memory"].tokens,
+        }
+        if providers.uses("llm", "ollama"):
+            from utils.local_ai import context_bytes
+            report["ollama_context_bytes"] = context_bytes(session_options["conversation"])
+        return report
+
+    @app.get("/debug/memory")
+    async def memory_report(tracemalloc: str = "", top: int = 20):
+        """
+        Per-session and process memory (MEMORY_DEBUG=1 only). tracemalloc=start,
+        then tracemalloc=snapshot for the top allocation sites and their
+        growth since the previous snapshot; tracemalloc=stop when done.
+        """
+        if not session_memory.MEMORY_DEBUG:
+            return JSONResponse(status_code=404, content={"detail": "Not Found"})
+        sessions = [session_memory_report(s) for s in live_sessions.values()]
+        report = {
+            "process": session_memory.process_memory(),
+            "sessions": sessions,
+            "totals": {
+                "sessions": len(sessions),
+                "held_upload_bytes": sum(s["held_bytes"] for s in sessions),
+                "recognizer_bytes": sum(s["recognizer_bytes"] for s in sessions),
+            },
+        }
+        if tracemalloc:
+            # Snapshots of a large heap take a while; keep the event loop serving sessions
+            report["tracemalloc"] = await asyncio.to_thread(session_memory.tracemalloc_report, tracemalloc, top)
+        return report
+
     @app.get("/")
     async def root():
         return {"message": "Hello from Astra Therapy Backend! Local AI edition."}
 
     logger.info("FastAPI app setup completed successfully!")
-    logger.info("Server is ready to run...")
+    logger.info("Server is ready to run... (imported %.2fs after process start)", metrics.record_startup('imported'))
 
 except Exception as e:
-    logger.error(f"CRITICAL ERROR during application startup: {e}")
+    logger.error("CRITICAL ERROR during application startup: %s", e)
     logger.error(traceback.format_exc())
-    logger.info("Waiting 5 minutes before exit to allow log viewing...")
-    time.sleep(300)
+    # Hosts that only keep logs of a live process want a delay; autoscalers
+    # restarting a crashed instance want none (STARTUP_FAILURE_SLEEP=0)
+    failure_sleep = float(os.getenv("STARTUP_FAILURE_SLEEP", "300"))
+    if failure_sleep > 0:
+        logger.info("Waiting %.0f seconds before exit to allow log viewing...", failure_sleep)
+        time.sleep(failure_sleep)
     raise
\ No newline at end of file
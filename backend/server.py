@@ -0,0 +1,145 @@
+# backend/server.py
+"""
+Production entry point: uvicorn tuned for long-lived /ws sessions.
+
+  python server.py
+
+Settings come from the environment (see below). WEB_CONCURRENCY=auto runs
+one worker process per available core (CPU affinity and cgroup quota
+respected); the workers share the listening socket and each has its own
+event loop, providers and caches. On SIGTERM every worker stops taking
+sessions (/ready answers 503), lets turns in flight finish for up to
+DRAIN_TIMEOUT seconds, then closes the remaining sockets with 1012 so
+clients reconnect and resume on another instance.
+
+With more than one worker, sessions only resume across workers through a
+shared session store (SESSION_STORE=sqlite or redis), and /metrics shows
+the worker that happened to answer the scrape.
+
+benchmarks/server_configs.py compares configurations against /ws.
+"""
+import os
+import math
+import logging
+import importlib.util
+
+import uvicorn
+
+from utils.log_pipeline import configure_logging
+
+configure_logging()
+logger = logging.getLogger("server")
+
+HOST = os.getenv("HOST", "0.0.0.0")
+# Render and most PaaS hosts set PORT
+PORT = int(os.getenv("PORT", "8000"))
+# Worker processes: a number, or "auto" for one per available core
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY", "1")
+UVICORN_LOOP = os.getenv("UVICORN_LOOP", "uvloop" if importlib.util.find_spec("uvloop") else "asyncio")
+UVICORN_HTTP = os.getenv("UVICORN_HTTP", "httptools" if importlib.util.find_spec("httptools") else "h11")
+# Largest single WebSocket message; a buffered utterance is the biggest thing a
+# client sends, so by default the utterance limit, enforced as the frames arrive
+WS_MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES", os.getenv("MAX_UTTERANCE_BYTES", str(8 * 1024 * 1024))))
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "20"))
+# Off by default: the traffic is mostly compressed audio, which deflate only spends CPU on
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "0") == "1"
+# Longer than a load balancer's idle timeout (60s on most), so the proxy closes idle connections first
+HTTP_KEEP_ALIVE_TIMEOUT = int(os.getenv("HTTP_KEEP_ALIVE_TIMEOUT", "65"))
+# Per worker; connections past this get a 503 (0 = no limit)
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "0"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+ACCESS_LOG = os.getenv("ACCESS_LOG", "0") == "1"
+# How long a worker waits for turns in flight on SIGTERM; keep it under the
+# orchestrator's grace period (docker stop: 10s default, Kubernetes: 30s)
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "15"))
+
+
+def available_cpus() -> int:
+    """Cores this process may use: its CPU affinity, capped by a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count(setting: str = WEB_CONCURRENCY) -> int:
+    if setting.strip().lower() == "auto":
+        return available_cpus()
+    return max(1, int(setting))
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that lets the app finish its turns before connections are closed."""
+
+    async def shutdown(self, sockets=None):
+        # Already imported: config.load() imported main:app in this process
+        from main import app
+        try:
+            await app.state.drain(DRAIN_TIMEOUT)
+        except Exception as e:
+            logger.error("Draining sessions failed: %s", e)
+        await super().shutdown(sockets=sockets)
+
+
+def build_config(workers: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        ws="websockets",
+        ws_max_size=WS_MAX_MESSAGE_BYTES,
+        ws_ping_interval=WS_PING_INTERVAL or None,
+        ws_ping_timeout=WS_PING_TIMEOUT or None,
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+        timeout_keep_alive=HTTP_KEEP_ALIVE_TIMEOUT,
+        limit_concurrency=MAX_CONNECTIONS or None,
+        backlog=BACKLOG,
+        access_log=ACCESS_LOG,
+        # Leave logging to the pipeline configured above (and by main in each worker)
+        log_config=None,
+        # Past the drain, uvicorn's own wait for tasks only needs to be short
+        timeout_graceful_shutdown=5,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "*"),
+    )
+
+
+def main():
+    workers = worker_count()
+    if workers > 1:
+        if os.getenv("SESSION_STORE", "memory") == "memory":
+            logger.warning("%s workers with SESSION_STORE=memory: sessions only resume on the worker that started them", workers)
+        configured = ",".join(os.getenv(name, "") for name in ("STT_PROVIDERS", "LLM_PROVIDERS", "TTS_PROVIDERS"))
+        if {"local", "ollama", "coqui"} & {p.strip() for p in configured.split(",")}:
+            logger.warning("%s workers with local models configured: each worker loads its own copy", workers)
+
+    config = build_config(workers)
+    server = DrainingServer(config)
+    logger.info(
+        "Serving on %s:%s with %s worker(s), loop=%s http=%s ws_max=%s ping=%ss deflate=%s",
+        HOST, PORT, workers, UVICORN_LOOP, UVICORN_HTTP, WS_MAX_MESSAGE_BYTES,
+        WS_PING_INTERVAL, WS_PER_MESSAGE_DEFLATE,
+    )
+    if workers > 1:
+        # What uvicorn.run does for workers > 1, with our Server subclass in each worker
+        from uvicorn.supervisors import Multiprocess
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
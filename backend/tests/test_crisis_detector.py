@@ -0,0 +1,79 @@
+# backend/tests/test_crisis_detector.py
+"""
+The crisis detector must flag at least everything the substring check it
+replaced did: any of these keywords anywhere in the lowercased text.
+
+Run from backend/:  python -m pytest tests
+"""
+import pytest
+
+from utils.crisis_detector import CrisisDetector, detect_crisis, load_lexicon
+
+BASELINE_KEYWORDS = ("kill myself", "want to die", "end it all", "suicide")
+
+FLAGGED_BY_BASELINE = (
+    "I want to kill myself",
+    "Sometimes I think I should just kill myself.",
+    "I just want to die",
+    "I WANT TO DIE",
+    "i want to die lol",
+    "Honestly I want to die, everything is too much",
+    "I'm going to end it all tonight",
+    "I think about how to end it all",
+    "I've been thinking about suicide",
+    "Suicide.",
+    "There were two suicides at my school this year",
+    "my brother's suicide attempt scared me",
+    "I looked up suicide methods",
+)
+
+FLAGGED_SINCE = (
+    "I don't want to live anymore",
+    "I've been having suicidal thoughts",
+    "my friend overdosed last night",
+    "I keep thinking about overdosing",
+    "I've been cutting myself again",
+    "I wrote a suicide note",
+    "Everyone would be better off without me.",
+)
+
+NOT_FLAGGED = (
+    "I had a really good day at work",
+    "My cat knocked over a plant",
+    "I'm tired but I'll be okay",
+    "I can't stop thinking about the exam",
+)
+
+
+def baseline_flags(text: str) -> bool:
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in BASELINE_KEYWORDS)
+
+
+@pytest.mark.parametrize("text", FLAGGED_BY_BASELINE)
+def test_keeps_baseline_recall(text):
+    assert baseline_flags(text)
+    match = detect_crisis(text)
+    assert match, f"missed: {text!r}"
+    assert "suicidal_ideation" in match.categories
+
+
+@pytest.mark.parametrize("text", FLAGGED_SINCE)
+def test_flags_lexicon_phrases(text):
+    assert detect_crisis(text), f"missed: {text!r}"
+
+
+@pytest.mark.parametrize("text", NOT_FLAGGED)
+def test_ignores_ordinary_speech(text):
+    assert not detect_crisis(text)
+
+
+def test_phrases_start_at_a_word():
+    detector = CrisisDetector({"test": ["overdose"]})
+    assert detector.scan("he overdosed").phrases == ["overdose"]
+    assert not detector.scan("a notoverdose word")
+
+
+def test_shipped_lexicon_covers_baseline_keywords():
+    phrases = {phrase for phrases in load_lexicon().values() for phrase in phrases}
+    assert set(BASELINE_KEYWORDS) <= phrases
@@ -0,0 +1,68 @@
+# backend/tests/test_local_stt.py
+"""
+The local Whisper engine must not hand placeholder text to the router as
+a transcript: silence is "", a failure is an exception (so the router
+fails over). Skipped where faster-whisper isn't installed.
+
+Run from backend/:  python -m pytest tests
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faster_whisper")
+
+from utils import audio_processor  # noqa: E402
+from utils.local_stt_engine import _transcribe_batch  # noqa: E402
+
+
+class StubModel:
+    def __init__(self, texts=(), error=None):
+        self.texts = texts
+        self.error = error
+
+    def transcribe(self, audio, **kwargs):
+        if self.error:
+            raise self.error
+        segments = [SimpleNamespace(text=text) for text in self.texts]
+        return segments, SimpleNamespace(language="en", language_probability=1.0)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    def use(**kwargs):
+        stub = StubModel(**kwargs)
+        monkeypatch.setattr(audio_processor, "_whisper_model", stub)
+        return stub
+    return use
+
+
+SAMPLES = np.zeros(1600, dtype=np.float32)
+
+
+def test_speech(model):
+    model(texts=(" I feel", "tired "))
+    assert audio_processor.transcribe_audio(b"RIFF") == "I feel tired"
+    assert audio_processor.transcribe_audio_array(SAMPLES) == "I feel tired"
+
+
+def test_silence_is_empty(model):
+    model(texts=())
+    assert audio_processor.transcribe_audio(b"RIFF") == ""
+    assert audio_processor.transcribe_audio_array(SAMPLES) == ""
+
+
+def test_errors_raise(model):
+    model(error=RuntimeError("decode failed"))
+    with pytest.raises(RuntimeError):
+        audio_processor.transcribe_audio(b"RIFF")
+    with pytest.raises(RuntimeError):
+        audio_processor.transcribe_audio_array(SAMPLES)
+
+
+def test_batch_fails_only_the_failed_item(model):
+    model(error=RuntimeError("decode failed"))
+    results = _transcribe_batch([b"RIFF", SAMPLES], 1)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not any(isinstance(result, str) and result.startswith("[") for result in results)
@@ -0,0 +1,48 @@
+# backend/tests/test_session_memory.py
+"""
+Upload limits must never raise on malformed audio: a header that can't be
+read means "length unknown", not a crashed session.
+
+Run from backend/:  python -m pytest tests
+"""
+import io
+import wave
+
+import pytest
+
+from utils.model_tiering import stt_model
+from utils.session_memory import check_utterance, wav_duration
+
+
+def make_wav(seconds: float, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(b"\0\0" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+TRUNCATED = (
+    b"RIFF" + b"\0" * 4 + b"WAVE" + b"fmt " + b"\x10\0\0\0",
+    b"RIFF" + b"\0" * 4 + b"WAVE" + b"fmt " + b"\x10\0\0\0" + b"\x01\0\x01\0",
+    b"RIFF" + b"\0" * 4 + b"WAVE" + b"fmt ",
+    b"RIFF" + b"\0" * 4 + b"WAVE" + b"data",
+    make_wav(1.0)[:30],
+)
+
+
+def test_reads_duration_from_header():
+    assert wav_duration(make_wav(2.0)) == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize("audio", TRUNCATED)
+def test_truncated_header_is_unknown_length(audio):
+    assert wav_duration(audio) is None
+    assert check_utterance(audio) is None
+    assert stt_model(audio)
+
+
+def test_not_wav():
+    assert wav_duration(b"\x1aE\xdf\xa3webm") is None
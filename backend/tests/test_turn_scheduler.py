@@ -0,0 +1,51 @@
+# backend/tests/test_turn_scheduler.py
+"""
+A full turn inbox must never lose what the user said: overflowing
+utterances are merged into one turn, not dropped.
+
+Run from backend/:  python -m pytest tests
+"""
+import asyncio
+
+from utils.crisis_detector import detect_crisis
+from utils.turn_scheduler import TurnScheduler
+
+
+async def run_overflow(submit):
+    answered = []
+    release = asyncio.Event()
+
+    async def respond(turn):
+        answered.append(turn.text)
+        await release.wait()
+
+    async def transcribe(audio_bytes):
+        await asyncio.sleep(0.01)
+        return audio_bytes.decode()
+
+    scheduler = TurnScheduler(transcribe, respond, max_pending=2, barge_in=False)
+    scheduler.start()
+    scheduler.submit_text("first")
+    while not answered:
+        await asyncio.sleep(0)
+
+    # Four more utterances arrive while "first" is being answered
+    for text in ("I want to end it all", "two", "three", "four"):
+        submit(scheduler, text)
+        assert scheduler.pending <= 2
+    release.set()
+    while len(answered) < 2 or not scheduler.idle:
+        await asyncio.sleep(0.01)
+    await scheduler.close()
+    return answered
+
+
+def test_overflow_merges_pending_text():
+    answered = asyncio.run(run_overflow(lambda s, text: s.submit_text(text)))
+    assert answered == ["first", "I want to end it all two three four"]
+    assert detect_crisis(answered[1])
+
+
+def test_overflow_keeps_transcriptions_running():
+    answered = asyncio.run(run_overflow(lambda s, text: s.submit_audio(text.encode())))
+    assert answered == ["first", "I want to end it all two three four"]
@@ -0,0 +1,140 @@
+# backend/utils/audio_codec.py
+import os
+import shutil
+import asyncio
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional, Union
+
+from utils import metrics
+from utils.tts_cache import get_tts_cache, make_key
+from utils.ws_protocol import guess_audio_format
+
+logger = logging.getLogger(__name__)
+
+# Encoder settings (override via environment)
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+TTS_MP3_BITRATE_KBPS = int(os.getenv("TTS_MP3_BITRATE_KBPS", "48"))
+TTS_OPUS_BITRATE_KBPS = int(os.getenv("TTS_OPUS_BITRATE_KBPS", "24"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "10"))
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", str(os.cpu_count() or 2)))
+MIN_BITRATE_KBPS = 8
+MAX_BITRATE_KBPS = 192
+
+# Formats a client can ask for -> the container guess_audio_format reports.
+# Opus ships in Ogg, which is also what any Ogg output of a provider is.
+OUTPUT_FORMATS = {"wav": "wav", "mp3": "mpeg", "opus": "ogg"}
+
+DEFAULT_BITRATES = {"mp3": TTS_MP3_BITRATE_KBPS, "opus": TTS_OPUS_BITRATE_KBPS}
+
+_ENCODER_ARGS = {
+    "wav": ["-c:a", "pcm_s16le", "-f", "wav"],
+    "mp3": ["-c:a", "libmp3lame", "-f", "mp3"],
+    # voip tuning favours intelligibility at low bitrates
+    "opus": ["-c:a", "libopus", "-application", "voip", "-f", "ogg"],
+}
+
+_slots: Optional[asyncio.Semaphore] = None
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    available = shutil.which(FFMPEG_BIN) is not None
+    if not available:
+        logger.warning("%s not found; TTS audio is sent in the provider's own format", FFMPEG_BIN)
+    return available
+
+
+def negotiate_format(requested: Union[str, Iterable[str], None]) -> Optional[str]:
+    """
+    Picks the first format in the client's preference list that the server
+    can deliver. None means "no preference / can't transcode": audio is sent
+    as the TTS provider produced it, exactly as before negotiation existed.
+    """
+    if not requested:
+        return None
+    if isinstance(requested, str):
+        requested = [requested]
+    for audio_format in requested:
+        audio_format = str(audio_format).lower()
+        if audio_format in OUTPUT_FORMATS and ffmpeg_available():
+            return audio_format
+    return None
+
+
+def clamp_bitrate(audio_format: Optional[str], kbps=None) -> Optional[int]:
+    """The session bitrate for a format: the client's request within limits, or the default."""
+    if audio_format not in DEFAULT_BITRATES:
+        return None
+    try:
+        kbps = int(kbps) if kbps is not None else DEFAULT_BITRATES[audio_format]
+    except (TypeError, ValueError):
+        kbps = DEFAULT_BITRATES[audio_format]
+    return max(MIN_BITRATE_KBPS, min(MAX_BITRATE_KBPS, kbps))
+
+
+def _ffmpeg_command(audio_format: str, bitrate_kbps: Optional[int]) -> list:
+    command = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn", "-ac", "1"]
+    command += _ENCODER_ARGS[audio_format]
+    if bitrate_kbps:
+        command += ["-b:a", f"{bitrate_kbps}k"]
+    return command + ["pipe:1"]
+
+
+async def run_ffmpeg(command: list, audio_bytes: bytes) -> bytes:
+    """
+    Pipes audio_bytes through an ffmpeg command reading pipe:0 and writing
+    pipe:1, within the shared concurrency limit and TRANSCODE_TIMEOUT.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(TRANSCODE_CONCURRENCY)
+    async with _slots:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            output, errors = await asyncio.wait_for(process.communicate(audio_bytes), TRANSCODE_TIMEOUT)
+        except BaseException:
+            # Timeout or a cancelled turn: don't leave the encoder running
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+    if process.returncode != 0 or not output:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {errors.decode(errors='replace').strip()[:200]}")
+    return output
+
+
+async def encode(audio_bytes: bytes, audio_format: Optional[str], bitrate_kbps: Optional[int] = None) -> bytes:
+    """
+    Returns the audio in the session's negotiated format. Audio that is
+    already in that container passes through untouched (no lossy-to-lossy
+    re-encode); everything else is transcoded with ffmpeg and cached per
+    source audio, format and bitrate. On any failure the original audio is
+    returned, since a bigger payload beats a silent reply.
+    """
+    if not audio_bytes or audio_format is None:
+        return audio_bytes
+    if guess_audio_format(audio_bytes) == OUTPUT_FORMATS[audio_format]:
+        return audio_bytes
+
+    digest = hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+    key = make_key(digest, "transcode", str(bitrate_kbps or 0), audio_format)
+
+    async def transcode() -> bytes:
+        with metrics.time_stage("transcode"):
+            return await run_ffmpeg(_ffmpeg_command(audio_format, bitrate_kbps), audio_bytes)
+
+    try:
+        # Concurrent sessions sending the same clip share one ffmpeg run
+        return await get_tts_cache().get_or_fill(key, transcode)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning("Transcoding to %s failed, sending original audio: %s", audio_format, e)
+        return audio_bytes
@@ -0,0 +1,240 @@
+# backend/utils/audio_ingest.py
+import io
+import os
+import wave
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils import metrics, model_tiering
+from utils.audio_codec import FFMPEG_BIN, ffmpeg_available, run_ffmpeg
+from utils.session_memory import MAX_UTTERANCE_SECONDS
+from utils.streaming_stt import FRAME_MS, MIN_SPEECH_DBFS, SPEECH_MARGIN_DB, float_to_wav
+
+logger = logging.getLogger(__name__)
+
+# Ingest settings (override via environment)
+STT_INGEST = os.getenv("STT_INGEST", "1") == "1"
+# Whisper works at 16 kHz mono; anything more is upload overhead
+INGEST_SAMPLE_RATE = 16000
+# Kept around the detected speech so soft word onsets and endings survive
+INGEST_PAD_MS = int(os.getenv("INGEST_PAD_MS", "200"))
+# Less speech than this is treated as an empty utterance
+INGEST_MIN_SPEECH_MS = int(os.getenv("INGEST_MIN_SPEECH_MS", "120"))
+# "auto": WAV uploads go out as 16 kHz WAV (no encoder process); compressed
+# uploads (WebM/Ogg/MP4 from MediaRecorder) as 16 kHz Opus when that at least
+# halves them, else as they came. Or always one of wav, flac, opus.
+INGEST_UPLOAD_FORMAT = os.getenv("INGEST_UPLOAD_FORMAT", "auto")
+INGEST_OPUS_KBPS = int(os.getenv("INGEST_OPUS_KBPS", "24"))
+
+_UPLOAD_ENCODERS = {
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    # Lowest encoder complexity: about 4x faster than the default for ~10% more bytes
+    "opus": ["-c:a", "libopus", "-application", "voip", "-compression_level", "0",
+             "-b:a", f"{INGEST_OPUS_KBPS}k", "-f", "ogg"],
+}
+
+
+def _wav_samples(audio_bytes: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Decodes PCM WAV into float32 samples shaped (frames, channels). None
+    for WAV the wave module can't read (float or compressed data).
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames[:len(frames) - len(frames) % 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # Assemble little-endian 24-bit values in the top of an int32 to keep the sign
+        packed = (raw[:, 0] << 8) | (raw[:, 1] << 16) | (raw[:, 2] << 24)
+        samples = packed.astype(np.float32) / 2147483648.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        return None
+    usable = len(samples) - len(samples) % channels
+    return samples[:usable].reshape(-1, channels), rate
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Averages (frames, channels) down to mono."""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    # Summing whole columns is several times faster than mean(axis=1) over 2-6 values per row
+    mono = samples[:, 0].copy()
+    for channel in range(1, samples.shape[1]):
+        mono += samples[:, channel]
+    mono *= 1.0 / samples.shape[1]
+    return mono
+
+
+def resample(samples: np.ndarray, rate: int, target: int = INGEST_SAMPLE_RATE) -> np.ndarray:
+    """
+    Resamples mono audio. Whole-number downsampling ratios (48k, 32k) average
+    each group of samples; anything else is box-filtered when downsampling
+    and linearly interpolated. Crude next to a polyphase filter, but speech
+    recognition doesn't hear the difference and it is a few vector ops.
+    """
+    if rate == target or len(samples) == 0:
+        return samples
+    ratio = rate / target
+    if ratio > 1 and ratio.is_integer():
+        step = int(ratio)
+        usable = len(samples) - len(samples) % step
+        out = samples[0:usable:step].copy()
+        for offset in range(1, step):
+            out += samples[offset:usable:step]
+        out *= 1.0 / step
+        return out
+    if ratio > 1:
+        # Moving average over ~ratio samples keeps most of the aliasing out
+        width = int(round(ratio))
+        total = np.cumsum(samples, dtype=np.float64)
+        total = np.concatenate(([0.0], total))
+        samples = ((total[width:] - total[:-width]) / width).astype(np.float32)
+    positions = np.arange(int(len(samples) / ratio), dtype=np.float64) * ratio
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_levels(samples: np.ndarray, rate: int = INGEST_SAMPLE_RATE) -> np.ndarray:
+    """Per-frame RMS level in dBFS, FRAME_MS frames."""
+    frame = rate * FRAME_MS // 1000
+    frames = len(samples) // frame
+    if frames == 0:
+        return np.empty(0, dtype=np.float32)
+    shaped = samples[:frames * frame].reshape(frames, frame)
+    return 10.0 * np.log10(np.mean(shaped * shaped, axis=1) + 1e-12)
+
+
+def trim_silence(samples: np.ndarray, rate: int = INGEST_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Cuts leading and trailing silence, keeping INGEST_PAD_MS either side.
+    Speech frames sit SPEECH_MARGIN_DB above the quiet end of the clip (or
+    below its loudest frame, for clips that are speech throughout) and
+    above MIN_SPEECH_DBFS. Returns None if there isn't enough speech.
+    """
+    levels = frame_levels(samples, rate)
+    if len(levels) == 0:
+        return None
+    floor = np.percentile(levels, 10)
+    threshold = max(MIN_SPEECH_DBFS, min(floor + SPEECH_MARGIN_DB, levels.max() - SPEECH_MARGIN_DB))
+    speech = np.flatnonzero(levels > threshold)
+    if len(speech) * FRAME_MS < INGEST_MIN_SPEECH_MS:
+        return None
+    frame = rate * FRAME_MS // 1000
+    pad = rate * INGEST_PAD_MS // 1000
+    start = max(0, speech[0] * frame - pad)
+    end = min(len(samples), (speech[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def _process_wav(audio_bytes: bytes) -> Tuple[bool, Optional[np.ndarray]]:
+    """(decoded, speech samples at 16 kHz mono or None)"""
+    decoded = _wav_samples(audio_bytes)
+    if decoded is None:
+        return False, None
+    samples, rate = decoded
+    # Headers that check_utterance couldn't read still don't get to decode an hour of audio
+    samples = samples[:int(MAX_UTTERANCE_SECONDS * rate)]
+    return True, trim_silence(resample(downmix(samples), rate))
+
+
+def _process_pcm(samples: Optional[np.ndarray]) -> Tuple[bool, Optional[np.ndarray]]:
+    if samples is None:
+        return False, None
+    return True, trim_silence(samples)
+
+
+async def _decode_compressed(audio_bytes: bytes) -> Optional[np.ndarray]:
+    """
+    WebM/Ogg/MP4/MP3 through ffmpeg, which downmixes and resamples on the
+    way out. Stops at MAX_UTTERANCE_SECONDS: compressed audio doesn't say
+    how long it is until it has been decoded.
+    """
+    if not ffmpeg_available():
+        return None
+    pcm = await run_ffmpeg([
+        FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn",
+        "-t", str(MAX_UTTERANCE_SECONDS),
+        "-ac", "1", "-ar", str(INGEST_SAMPLE_RATE), "-f", "s16le", "pipe:1",
+    ], audio_bytes)
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+async def _encode_upload(samples: np.ndarray, upload_format: str) -> bytes:
+    if upload_format not in _UPLOAD_ENCODERS or not ffmpeg_available():
+        return float_to_wav(samples, INGEST_SAMPLE_RATE)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+    return await run_ffmpeg([
+        FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(INGEST_SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+        *_UPLOAD_ENCODERS[upload_format], "pipe:1",
+    ], pcm)
+
+
+async def prepare_utterance(audio_bytes: bytes) -> Optional[bytes]:
+    """
+    Turns an uploaded utterance into what STT needs: 16 kHz mono with the
+    silence at either end cut off, re-encoded compactly. Returns None when
+    the clip holds no speech, so the caller can skip the STT request.
+    Audio that can't be decoded here is returned unchanged.
+    """
+    if not STT_INGEST or not audio_bytes:
+        return audio_bytes
+    wav = audio_bytes[:4] == b"RIFF"
+    try:
+        with metrics.time_stage("ingest"):
+            # The array work runs in a thread; NumPy releases the GIL for most of it
+            if wav:
+                decoded, samples = await asyncio.to_thread(_process_wav, audio_bytes)
+            else:
+                decoded, samples = await asyncio.to_thread(_process_pcm, await _decode_compressed(audio_bytes))
+
+            if not decoded:
+                metrics.INGEST_RESULTS.labels("passthrough").inc()
+                return audio_bytes
+            if samples is None:
+                metrics.INGEST_RESULTS.labels("no_speech").inc()
+                logger.info("No speech in %s bytes of uploaded audio, skipping STT", len(audio_bytes))
+                return None
+
+            upload_format = INGEST_UPLOAD_FORMAT
+            if upload_format == "auto":
+                upload_format = "wav" if wav else "opus"
+                if not wav and len(samples) / INGEST_SAMPLE_RATE * INGEST_OPUS_KBPS * 125 > len(audio_bytes) / 2:
+                    # A compact recording with little silence: not worth an encoder process
+                    upload_format = "original"
+            if upload_format == "original":
+                upload = audio_bytes
+            else:
+                upload = await _encode_upload(samples, upload_format)
+                if len(upload) >= len(audio_bytes):
+                    upload, upload_format = audio_bytes, "original"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning("Audio ingest failed, sending the original upload: %s", e)
+        metrics.INGEST_RESULTS.labels("failed").inc()
+        return audio_bytes
+
+    metrics.INGEST_RESULTS.labels("speech").inc()
+    metrics.STT_UPLOAD_BYTES.observe(len(upload))
+    # Short clips can go to a smaller Whisper model
+    model_tiering.speech_seconds.set(len(samples) / INGEST_SAMPLE_RATE)
+    logger.info(
+        "Ingested %s bytes -> %s bytes (%.2fs of speech, %s)",
+        len(audio_bytes), len(upload), len(samples) / INGEST_SAMPLE_RATE, upload_format,
+    )
+    return upload
@@ -1,37 +1,47 @@
 # backend/utils/audio_processor.py
 
 from faster_whisper import WhisperModel
-import tempfile
+import io
 import os
 import logging
 import numpy as np
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from utils.log_pipeline import redact
+
 logger = logging.getLogger(__name__)
 
+# Model settings (override via environment)
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "tiny")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "5"))
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = library default
+
 # Cache the model
 _whisper_model = None
 
-def get_whisper_model():
+def get_whisper_model(model_size: str = None, device: str = None, compute_type: str = None, cpu_threads: int = None):
     """
-    Initializes and returns the faster-whisper model.
+    Initializes and returns the faster-whisper model. Arguments override
+    the WHISPER_* settings the first time the model is loaded.
     """
     global _whisper_model
     if _whisper_model is None:
-        logger.info("Loading faster-whisper model... (This may take a moment)")
+        model_size = model_size or WHISPER_MODEL_SIZE
+        logger.info("Loading faster-whisper '%s' model... (This may take a moment)", model_size)
         # Use CPU for compatibility, but you can use "cuda" if you have a GPU
         # "int8" compute type is efficient for CPU usage
         _whisper_model = WhisperModel(
-            "tiny",
-            device="cpu",
-            compute_type="int8",
+            model_size,
+            device=device or WHISPER_DEVICE,
+            compute_type=compute_type or WHISPER_COMPUTE_TYPE,
+            cpu_threads=cpu_threads if cpu_threads is not None else WHISPER_CPU_THREADS,
             download_root="./models"  # Optional: specify download directory
         )
         logger.info("faster-whisper model loaded!")
     return _whisper_model
 
-def transcribe_audio(audio_bytes: bytes) -> str:
+def transcribe_audio(audio_bytes: bytes, beam_size: int = None) -> str:
     """
     Converts raw audio bytes to text using faster-whisper.
     
@@ -39,24 +49,22 @@ def transcribe_audio(audio_bytes: bytes) -> str:
         audio_bytes: Raw audio data in bytes (e.g., from WebSocket)
     
     Returns:
-        Transcribed text as a string
+        Transcribed text as a string, "" if the audio holds no speech.
+        Errors are raised (after logging) so the provider router can fail
+        over instead of passing a placeholder on as the user's words.
     """
-    tmp_path = None
     try:
         model = get_whisper_model()
         
-        # Save to temporary file (faster-whisper needs a file path)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_file:
-            tmp_file.write(audio_bytes)
-            tmp_path = tmp_file.name
-        
-        logger.info(f"Transcribing audio file: {tmp_path}")
+        # faster-whisper decodes file-like objects directly, so the upload
+        # never touches the filesystem
+        logger.info("Transcribing %s bytes of audio from memory", len(audio_bytes))
         
         # Transcribe using faster-whisper with optimized settings
         segments, info = model.transcribe(
-            tmp_path,
+            io.BytesIO(audio_bytes),
             language="en",        # Specify English for better accuracy
-            beam_size=5,          # Balance between speed and accuracy
+            beam_size=beam_size or WHISPER_BEAM_SIZE,  # Balance between speed and accuracy
             vad_filter=True,      # Voice activity detection to remove silence
             vad_parameters=dict(
                 min_silence_duration_ms=500,
@@ -64,54 +72,54 @@ def transcribe_audio(audio_bytes: bytes) -> str:
             )
         )
         
-        logger.info(f"Detected language: {info.language}, probability: {info.language_probability}")
+        logger.info("Detected language: %s, probability: %s", info.language, info.language_probability)
         
         # Combine all segments into a single transcription
         transcription = " ".join(segment.text for segment in segments).strip()
         
-        if not transcription:
-            transcription = "[I didn't catch that. Could you please repeat?]"
-        
-        logger.info(f"Transcription: '{transcription}'")
+        logger.info("Transcription: '%s'", redact(transcription))
         return transcription
         
     except Exception as e:
-        logger.error(f"Error in transcription: {e}")
-        # Return a friendly error message if transcription fails
-        return "[Sorry, I couldn't understand the audio. Please try again.]"
-    
-    finally:
-        # Always clean up the temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-                logger.debug("Temporary file cleaned up")
-            except Exception as cleanup_error:
-                logger.warning(f"Could not delete temp file {tmp_path}: {cleanup_error}")
+        logger.error("Error in transcription: %s", e)
+        raise
 
 # Optional: If you need array processing later, you can add this function back
 # with proper numpy import
 
 
 
-def transcribe_audio_array(audio_array: np.ndarray, sample_rate: int = 16000) -> str:
-    
+def transcribe_audio_array(audio_array: np.ndarray, sample_rate: int = 16000, beam_size: int = None) -> str:
+    """
+    Transcribes float32 samples; "" if they hold no speech. Errors are
+    raised, as in transcribe_audio.
+    """
     try:
         model = get_whisper_model()
         
+        # faster-whisper expects 16 kHz float32 samples and has no
+        # sample_rate argument, so resample here if needed
+        audio_array = np.asarray(audio_array, dtype=np.float32)
+        if sample_rate != 16000 and len(audio_array):
+            target = int(round(len(audio_array) * 16000 / sample_rate))
+            audio_array = np.interp(
+                np.linspace(0, len(audio_array) - 1, target),
+                np.arange(len(audio_array)),
+                audio_array
+            ).astype(np.float32)
+        
         # Transcribe directly from numpy array
         segments, info = model.transcribe(
             audio_array,
             language="en",
-            beam_size=5,
-            vad_filter=True,
-            sample_rate=sample_rate
+            beam_size=beam_size or WHISPER_BEAM_SIZE,
+            vad_filter=True
         )
         
         transcription = " ".join(segment.text for segment in segments).strip()
-        logger.info(f"Array transcription: '{transcription}'")
+        logger.info("Array transcription: '%s'", redact(transcription))
         return transcription
         
     except Exception as e:
-        logger.error(f"Error in array transcription: {e}")
-        return "[Audio processing error]"
+        logger.error("Error in array transcription: %s", e)
+        raise
@@ -0,0 +1,186 @@
+# backend/utils/batching_pool.py
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def _ping(delay: float) -> int:
+    # Keeps a worker busy long enough that warmup reaches every process
+    time.sleep(delay)
+    return os.getpid()
+
+
+class BatchingProcessPool:
+    """
+    A pool of worker processes that each keep a model resident, fed by an
+    asyncio queue shared by every session.
+
+    Queued requests are spread over the idle workers: each dispatch takes
+    ceil(queued / idle workers) of them (at most max_batch), so a burst
+    runs in parallel instead of queueing behind one worker. A handler
+    that runs a batch faster than its items one at a time (real batch
+    inference) can set max_wait_ms to hold each batch open that long for
+    requests arriving close together.
+
+    initializer(*initargs) runs once in every worker and should load the
+    model into a module global. batch_handler(items, *handler_args) runs in
+    a worker and must return one result per item; a result that is an
+    Exception instance fails only that item. Both must be module-level
+    functions so they can be pickled.
+    """
+
+    def __init__(self, name: str, initializer: Callable, initargs: Sequence,
+                 batch_handler: Callable, handler_args: Sequence = (),
+                 workers: int = 1, max_batch: int = 8, max_wait_ms: float = 0):
+        self.name = name
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.batch_handler = batch_handler
+        self.handler_args = tuple(handler_args)
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Workers running a batch
+        self._busy = 0
+        self._batches = set()
+        self.batches_run = 0
+        self.items_run = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self, warmup: bool = True):
+        """
+        Spawns the workers and, with warmup, waits until every one of them
+        has run its initializer (i.e. loaded its model).
+        """
+        if self._executor is not None:
+            return
+        started = time.perf_counter()
+        # spawn: the models are not fork-safe and the parent holds an event loop
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+        if warmup:
+            loop = asyncio.get_running_loop()
+            pids = await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _ping, 0.2) for _ in range(self.workers)
+            ))
+            logger.info(
+                "%s pool ready: %s workers warmed in %.1fs",
+                self.name, len(set(pids)), time.perf_counter() - started,
+            )
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("%s pool stopped", self.name)
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queues one item and waits for its result.
+        """
+        if self._executor is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        # This worker's share of what is waiting; the rest goes to the other idle workers
+        idle = max(1, self.workers - self._busy)
+        share = min(self.max_batch, -(-(len(batch) + self._queue.qsize()) // idle))
+        while len(batch) < share:
+            batch.append(self._queue.get_nowait())
+        deadline = time.monotonic() + self.max_wait
+        while self.max_wait > 0 and len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Requests whose caller went away (e.g. barge-in) need no work
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            self._busy += 1
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self.batch_handler, items, *self.handler_args)
+        except Exception as e:
+            logger.error("%s batch of %s failed: %s", self.name, len(items), e)
+            results = [e] * len(items)
+        finally:
+            self._busy -= 1
+            self._slots.release()
+
+        self.batches_run += 1
+        self.items_run += len(items)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "batches": self.batches_run,
+            "items": self.items_run,
+            "mean_batch": round(self.items_run / self.batches_run, 2) if self.batches_run else 0.0,
+        }
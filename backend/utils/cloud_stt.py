@@ -1,16 +1,34 @@
 # backend/utils/cloud_stt.py
 import os
-import tempfile
+import time
 import logging
-import groq
-from dotenv import load_dotenv
+import httpx
+
+from utils import http_client, model_tiering
+from utils.ws_protocol import guess_audio_format
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+_client = None
+
+GROQ_TRANSCRIPTION_URL = f"{http_client.GROQ_BASE_URL}/openai/v1/audio/transcriptions"
+
+# Whisper goes by the file extension, so name uploads after their container
+_UPLOAD_NAMES = {"ogg": "audio.ogg", "flac": "audio.flac", "mpeg": "audio.mp3", "webm": "audio.webm", "mp4": "audio.m4a"}
+
+def _upload_name(audio_bytes: bytes) -> str:
+    return _UPLOAD_NAMES.get(guess_audio_format(audio_bytes), "audio.wav")
 
-# Initialize the Groq client
-client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"))
+def get_client():
+    """
+    The Groq SDK client for the blocking speech_to_text. Built on first
+    use: the async path doesn't need it and the SDK is slow to import.
+    """
+    global _client
+    if _client is None:
+        import groq
+        _client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=http_client.GROQ_BASE_URL)
+    return _client
 
 def speech_to_text(audio_bytes: bytes) -> str:
     """
@@ -21,28 +39,63 @@ def speech_to_text(audio_bytes: bytes) -> str:
             logger.error("GROQ_API_KEY not set.")
             return ""
 
-        logger.info("Transcribing audio with Groq Whisper API...")
+        model = model_tiering.stt_model(audio_bytes)
+        logger.info("Transcribing audio with Groq Whisper API (%s)...", model)
+        started = time.perf_counter()
         
-        # Create a temporary file for the audio bytes
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            tmp_file.write(audio_bytes)
-            tmp_file_path = tmp_file.name
-
-        try:
-            # Open the temporary file and send it to Groq
-            with open(tmp_file_path, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-large-v3",  # Specify Groq's Whisper model
-                    response_format="text",    # Get plain text directly
-                    language="en"              # Optional: for accuracy
-                )
-            # Since we use response_format="text", transcript is a string
-            return transcript
-        finally:
-            # Clean up the temporary file
-            os.unlink(tmp_file_path)
+        # Upload straight from memory: (filename, content) needs no temp file
+        transcript = get_client().audio.transcriptions.create(
+            file=(_upload_name(audio_bytes), audio_bytes),
+            model=model,               # Groq's Whisper model, by model_tiering
+            response_format="text",    # Get plain text directly
+            language="en"              # Optional: for accuracy
+        )
+        model_tiering.record_latency("stt", model, time.perf_counter() - started)
+        # Since we use response_format="text", transcript is a string
+        return transcript
+
+    except Exception as e:
+        logger.error("Error in Groq speech-to-text: %s", e)
+        return ""
 
+async def transcribe_async(audio_bytes: bytes) -> str:
+    """
+    Uploads audio to Groq Whisper through the shared pooled HTTP client.
+    Raises on any failure; the provider router relies on that to tell an
+    outage apart from a silent clip.
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise RuntimeError("GROQ_API_KEY not set.")
+
+    model = model_tiering.stt_model(audio_bytes)
+    logger.info("Transcribing audio with Groq Whisper API (%s, async)...", model)
+    started = time.perf_counter()
+
+    response = await http_client.post(
+        GROQ_TRANSCRIPTION_URL,
+        headers={"Authorization": f"Bearer {api_key}"},
+        files={"file": (_upload_name(audio_bytes), audio_bytes)},
+        data={
+            "model": model,
+            "response_format": "text",
+            "language": "en"
+        },
+    )
+    response.raise_for_status()
+    model_tiering.record_latency("stt", model, time.perf_counter() - started)
+    return response.text
+
+async def speech_to_text_async(audio_bytes: bytes) -> str:
+    """
+    Async variant of speech_to_text. Uploads the audio through the shared
+    pooled HTTP client instead of blocking the event loop.
+    """
+    try:
+        return await transcribe_async(audio_bytes)
+    except httpx.HTTPStatusError as e:
+        logger.error("Groq speech-to-text HTTP error: %s - %s", e.response.status_code, e.response.text)
+        return ""
     except Exception as e:
-        logger.error(f"Error in Groq speech-to-text: {e}")
-        return ""
\ No newline at end of file
+        logger.error("Error in Groq speech-to-text: %s", e)
+        return ""
@@ -1,17 +1,32 @@
 # backend/utils/cloud_tts.py
 import os
-from elevenlabs import generate, play, set_api_key, save
-import requests
 import logging
-from dotenv import load_dotenv
 
-load_dotenv()  # Load environment variables (for local dev)
+from utils.tts_cache import cached_tts
+from utils.log_pipeline import redact
 
 logger = logging.getLogger(__name__)
 # Configure ElevenLabs API Key (set this in Render's environment variables)
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-set_api_key(ELEVENLABS_API_KEY)
 
+ELEVENLABS_MODEL = "eleven_monolingual_v1"
+
+_generate = None
+
+
+def get_generate():
+    """
+    elevenlabs.generate with the API key applied. The SDK is imported on
+    the first synthesis rather than at server start.
+    """
+    global _generate
+    if _generate is None:
+        from elevenlabs import generate, set_api_key
+        set_api_key(ELEVENLABS_API_KEY)
+        _generate = generate
+    return _generate
+
+@cached_tts("elevenlabs", ELEVENLABS_MODEL, "mp3", default_voice="Rachel")
 def text_to_speech(text: str, voice: str = "Rachel") -> bytes:
     """
     Converts text to speech using ElevenLabs API.
@@ -22,18 +37,18 @@ def text_to_speech(text: str, voice: str = "Rachel") -> bytes:
             logger.error("ELEVENLABS_API_KEY not set.")
             return b""
 
-        logger.info(f"Generating ElevenLabs speech: '{text}'")
+        logger.info("Generating ElevenLabs speech: '%s'", redact(text))
 
         # Generate audio bytes directly from the API
-        audio = generate(
+        audio = get_generate()(
             text=text,
             voice=voice, # You can use "Rachel", "Domi", "Bella", "Antoni", etc.
-            model="eleven_monolingual_v1"
+            model=ELEVENLABS_MODEL
         )
 
-        logger.info(f"Generated audio: {len(audio)} bytes")
+        logger.info("Generated audio: %s bytes", len(audio))
         return audio
 
     except Exception as e:
-        logger.error(f"Error in ElevenLabs TTS generation: {e}")
+        logger.error("Error in ElevenLabs TTS generation: %s", e)
         return b""
\ No newline at end of file
@@ -0,0 +1,164 @@
+# backend/utils/conversation_memory.py
+import os
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the history part of the prompt (override via environment)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "150"))
+
+# Chat models average about four characters of English per token; that is
+# close enough for budgeting without shipping a tokenizer.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# Opaque id of the conversation the current task is replying in. Set once per
+# session before its turn tasks are created; backends that keep per-conversation
+# server state (Ollama's evaluated context) key it on this.
+current_conversation: ContextVar[Optional[str]] = ContextVar("current_conversation", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap approximate token count for one message's content.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+Summarizer = Callable[[str, List[Dict]], Awaitable[str]]
+
+
+class ConversationMemory:
+    """
+    Per-session conversation context bounded by a token budget.
+
+    Recent turns are kept verbatim with their token counts tracked
+    incrementally. When the budget is exceeded the oldest turns are moved
+    out and folded into a running summary by a background task, so the
+    reply to the current turn never waits on summarization.
+    """
+
+    def __init__(self, summarize: Optional[Summarizer] = None,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 summary_budget: int = SUMMARY_TOKEN_BUDGET):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.summary = ""
+        self._turns = deque()  # (message, tokens)
+        self._turn_tokens = 0
+        self._evicted: List[Dict] = []
+        self._summarizing: List[Dict] = []
+        self._summary_task: Optional[asyncio.Task] = None
+
+    @property
+    def summary_tokens(self) -> int:
+        return estimate_tokens(SUMMARY_PREFIX + self.summary) if self.summary else 0
+
+    @property
+    def tokens(self) -> int:
+        """Approximate tokens the history will add to the next prompt."""
+        return self._turn_tokens + self.summary_tokens
+
+    def add_exchange(self, user_text: str, assistant_text: str):
+        """
+        Records one user/assistant exchange and evicts the oldest turns
+        that no longer fit in the budget.
+        """
+        for message in ({"role": "user", "content": user_text},
+                        {"role": "assistant", "content": assistant_text}):
+            tokens = estimate_tokens(message["content"])
+            self._turns.append((message, tokens))
+            self._turn_tokens += tokens
+        self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        # Always keep the latest exchange, even if it alone is over budget
+        available = self.token_budget - min(self.summary_tokens, self.summary_budget)
+        while len(self._turns) > 2 and self._turn_tokens > available:
+            message, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            self._evicted.append(message)
+
+        if self._evicted:
+            self._schedule_summary()
+
+    def snapshot(self) -> Dict:
+        """
+        JSON-serializable state for the session store. Turns evicted but
+        not yet folded into the summary are included, so a resumed session
+        summarizes them instead of losing them.
+        """
+        return {
+            "summary": self.summary,
+            "turns": [message for message, _ in self._turns],
+            "evicted": self._summarizing + self._evicted,
+        }
+
+    def restore(self, state: Dict):
+        """Replaces this memory's contents with a snapshot()."""
+        self.summary = state.get("summary", "")
+        self._turns.clear()
+        self._turn_tokens = 0
+        for message in state.get("turns", []):
+            tokens = estimate_tokens(message["content"])
+            self._turns.append((message, tokens))
+            self._turn_tokens += tokens
+        self._evicted = list(state.get("evicted", []))
+        # The budget may have changed since the snapshot was taken
+        self._evict_over_budget()
+
+    def history(self) -> List[Dict]:
+        """
+        Messages to send between the system prompt and the new user
+        message: the running summary (if any) followed by recent turns.
+        """
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+        messages.extend(message for message, _ in self._turns)
+        return messages
+
+    def _schedule_summary(self):
+        if self.summarize is None:
+            # No summarizer configured: evicted turns are simply dropped
+            self._evicted.clear()
+            return
+        if self._summary_task is None or self._summary_task.done():
+            self._summary_task = asyncio.create_task(self._summarize_evicted())
+
+    async def _summarize_evicted(self):
+        while self._evicted:
+            self._summarizing, self._evicted = self._evicted, []
+            try:
+                summary = await self.summarize(self.summary, self._summarizing)
+            except Exception as e:
+                logger.warning("Conversation summarization failed: %s", e)
+                self._summarizing = []
+                continue
+            self._summarizing = []
+            if summary:
+                self.summary = self._clip(summary.strip())
+                logger.info("Conversation summary updated (~%s tokens)", self.summary_tokens)
+
+    def _clip(self, summary: str) -> str:
+        max_chars = self.summary_budget * CHARS_PER_TOKEN
+        if len(summary) <= max_chars:
+            return summary
+        return summary[:max_chars].rsplit(" ", 1)[0] + "..."
+
+    async def close(self):
+        """Stops any in-flight summarization when the session ends."""
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
+            try:
+                await self._summary_task
+            except asyncio.CancelledError:
+                pass
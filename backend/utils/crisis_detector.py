@@ -0,0 +1,166 @@
+# backend/utils/crisis_detector.py
+import os
+import re
+import json
+import logging
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "crisis_lexicon.json")
+CRISIS_LEXICON_PATH = os.getenv("CRISIS_LEXICON_PATH", DEFAULT_LEXICON_PATH)
+
+# Contractions are expanded so "I don't want to live" and "I do not want
+# to live" normalize to the same text. Order matters: specific forms first.
+_CONTRACTIONS = (
+    (re.compile(r"\bcan'?t\b"), "can not"),
+    (re.compile(r"\bcannot\b"), "can not"),
+    (re.compile(r"\bwon'?t\b"), "will not"),
+    (re.compile(r"\bain'?t\b"), "am not"),
+    (re.compile(r"\b(i)'?m\b"), r"\1 am"),
+    (re.compile(r"(\w)n't\b"), r"\1 not"),
+    (re.compile(r"(\w)'re\b"), r"\1 are"),
+    (re.compile(r"(\w)'ve\b"), r"\1 have"),
+    (re.compile(r"(\w)'ll\b"), r"\1 will"),
+    (re.compile(r"(\w)'d\b"), r"\1 would"),
+    (re.compile(r"\bdont\b"), "do not"),
+    (re.compile(r"\bdoesnt\b"), "does not"),
+    (re.compile(r"\bwanna\b"), "want to"),
+    (re.compile(r"\bgonna\b"), "going to"),
+)
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'"})
+_NON_WORD = re.compile(r"[^a-z0-9']+|'")
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases, folds unicode, expands contractions and replaces every run
+    of punctuation/whitespace with a single space. The result is padded
+    with spaces so phrase matches can be anchored to word boundaries.
+    """
+    text = unicodedata.normalize("NFKC", text).translate(_APOSTROPHES).lower()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return " " + " ".join(_NON_WORD.sub(" ", text).split()) + " "
+
+
+@dataclass
+class CrisisMatch:
+    """Result of scanning one utterance."""
+    categories: List[str] = field(default_factory=list)
+    phrases: List[str] = field(default_factory=list)
+
+    @property
+    def is_crisis(self) -> bool:
+        return bool(self.phrases)
+
+    def __bool__(self) -> bool:
+        return self.is_crisis
+
+
+class CrisisDetector:
+    """
+    Aho-Corasick automaton over the normalized lexicon. Scanning visits
+    each character of the utterance once, so the cost depends on the text
+    length and not on how many phrases the lexicon holds.
+
+    A phrase must start at the beginning of a word but may end inside
+    one, so inflections count ("suicides", "my friend overdosed") as
+    they did for the substring check this replaced.
+    """
+
+    def __init__(self, lexicon: Dict[str, Iterable[str]]):
+        # State 0 is the root; each state has a transition dict, a failure
+        # link and the (category, phrase) pairs that end there.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[str, str], ...]] = [()]
+        self.phrase_count = 0
+
+        for category, phrases in lexicon.items():
+            for phrase in phrases:
+                # Leading space only: anchored to the start of a word, not the end
+                key = normalize(phrase).rstrip()
+                if key.strip():
+                    self._add(key, (category, key.strip()))
+        self._build_failure_links()
+
+    def _add(self, key: str, output: Tuple[str, str]):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        if output not in self._out[state]:
+            self._out[state] += (output,)
+            self.phrase_count += 1
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Merge outputs so a scan never has to walk failure chains
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def scan(self, text: str) -> CrisisMatch:
+        """
+        Returns every lexicon phrase found in text, with its categories.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = {}
+        for char in normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for category, phrase in out[state]:
+                    found.setdefault(phrase, category)
+
+        match = CrisisMatch()
+        for phrase, category in found.items():
+            match.phrases.append(phrase)
+            if category not in match.categories:
+                match.categories.append(category)
+        return match
+
+
+def load_lexicon(path: str = CRISIS_LEXICON_PATH) -> Dict[str, List[str]]:
+    """
+    Reads a lexicon file: a JSON object mapping category -> list of phrases.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lexicon = json.load(f)
+    if not isinstance(lexicon, dict):
+        raise ValueError(f"Crisis lexicon {path} must map categories to phrase lists")
+    return lexicon
+
+
+_detector: Optional[CrisisDetector] = None
+
+
+def get_crisis_detector() -> CrisisDetector:
+    global _detector
+    if _detector is None:
+        _detector = CrisisDetector(load_lexicon())
+        logger.info("Crisis detector loaded %s phrases", _detector.phrase_count)
+    return _detector
+
+
+def detect_crisis(text: str) -> CrisisMatch:
+    return get_crisis_detector().scan(text)
@@ -3,8 +3,13 @@ import requests
 import logging
 import re
 
+from utils.http_client import GOOGLE_TTS_URL
+from utils.tts_cache import cached_tts
+from utils.log_pipeline import redact
+
 logger = logging.getLogger(__name__)
 
+@cached_tts("google", "translate_tts", "mp3", default_voice="en")
 def text_to_speech(text: str) -> bytes:
     """
     Free TTS using Google's public TTS API.
@@ -17,11 +22,11 @@ def text_to_speech(text: str) -> bytes:
         if not cleaned_text.strip():
             return b""
             
-        logger.info(f"Generating free TTS for: '{cleaned_text}...'")
+        logger.info("Generating free TTS for: '%s'", redact(cleaned_text))
         
         # Use Google's free TTS API
         response = requests.get(
-            "https://translate.google.com/translate_tts",
+            GOOGLE_TTS_URL,
             params={
                 'ie': 'UTF-8',
                 'q': cleaned_text,
@@ -37,12 +42,12 @@ def text_to_speech(text: str) -> bytes:
         )
         
         if response.status_code == 200:
-            logger.info(f"Free TTS generated {len(response.content)} bytes")
+            logger.info("Free TTS generated %s bytes", len(response.content))
             return response.content
         else:
-            logger.warning(f"Free TTS API failed with status: {response.status_code}")
+            logger.warning("Free TTS API failed with status: %s", response.status_code)
             return b""
             
     except Exception as e:
-        logger.error(f"Free TTS error: {e}")
+        logger.error("Free TTS error: %s", e)
         return b""  # Silent fallback to avoid crashing
\ No newline at end of file
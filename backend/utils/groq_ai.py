@@ -1,8 +1,13 @@
 # backend/utils/groq_ai.py
 import os
-import requests
+import json
+import time
+import httpx
 import logging
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
+
+from utils import http_client, model_tiering, rate_limiter
+from utils.log_pipeline import redact
 
 logger = logging.getLogger(__name__)
 
@@ -19,57 +24,206 @@ Keep your responses:
 
 Respond as if you are in a real-time conversation."""
 
+# Fixed replies used when the AI service fails; these are spoken often
+# enough that the TTS cache prewarms them at startup
+HTTP_ERROR_RESPONSE = "I'm having trouble connecting to the AI service. Please try again."
+NETWORK_ERROR_RESPONSE = "I'm having connection issues. Please check your internet and try again."
+GENERIC_FALLBACK_RESPONSE = "I'm here to listen. Could you tell me more about how you're feeling?"
+FALLBACK_RESPONSES = (HTTP_ERROR_RESPONSE, NETWORK_ERROR_RESPONSE, GENERIC_FALLBACK_RESPONSE)
+
+GROQ_CHAT_URL = f"{http_client.GROQ_BASE_URL}/openai/v1/chat/completions"
+# Conversation summaries; replies pick their model per turn (model_tiering.LLM_MODEL_TIERS)
+GROQ_CHAT_MODEL = "gemma2-9b-it"
+
+def _build_messages(user_message: str, conversation_history: List[Dict] = None) -> List[Dict]:
+    """
+    Builds the chat messages array: system prompt, history, then the new message.
+    """
+    messages = [{"role": "system", "content": THERAPY_SYSTEM_PROMPT}]
+    if conversation_history:
+        messages.extend(conversation_history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def _build_payload(messages: List[Dict], tier: Optional[model_tiering.LLMTier] = None) -> Dict:
+    tier = tier or model_tiering.LLM_TIERS[-1]
+    return {
+        "model": tier.model,
+        "messages": messages,
+        "max_tokens": tier.max_tokens,
+        "temperature": 0.7
+    }
+
+def _auth_headers() -> Dict:
+    return {
+        "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+
 def get_ai_response(user_message: str, conversation_history: List[Dict] = None) -> str:
     """
     Get response from Groq API using direct HTTP requests
     """
+    # Only this blocking variant uses requests; keep it off the server's import path
+    import requests
     try:
         # Build messages array - Groq expects specific format
-        messages = [{"role": "system", "content": THERAPY_SYSTEM_PROMPT}]
-        
-        # Add conversation history if provided
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
+        messages = _build_messages(user_message, conversation_history)
+        tier = model_tiering.llm_tier(user_message)
         
-        logger.info("Sending request to Groq API...")
+        logger.info("Sending request to Groq API (%s)...", tier.model)
+        started = time.perf_counter()
         
         # Make direct HTTP request to Groq API - CORRECTED FORMAT
         response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gemma2-9b-it",
-                "messages": messages,
-                "max_tokens": 150,
-                "temperature": 0.7
-                # Removed "stream": False as it might cause issues
-            },
+            GROQ_CHAT_URL,
+            headers=_auth_headers(),
+            json=_build_payload(messages, tier),
             timeout=30
         )
         
         # Check for HTTP errors
         response.raise_for_status()
+        model_tiering.record_latency("llm", tier.model, time.perf_counter() - started)
         
         # Parse response
         data = response.json()
         ai_response = data["choices"][0]["message"]["content"]
         
-        logger.info(f"Groq Response: {ai_response}")
+        logger.info("Groq Response: %s", redact(ai_response))
         return ai_response
         
     except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP error: {e}")
-        logger.error(f"Response content: {e.response.text if hasattr(e, 'response') else 'No response'}")
-        return "I'm having trouble connecting to the AI service. Please try again."
+        logger.error("HTTP error: %s", e)
+        logger.error("Response content: %s", e.response.text if hasattr(e, 'response') else 'No response')
+        return HTTP_ERROR_RESPONSE
     except requests.exceptions.RequestException as e:
-        logger.error(f"Network error: {e}")
-        return "I'm having connection issues. Please check your internet and try again."
+        logger.error("Network error: %s", e)
+        return NETWORK_ERROR_RESPONSE
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        return GENERIC_FALLBACK_RESPONSE
+
+async def get_ai_response_async(user_message: str, conversation_history: List[Dict] = None) -> str:
+    """
+    Async variant of get_ai_response. Uses the shared pooled HTTP client so
+    the event loop keeps serving other sessions while Groq is thinking.
+    """
+    try:
+        messages = _build_messages(user_message, conversation_history)
+        tier = model_tiering.llm_tier(user_message)
+
+        logger.info("Sending async request to Groq API (%s)...", tier.model)
+        started = time.perf_counter()
+        response = await http_client.post(
+            GROQ_CHAT_URL,
+            headers=_auth_headers(),
+            json=_build_payload(messages, tier),
+        )
+        response.raise_for_status()
+        model_tiering.record_latency("llm", tier.model, time.perf_counter() - started)
+
+        data = response.json()
+        ai_response = data["choices"][0]["message"]["content"]
+
+        logger.info("Groq Response: %s", redact(ai_response))
+        return ai_response
+
+    except httpx.HTTPStatusError as e:
+        logger.error("HTTP error: %s", e)
+        logger.error("Response content: %s", e.response.text)
+        return HTTP_ERROR_RESPONSE
+    except httpx.RequestError as e:
+        logger.error("Network error: %s", e)
+        return NETWORK_ERROR_RESPONSE
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        return GENERIC_FALLBACK_RESPONSE
+
+
+async def stream_ai_response(user_message: str, conversation_history: List[Dict] = None) -> AsyncIterator[str]:
+    """
+    Streams the Groq completion as it is generated, yielding text deltas.
+    On failure yields the same friendly fallback text as get_ai_response.
+    """
+    received_any = False
+    try:
+        messages = _build_messages(user_message, conversation_history)
+        tier = model_tiering.llm_tier(user_message)
+        payload = _build_payload(messages, tier)
+        payload["stream"] = True
+
+        logger.info("Opening streamed request to Groq API (%s)...", tier.model)
+        started = time.perf_counter()
+        async with http_client.stream(
+            "POST",
+            GROQ_CHAT_URL,
+            headers=_auth_headers(),
+            json=payload,
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                logger.error("HTTP error: %s", response.status_code)
+                logger.error("Response content: %s", body.decode(errors='replace'))
+                yield HTTP_ERROR_RESPONSE
+                return
+
+            # Server-sent events: one "data: {...}" line per chunk
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    # The whole generation, comparable with the buffered requests' latency
+                    model_tiering.record_latency("llm", tier.model, time.perf_counter() - started)
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    received_any = True
+                    yield delta
+
+    except httpx.RequestError as e:
+        logger.error("Network error: %s", e)
+        if not received_any:
+            yield NETWORK_ERROR_RESPONSE
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        if not received_any:
+            yield GENERIC_FALLBACK_RESPONSE
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a short running summary of a supportive conversation between a user and Astra.
+Merge the previous summary with the new messages. Keep what matters for continuity: the user's situation,
+feelings, names and topics they raised, and anything Astra offered. Write at most 3 sentences, third person, no advice."""
+
+async def summarize_conversation_async(previous_summary: str, messages: List[Dict]) -> str:
+    """
+    Folds older conversation messages into a compact running summary.
+    Returns the previous summary unchanged if the request fails.
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    try:
+        # Behind every live turn when Groq is rate-limiting us
+        with rate_limiter.priority(rate_limiter.BACKGROUND):
+            response = await http_client.post(
+                GROQ_CHAT_URL,
+                headers=_auth_headers(),
+                json={
+                    "model": GROQ_CHAT_MODEL,
+                    "messages": [
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt},
+                    ],
+                    "max_tokens": 120,
+                    "temperature": 0.2
+                },
+            )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        return "I'm here to listen. Could you tell me more about how you're feeling?"
\ No newline at end of file
+        logger.error("Summary request failed: %s", e)
+        return previous_summary
@@ -1,16 +1,32 @@
 # backend/utils/groq_tts.py
 import os
-import requests
 import logging
-from dotenv import load_dotenv
 
-load_dotenv()
+from utils import http_client
+from utils.tts_cache import cached_tts
+from utils.log_pipeline import redact
+
 logger = logging.getLogger(__name__)
 
+GROQ_SPEECH_URL = f"{http_client.GROQ_BASE_URL}/openai/v1/audio/speech"
+GROQ_TTS_MODEL = "playai-tts"
+# Container Groq returns (wav, mp3, flac, ogg). A compressed format here saves
+# the server-side transcode for clients that negotiate the same one.
+GROQ_TTS_FORMAT = os.getenv("GROQ_TTS_FORMAT", "wav")
+
+def _build_payload(text: str, voice: str) -> dict:
+    return {
+        "model": GROQ_TTS_MODEL,
+        "input": text,
+        "voice": voice,  # Use one of the approved voices
+        "response_format": GROQ_TTS_FORMAT
+    }
+
+@cached_tts("groq", GROQ_TTS_MODEL, GROQ_TTS_FORMAT, default_voice="Ruby-PlayAI")
 def text_to_speech(text: str, voice: str = "Ruby-PlayAI") -> bytes:
     """
     Converts text to speech using Groq's TTS API.
-    Returns audio bytes (WAV format).
+    Returns audio bytes (GROQ_TTS_FORMAT, WAV by default).
     """
     try:
         api_key = os.getenv("GROQ_API_KEY")
@@ -18,33 +34,60 @@ def text_to_speech(text: str, voice: str = "Ruby-PlayAI") -> bytes:
             logger.error("GROQ_API_KEY not set")
             return b""
 
-        logger.info(f"Generating Groq TTS for: '{text[:50]}...'")
-        
-        # Groq TTS API endpoint
-        url = "https://api.groq.com/openai/v1/audio/speech"
+        logger.info("Generating Groq TTS for: '%s'", redact(text))
         
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
-        payload = {
-            "model": "playai-tts",
-            "input": text,
-            "voice": voice,  # Use one of the approved voices
-            "response_format": "wav"
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        # Only this blocking variant uses requests; keep it off the server's import path
+        import requests
+        response = requests.post(GROQ_SPEECH_URL, headers=headers, json=_build_payload(text, voice), timeout=30)
         
         if response.status_code == 200:
             audio_bytes = response.content
-            logger.info(f"Groq TTS generated {len(audio_bytes)} bytes")
+            logger.info("Groq TTS generated %s bytes", len(audio_bytes))
             return audio_bytes
         else:
-            logger.error(f"Groq TTS API error: {response.status_code} - {response.text}")
+            logger.error("Groq TTS API error: %s - %s", response.status_code, response.text)
             return b""
             
     except Exception as e:
-        logger.error(f"Groq TTS error: {e}")
-        return b""  # Graceful fallback
\ No newline at end of file
+        logger.error("Groq TTS error: %s", e)
+        return b""  # Graceful fallback
+
+@cached_tts("groq", GROQ_TTS_MODEL, GROQ_TTS_FORMAT, default_voice="Ruby-PlayAI")
+async def text_to_speech_async(text: str, voice: str = "Ruby-PlayAI") -> bytes:
+    """
+    Async variant of text_to_speech using the shared pooled HTTP client.
+    Returns audio bytes (GROQ_TTS_FORMAT, WAV by default).
+    """
+    try:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            logger.error("GROQ_API_KEY not set")
+            return b""
+
+        logger.info("Generating Groq TTS (async) for: '%s'", redact(text))
+
+        response = await http_client.post(
+            GROQ_SPEECH_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json=_build_payload(text, voice),
+        )
+
+        if response.status_code == 200:
+            audio_bytes = response.content
+            logger.info("Groq TTS generated %s bytes", len(audio_bytes))
+            return audio_bytes
+        else:
+            logger.error("Groq TTS API error: %s - %s", response.status_code, response.text)
+            return b""
+
+    except Exception as e:
+        logger.error("Groq TTS error: %s", e)
+        return b""  # Graceful fallback
@@ -0,0 +1,168 @@
+# backend/utils/http_client.py
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from utils import metrics, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Connection pool and concurrency settings (override via environment)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "32"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+
+# Upstream base URLs; point these at local stand-ins (benchmarks/fake_upstreams.py)
+# to run the pipeline offline. ELEVEN_BASE_URL is read by the ElevenLabs SDK itself.
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com").rstrip("/")
+GOOGLE_TTS_URL = os.getenv("GOOGLE_TTS_URL", "https://translate.google.com/translate_tts")
+ELEVEN_BASE_URL = os.getenv("ELEVEN_BASE_URL", "https://api.elevenlabs.io/v1").rstrip("/")
+
+# Shared client and concurrency limiter, created once at startup
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# Metric label per upstream host[:port]; unknown hosts are labelled by hostname
+PROVIDER_HOSTS = {
+    httpx.URL(GROQ_BASE_URL).netloc.decode(): "groq",
+    httpx.URL(ELEVEN_BASE_URL).netloc.decode(): "elevenlabs",
+    httpx.URL(GOOGLE_TTS_URL).netloc.decode(): "google",
+}
+
+
+def _build_client() -> httpx.AsyncClient:
+    """
+    Builds the pooled keep-alive client used for every upstream call.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+    )
+
+
+async def startup_http_client():
+    """
+    Creates the shared HTTP client. Called from the FastAPI startup hook.
+    """
+    global _client, _semaphore
+    if _client is None:
+        _client = _build_client()
+        _semaphore = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+        logger.info(
+            "Upstream HTTP client ready (max_connections=%d, concurrency=%d)",
+            UPSTREAM_MAX_CONNECTIONS, UPSTREAM_CONCURRENCY,
+        )
+
+
+async def shutdown_http_client():
+    """
+    Closes the shared HTTP client and its pooled connections.
+    """
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _semaphore = None
+        logger.info("Upstream HTTP client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client, creating it lazily if startup did not run
+    (e.g. when a provider is used from a script).
+    """
+    global _client, _semaphore
+    if _client is None:
+        _client = _build_client()
+        _semaphore = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+    return _client
+
+
+def _provider(url: httpx.URL) -> str:
+    return PROVIDER_HOSTS.get(url.netloc.decode(), url.host)
+
+
+def _count(url: str, status):
+    metrics.UPSTREAM_REQUESTS.labels(_provider(httpx.URL(url)), status).inc()
+
+
+def _bucket(url: str) -> rate_limiter.TokenBucket:
+    """Rate-limit bucket of an endpoint, named provider.last-path-segment (groq.completions)."""
+    parsed = httpx.URL(url)
+    return rate_limiter.get_bucket(f"{_provider(parsed)}.{parsed.path.rstrip('/').rpartition('/')[2]}")
+
+
+def _retry_429(bucket: rate_limiter.TokenBucket, response: httpx.Response, attempt: int) -> bool:
+    """Records the response's rate-limit signals; True if it is a 429 worth retrying."""
+    pause = rate_limiter.observe(bucket, response.status_code, response.headers)
+    if pause is None or attempt >= rate_limiter.RATE_LIMIT_RETRIES or pause > rate_limiter.wait_budget():
+        return False
+    metrics.UPSTREAM_RETRIES.labels(_provider(response.request.url)).inc()
+    return True
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Sends one upstream request through the shared pool, bounded by the
+    process-wide concurrency limit. Waits for the endpoint's rate limit
+    (without holding a concurrency slot) and retries 429s after the
+    pause the provider asked for.
+    """
+    client = get_http_client()
+    bucket = _bucket(url)
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        async with _semaphore:
+            try:
+                response = await client.request(method, url, **kwargs)
+            except Exception:
+                _count(url, "error")
+                raise
+        _count(url, response.status_code)
+        if not _retry_429(bucket, response, attempt):
+            return response
+        attempt += 1
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    Opens a streamed upstream response (e.g. server-sent events). The
+    concurrency slot is held until the body has been consumed. Rate
+    limits and 429s are handled as in request().
+    """
+    client = get_http_client()
+    bucket = _bucket(url)
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        async with _semaphore:
+            response = None
+            try:
+                async with client.stream(method, url, **kwargs) as response:
+                    _count(url, response.status_code)
+                    if not _retry_429(bucket, response, attempt):
+                        yield response
+                        return
+            except httpx.HTTPError:
+                # Errors while the caller reads the body were already counted by status
+                if response is None:
+                    _count(url, "error")
+                raise
+        attempt += 1
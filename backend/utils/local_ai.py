@@ -3,16 +3,35 @@
 import ollama
 import logging
 import os
+from array import array
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+from utils.conversation_memory import current_conversation
+from utils.log_pipeline import redact
 
 logger = logging.getLogger(__name__)
 
 # Use Docker service name for Ollama
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi3")
+# How long Ollama keeps the model in memory after a request ("30m", "1h", "-1" = forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+# Continue each conversation from the context Ollama evaluated for the previous turn
+OLLAMA_REUSE_CONTEXT = os.getenv("OLLAMA_REUSE_CONTEXT", "1") == "1"
+OLLAMA_CONTEXT_CACHE_SIZE = int(os.getenv("OLLAMA_CONTEXT_CACHE_SIZE", "256"))
+
+OLLAMA_OPTIONS = {
+    "temperature": 0.7,
+    "num_predict": 150,
+    "num_ctx": OLLAMA_NUM_CTX,
+}
 
 # System prompt for the therapy assistant
-THERAPY_SYSTEM_PROMPT = """You are Astra, a compassionate, empathetic, and mindful listener. 
-You are not a therapist but a supportive friend. Your goal is to validate the user's feelings, 
-help them feel heard, and gently guide them towards self-reflection. 
+THERAPY_SYSTEM_PROMPT = """You are Astra, a compassionate, empathetic, and mindful listener.
+You are not a therapist but a supportive friend. Your goal is to validate the user's feelings,
+help them feel heard, and gently guide them towards self-reflection.
 
 Keep your responses:
 - Short and conversational (1-2 sentences)
@@ -22,44 +41,225 @@ Keep your responses:
 
 Respond as if you are in a real-time conversation."""
 
+FALLBACK_RESPONSE = "I'm here to listen. Could you tell me more about how you're feeling?"
+
+_client: Optional[ollama.Client] = None
+_async_client: Optional[ollama.AsyncClient] = None
+
+
+def get_client() -> ollama.Client:
+    """Shared blocking client, so its connection pool outlives a single call."""
+    global _client
+    if _client is None:
+        _client = ollama.Client(host=OLLAMA_HOST)
+    return _client
+
+
+def get_async_client() -> ollama.AsyncClient:
+    """Shared async client used by the server's event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = ollama.AsyncClient(host=OLLAMA_HOST)
+    return _async_client
+
+
+def _build_messages(user_message: str, conversation_history: List[Dict] = None) -> List[Dict]:
+    messages = [{"role": "system", "content": THERAPY_SYSTEM_PROMPT}]
+    if conversation_history:
+        messages.extend(conversation_history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def _normalize(text: str) -> str:
+    # Replies are re-joined from sentences before they reach the history
+    return " ".join(text.split())
+
+
+class _Context:
+    """Ollama's evaluated tokens for a conversation, and the exchange they end on."""
+    __slots__ = ("user", "reply", "tokens")
+
+    def __init__(self, user: str, reply: str, tokens: List[int]):
+        self.user = _normalize(user)
+        self.reply = _normalize(reply)
+        # Compact ints: a full window is 16 KB instead of ~150 KB of Python ints
+        self.tokens = array("i", tokens)
+
+
+# Conversation id -> context; least recently used first
+_contexts: "OrderedDict[str, _Context]" = OrderedDict()
+
+
+def _continuation(conversation: Optional[str], user_message: str,
+                  conversation_history: List[Dict] = None) -> Optional[_Context]:
+    """
+    The stored context if it ends exactly on the last exchange in the
+    history, so only the new message has to be evaluated. None when the
+    history has moved on without us (failover, barge-in, resume) or the
+    window is too full to continue.
+    """
+    if not OLLAMA_REUSE_CONTEXT or conversation is None or not conversation_history:
+        return None
+    entry = _contexts.get(conversation)
+    if entry is None or len(conversation_history) < 2:
+        return None
+    last_user, last_reply = conversation_history[-2], conversation_history[-1]
+    if _normalize(last_user.get("content", "")) != entry.user or _normalize(last_reply.get("content", "")) != entry.reply:
+        return None
+    # Leave room for the new message and the reply; past that, reseed from the budgeted history
+    needed = len(user_message) // 4 + OLLAMA_OPTIONS["num_predict"] + 64
+    if len(entry.tokens) + needed > OLLAMA_NUM_CTX:
+        return None
+    _contexts.move_to_end(conversation)
+    return entry
+
+
+def _remember(conversation: str, user_message: str, reply: str, tokens: Optional[List[int]]):
+    if not tokens:
+        return
+    _contexts[conversation] = _Context(user_message, reply, tokens)
+    _contexts.move_to_end(conversation)
+    while len(_contexts) > OLLAMA_CONTEXT_CACHE_SIZE:
+        _contexts.popitem(last=False)
+
+
+def forget(conversation: str):
+    """Drops a conversation's context when its session ends."""
+    _contexts.pop(conversation, None)
+
+
+def context_bytes(conversation: str) -> int:
+    """Memory held by a conversation's stored context."""
+    entry = _contexts.get(conversation)
+    return entry.tokens.itemsize * len(entry.tokens) if entry is not None else 0
+
+
+def _seed_system_prompt(conversation_history: List[Dict] = None) -> str:
+    """
+    The system prompt with the history written into it, to start a new
+    context chain mid-conversation through the generate endpoint.
+    """
+    if not conversation_history:
+        return THERAPY_SYSTEM_PROMPT
+    lines = []
+    for message in conversation_history:
+        if message["role"] == "system":
+            lines.append(message["content"])
+        else:
+            speaker = "User" if message["role"] == "user" else "Astra"
+            lines.append(f"{speaker}: {message['content']}")
+    return THERAPY_SYSTEM_PROMPT + "\n\nThe conversation so far:\n" + "\n".join(lines)
+
+
+async def _stream(user_message: str, conversation_history: List[Dict] = None) -> AsyncIterator[str]:
+    client = get_async_client()
+    conversation = current_conversation.get() if OLLAMA_REUSE_CONTEXT else None
+
+    if conversation is None:
+        # No conversation to continue: plain chat with the whole history
+        stream = await client.chat(
+            model=OLLAMA_MODEL,
+            messages=_build_messages(user_message, conversation_history),
+            options=OLLAMA_OPTIONS,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            stream=True,
+        )
+        async for chunk in stream:
+            text = chunk["message"]["content"]
+            if text:
+                yield text
+        return
+
+    entry = _continuation(conversation, user_message, conversation_history)
+    if entry is not None:
+        logger.info("Continuing Ollama context (%s tokens)", len(entry.tokens))
+        request = {"prompt": user_message, "context": entry.tokens.tolist()}
+    else:
+        request = {"prompt": user_message, "system": _seed_system_prompt(conversation_history)}
+
+    stream = await client.generate(
+        model=OLLAMA_MODEL,
+        options=OLLAMA_OPTIONS,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        stream=True,
+        **request,
+    )
+    reply = []
+    async for chunk in stream:
+        text = chunk["response"]
+        if text:
+            reply.append(text)
+            yield text
+        if chunk["done"]:
+            # Only a finished reply is worth continuing from
+            _remember(conversation, user_message, "".join(reply), chunk["context"])
+
+
+async def stream_ai_response(user_message: str, conversation_history: List[Dict] = None) -> AsyncIterator[str]:
+    """
+    Streams the local model's reply as it is generated, yielding text
+    deltas. On failure yields FALLBACK_RESPONSE if nothing was sent yet.
+    """
+    received_any = False
+    try:
+        logger.info("Opening streamed request to local Ollama model...")
+        async for text in _stream(user_message, conversation_history):
+            received_any = True
+            yield text
+    except Exception as e:
+        logger.error("Error streaming local AI response: %s", e)
+        if not received_any:
+            yield FALLBACK_RESPONSE
+
+
+async def get_ai_response_async(user_message: str, conversation_history: List[Dict] = None) -> str:
+    """
+    Async variant of get_ai_response on the shared client, continuing the
+    conversation's evaluated context where possible.
+    """
+    try:
+        logger.info("Sending async request to local Ollama model...")
+        ai_response = "".join([text async for text in _stream(user_message, conversation_history)]).strip()
+        logger.info("Local AI Response: %s", redact(ai_response))
+        return ai_response or FALLBACK_RESPONSE
+    except Exception as e:
+        logger.error("Error getting local AI response: %s", e)
+        return FALLBACK_RESPONSE
+
+
+async def load_model():
+    """
+    Loads the model into Ollama's memory ahead of the first turn; a request
+    without a prompt only loads it and applies the keep-alive.
+    """
+    try:
+        await get_async_client().generate(model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE)
+        logger.info("Ollama model %s loaded (keep_alive=%s)", OLLAMA_MODEL, OLLAMA_KEEP_ALIVE)
+    except Exception as e:
+        logger.warning("Could not preload Ollama model %s: %s", OLLAMA_MODEL, e)
+
+
 def get_ai_response(user_message: str, conversation_history: list = None) -> str:
     """
     Get response from local Ollama model.
     """
     try:
-        # Configure Ollama client to use Docker service
-        client = ollama.Client(host=OLLAMA_HOST)
-        
-        # Build the messages array
-        messages = []
-        
-        # Add system prompt
-        messages.append({"role": "system", "content": THERAPY_SYSTEM_PROMPT})
-        
-        # Add conversation history if provided
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
         logger.info("Sending request to local Ollama model...")
-        
+
         # Get response from Ollama
-        response = client.chat(
-            model="phi3",
-            messages=messages,
-            options={
-                "temperature": 0.7,
-                "num_predict": 150,
-            }
+        response = get_client().chat(
+            model=OLLAMA_MODEL,
+            messages=_build_messages(user_message, conversation_history),
+            options=OLLAMA_OPTIONS,
+            keep_alive=OLLAMA_KEEP_ALIVE,
         )
-        
+
         ai_response = response['message']['content']
-        logger.info(f"Local AI Response: {ai_response}")
+        logger.info("Local AI Response: %s", redact(ai_response))
         return ai_response
-        
+
     except Exception as e:
-        logger.error(f"Error getting local AI response: {e}")
+        logger.error("Error getting local AI response: %s", e)
         # Fallback response
-        return "I'm here to listen. Could you tell me more about how you're feeling?"
\ No newline at end of file
+        return FALLBACK_RESPONSE
@@ -0,0 +1,101 @@
+# backend/utils/local_stt_engine.py
+import os
+import logging
+from typing import List, Optional, Union
+
+import numpy as np
+
+from utils.batching_pool import BatchingProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Engine settings (override via environment)
+LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+LOCAL_STT_MAX_BATCH = int(os.getenv("LOCAL_STT_MAX_BATCH", "8"))
+# Whisper runs a batch one utterance at a time, so holding batches open for more only adds latency
+LOCAL_STT_MAX_WAIT_MS = float(os.getenv("LOCAL_STT_MAX_WAIT_MS", "0"))
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", os.getenv("WHISPER_MODEL_SIZE", "tiny"))
+LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", os.getenv("WHISPER_COMPUTE_TYPE", "int8"))
+LOCAL_STT_DEVICE = os.getenv("LOCAL_STT_DEVICE", os.getenv("WHISPER_DEVICE", "cpu"))
+LOCAL_STT_BEAM_SIZE = int(os.getenv("LOCAL_STT_BEAM_SIZE", os.getenv("WHISPER_BEAM_SIZE", "5")))
+
+
+def _init_worker(model_size: str, device: str, compute_type: str, cpu_threads: int):
+    """
+    Runs once per worker process: loads the resident Whisper model.
+    """
+    from utils.audio_processor import get_whisper_model
+    get_whisper_model(model_size, device, compute_type, cpu_threads)
+
+
+def _transcribe_batch(items: List[Union[bytes, np.ndarray]], beam_size: int) -> List:
+    """
+    Transcribes a batch in one worker, item by item. Encoded uploads
+    (bytes) and 16 kHz float32 arrays can be mixed in the same batch.
+    """
+    from utils.audio_processor import transcribe_audio, transcribe_audio_array
+
+    results = []
+    for item in items:
+        try:
+            if isinstance(item, np.ndarray):
+                results.append(transcribe_audio_array(item, 16000, beam_size))
+            else:
+                results.append(transcribe_audio(item, beam_size))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class LocalSTTEngine:
+    """
+    Self-hosted speech recognition: resident faster-whisper models in a
+    pool of worker processes, with concurrent utterances from all
+    sessions spread over them.
+    """
+
+    def __init__(self, workers: int = LOCAL_STT_WORKERS, model_size: str = LOCAL_STT_MODEL,
+                 compute_type: str = LOCAL_STT_COMPUTE_TYPE, device: str = LOCAL_STT_DEVICE,
+                 beam_size: int = LOCAL_STT_BEAM_SIZE, max_batch: int = LOCAL_STT_MAX_BATCH,
+                 max_wait_ms: float = LOCAL_STT_MAX_WAIT_MS):
+        # Split the cores between workers so they don't oversubscribe the CPU
+        cpu_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.model_size = model_size
+        self.pool = BatchingProcessPool(
+            "local-stt",
+            initializer=_init_worker,
+            initargs=(model_size, device, compute_type, cpu_threads),
+            batch_handler=_transcribe_batch,
+            handler_args=(beam_size,),
+            workers=workers,
+            max_batch=max_batch,
+            max_wait_ms=max_wait_ms,
+        )
+
+    async def start(self):
+        logger.info("Starting local STT engine (%s, %s workers)", self.model_size, self.pool.workers)
+        await self.pool.start()
+
+    async def stop(self):
+        await self.pool.stop()
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        """Transcribes an encoded upload (webm/wav/...)."""
+        return await self.pool.submit(audio_bytes)
+
+    async def transcribe_array(self, samples: np.ndarray) -> str:
+        """Transcribes 16 kHz mono float32 samples."""
+        return await self.pool.submit(np.asarray(samples, dtype=np.float32))
+
+    def stats(self) -> dict:
+        return {"model": self.model_size, **self.pool.stats()}
+
+
+_engine: Optional[LocalSTTEngine] = None
+
+
+def get_local_stt_engine() -> LocalSTTEngine:
+    global _engine
+    if _engine is None:
+        _engine = LocalSTTEngine()
+    return _engine
@@ -0,0 +1,110 @@
+# backend/utils/local_tts_engine.py
+import os
+import logging
+from typing import List, Optional
+
+from utils.batching_pool import BatchingProcessPool
+from utils.tts_cache import cached_tts
+
+logger = logging.getLogger(__name__)
+
+# Engine settings (override via environment)
+LOCAL_TTS_WORKERS = int(os.getenv("LOCAL_TTS_WORKERS", "1"))
+LOCAL_TTS_MAX_BATCH = int(os.getenv("LOCAL_TTS_MAX_BATCH", "4"))
+# Coqui synthesizes a batch one sentence at a time, so holding batches open for more only adds latency
+LOCAL_TTS_MAX_WAIT_MS = float(os.getenv("LOCAL_TTS_MAX_WAIT_MS", "0"))
+LOCAL_TTS_MODEL = os.getenv("COQUI_TTS_MODEL", "tts_models/en/ljspeech/tacotron2-DDC_ph")
+
+WARMUP_TEXT = "Hello, I'm here."
+
+
+def _init_worker(model_name: str):
+    """
+    Runs once per worker process: loads the Coqui model and synthesizes a
+    short phrase so the first real request doesn't pay for lazy setup.
+    """
+    import torch
+    # One model per process; let processes, not threads, provide parallelism
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, LOCAL_TTS_WORKERS)))
+
+    from utils import tts_generator
+    tts_generator.TTS_MODEL_NAME = model_name
+    tts_generator.get_tts_model().tts(text=WARMUP_TEXT)
+
+
+def _synthesize_batch(texts: List[str]) -> List:
+    """
+    Synthesizes a batch of sentences in one worker, one by one, returning
+    WAV bytes for each.
+    """
+    import numpy as np
+    from utils.tts_generator import encode_wav, get_tts_model
+
+    model = get_tts_model()
+    sample_rate = getattr(getattr(model, "synthesizer", None), "output_sample_rate", None) or 22050
+    results = []
+    for text in texts:
+        try:
+            samples = np.asarray(model.tts(text=text), dtype=np.float32)
+            # Always a WAV: clients play it and audio_codec transcodes it as such
+            results.append(encode_wav(samples, sample_rate))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class LocalTTSEngine:
+    """
+    Self-hosted speech synthesis: Coqui models preloaded in worker
+    processes at startup, with sentences from concurrent sessions
+    spread over them.
+    """
+
+    def __init__(self, workers: int = LOCAL_TTS_WORKERS, model_name: str = LOCAL_TTS_MODEL,
+                 max_batch: int = LOCAL_TTS_MAX_BATCH, max_wait_ms: float = LOCAL_TTS_MAX_WAIT_MS):
+        self.model_name = model_name
+        self.pool = BatchingProcessPool(
+            "local-tts",
+            initializer=_init_worker,
+            initargs=(model_name,),
+            batch_handler=_synthesize_batch,
+            workers=workers,
+            max_batch=max_batch,
+            max_wait_ms=max_wait_ms,
+        )
+
+    async def start(self):
+        logger.info("Starting local TTS engine (%s, %s workers)", self.model_name, self.pool.workers)
+        await self.pool.start()
+
+    async def stop(self):
+        await self.pool.stop()
+
+    async def synthesize(self, text: str) -> bytes:
+        try:
+            return await self.pool.submit(text)
+        except Exception as e:
+            logger.error("Local TTS error: %s", e)
+            return b""
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, **self.pool.stats()}
+
+
+_engine: Optional[LocalTTSEngine] = None
+
+
+def get_local_tts_engine() -> LocalTTSEngine:
+    global _engine
+    if _engine is None:
+        _engine = LocalTTSEngine()
+    return _engine
+
+
+@cached_tts("coqui", LOCAL_TTS_MODEL, "wav", default_voice="ljspeech")
+async def text_to_speech_async(text: str) -> bytes:
+    """
+    Async TTS through the resident worker pool. Returns WAV bytes; empty
+    bytes on failure.
+    """
+    return await get_local_tts_engine().synthesize(text)
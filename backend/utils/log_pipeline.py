@@ -0,0 +1,204 @@
+# backend/utils/log_pipeline.py
+"""
+Logging for the server process.
+
+Records are filtered and queued on the calling thread and formatted and
+written by a listener thread, so a log call on the event loop costs a
+filter check and a queue put, never a write to stdout. Call sites use
+%-style arguments, which are only formatted if the record is kept.
+
+User and assistant text is wrapped in redact() at the call site and is
+logged as its length unless LOG_CONTENT=1. INFO and DEBUG records can be
+sampled per stage (LOG_SAMPLING); sessions are sampled as a whole, so a
+sampled session keeps all of its lines. LOG_FORMAT=json writes one JSON
+object per line with the session id, stage and any extra fields.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Dict, Optional
+
+from utils.conversation_memory import current_conversation
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of INFO/DEBUG records kept per stage, e.g. "stt=0.1,tts=0.1,main=0.5".
+# Warnings and errors are always kept.
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Log transcripts and replies verbatim; for local debugging only
+LOG_CONTENT = os.getenv("LOG_CONTENT", "0") == "1"
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Stage of records from these loggers, unless the call passes extra={"stage": ...}.
+# Anything else is its module name ("main", "turn_scheduler", ...).
+STAGE_LOGGERS = {
+    "utils.cloud_stt": "stt",
+    "utils.streaming_stt": "stt",
+    "utils.local_stt_engine": "stt",
+    "utils.audio_processor": "stt",
+    "utils.groq_ai": "llm",
+    "utils.local_ai": "llm",
+    "utils.groq_tts": "tts",
+    "utils.cloud_tts": "tts",
+    "utils.free_tts": "tts",
+    "utils.tts_cache": "tts",
+    "utils.tts_generator": "tts",
+    "utils.local_tts_engine": "tts",
+    "utils.audio_codec": "transcode",
+}
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "session", "stage"}
+# Extras uvicorn and websockets attach for their own formatters
+_RECORD_ATTRS |= {"color_message", "websocket"}
+
+# Argument types that can't change between the log call and the listener formatting them
+_IMMUTABLE = (str, int, float, bool, type(None), bytes, BaseException)
+
+
+class Redacted:
+    """User or assistant text in a log call."""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self) -> str:
+        if LOG_CONTENT:
+            return str(self.text)
+        return f"<{len(self.text or '')} chars redacted>"
+
+    __repr__ = __str__
+
+
+def redact(text: str) -> Redacted:
+    """Wraps text so it is only logged verbatim when LOG_CONTENT=1."""
+    return Redacted(text)
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        stage, _, rate = item.partition("=")
+        if stage.strip() and rate.strip():
+            rates[stage.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """
+    Tags each record with its session and stage on the calling thread
+    (where the session's context variable is visible) and applies the
+    per-stage sampling.
+    """
+
+    def __init__(self, sampling: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sampling = sampling or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.session = current_conversation.get()
+        if not hasattr(record, "stage"):
+            record.stage = STAGE_LOGGERS.get(record.name) or record.name.rpartition(".")[2].strip("_")
+        rate = self.sampling.get(record.stage)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if record.session is not None:
+            # The same verdict for every record of a session
+            return zlib.crc32(record.session.encode()) / 0xFFFFFFFF < rate
+        return random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener and drops records when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(a, _IMMUTABLE + (Redacted,)) for a in args)):
+            # Mutable arguments could change before the listener gets to them
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from utils import metrics
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format, with any extra fields appended as key=value."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = [f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_ATTRS]
+        return f"{line} [{' '.join(extras)}]" if extras else line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "stage": getattr(record, "stage", None),
+            "session": getattr(record, "session", None),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sampling: str = LOG_SAMPLING):
+    """
+    Routes the root logger through the queue. Safe to call more than once;
+    later calls replace the earlier setup.
+    """
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter(_parse_sampling(sampling)))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Writes out whatever is still queued and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
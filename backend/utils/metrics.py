@@ -0,0 +1,394 @@
+# backend/utils/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Label children are created once and cached, and histogram buckets are
+plain lists of counters, so recording a sample on the hot path is a
+bisect and two additions - no per-observation allocations.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        """Returns the cached child for these label values."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._children.items():
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function at scrape time instead."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"]
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager that observes the elapsed wall time."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# -- Voice pipeline metrics ---------------------------------------------------
+
+STAGE_SECONDS = histogram(
+    "astra_stage_seconds", "Time spent in each stage of a voice turn", ["stage"])
+TIME_TO_FIRST_AUDIO = histogram(
+    "astra_time_to_first_audio_seconds", "From transcript to first audio segment sent")
+TURNS = counter(
+    "astra_turns_total", "Completed voice turns", ["mode"])
+UPSTREAM_REQUESTS = counter(
+    "astra_upstream_requests_total", "Upstream HTTP responses by provider and status", ["provider", "status"])
+UPSTREAM_RETRIES = counter(
+    "astra_upstream_retries_total", "Extra upstream attempts (hedges, failovers, retries)", ["provider"])
+MODEL_TIER_CHOICES = counter(
+    "astra_model_tier_choices_total", "Model picked per request by tiering, and why (short, medium, long, heavy, latency)",
+    ["stage", "model", "reason"])
+MODEL_LATENCY = histogram(
+    "astra_model_latency_seconds", "Successful upstream request latency per model", ["stage", "model"])
+RATE_LIMIT_QUEUE_DEPTH = gauge(
+    "astra_rate_limit_queue_depth", "Upstream requests waiting for a rate-limit slot", ["endpoint"])
+RATE_LIMIT_WAIT = histogram(
+    "astra_rate_limit_wait_seconds", "Time queued upstream requests waited for a slot", ["endpoint", "priority"])
+RATE_LIMIT_PAUSES = counter(
+    "astra_rate_limit_pauses_total", "Endpoint pauses on 429s or exhausted quota headers", ["endpoint", "reason"])
+RATE_LIMIT_TIMEOUTS = counter(
+    "astra_rate_limit_timeouts_total", "Upstream requests that gave up waiting for a rate-limit slot", ["endpoint"])
+TURNS_CANCELLED = counter(
+    "astra_turns_cancelled_total", "Replies cancelled before completion", ["reason"])
+UTTERANCES_COALESCED = counter(
+    "astra_utterances_coalesced_total", "Utterances merged into another utterance's turn")
+UTTERANCES_REJECTED = counter(
+    "astra_utterances_rejected_total", "Uploaded utterances refused for their size or duration", ["reason"])
+INGEST_RESULTS = counter(
+    "astra_ingest_results_total", "Uploaded utterances by ingest outcome (speech, no_speech, passthrough, failed)", ["result"])
+STT_UPLOAD_BYTES = histogram(
+    "astra_stt_upload_bytes", "Size of ingested utterances sent for transcription", buckets=SIZE_BUCKETS)
+SESSION_STORE_SECONDS = histogram(
+    "astra_session_store_seconds", "Session store loads and batched flushes", ["backend", "op"])
+SESSIONS_RESUMED = counter(
+    "astra_sessions_resumed_total", "Sessions resumed from the session store by token")
+ACTIVE_SESSIONS = gauge(
+    "astra_active_sessions", "Open WebSocket sessions")
+INFLIGHT_TURNS = gauge(
+    "astra_inflight_turns", "Turns currently being processed")
+EVENT_LOOP_LAG = histogram(
+    "astra_event_loop_lag_seconds", "Delay of a periodic event-loop tick beyond its schedule", buckets=LAG_BUCKETS)
+LOG_RECORDS_DROPPED = counter(
+    "astra_log_records_dropped_total", "Log records dropped because the log queue was full")
+PAYLOAD_BYTES = histogram(
+    "astra_payload_bytes", "WebSocket payload sizes", ["direction", "kind"], buckets=SIZE_BUCKETS)
+
+PROCESS_RSS = gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes")
+PROCESS_START_TIME = gauge(
+    "process_start_time_seconds", "Start time of the process since unix epoch in seconds")
+STARTUP_SECONDS = gauge(
+    "astra_startup_seconds", "Seconds from process start to each startup milestone", ["phase"])
+
+# Pre-bound children for the per-turn hot path
+STAGES = {stage: STAGE_SECONDS.labels(stage) for stage in ("ingest", "stt", "crisis", "llm", "tts", "transcode", "encode", "send", "turn")}
+
+# Per-turn stage totals, for tasks that asked for them with collect_stage_timings()
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+AUDIO_IN_BYTES = PAYLOAD_BYTES.labels("in", "audio")
+AUDIO_OUT_BYTES = PAYLOAD_BYTES.labels("out", "audio")
+
+
+def resident_memory_bytes() -> float:
+    """Current RSS from /proc on Linux; peak RSS from getrusage elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+PROCESS_RSS.set_function(resident_memory_bytes)
+
+
+def _process_start_time() -> float:
+    """
+    When the process was exec'd, so startup timings include interpreter
+    start and the server's own imports. Falls back to this module's
+    import time where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED = _process_start_time()
+PROCESS_START_TIME.set(PROCESS_STARTED)
+
+
+def record_startup(phase: str) -> float:
+    """Records and returns the seconds since process start at a startup milestone."""
+    seconds = max(0.0, time.time() - PROCESS_STARTED)
+    STARTUP_SECONDS.labels(phase).set(seconds)
+    return seconds
+
+
+class _StageTimer(_Timer):
+    __slots__ = ("_stage",)
+
+    def __init__(self, child, stage: str):
+        super().__init__(child)
+        self._stage = stage
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        self._child.observe(elapsed)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[self._stage] = timings.get(self._stage, 0.0) + elapsed
+        return False
+
+
+def time_stage(stage: str) -> _Timer:
+    return _StageTimer(STAGES[stage], stage)
+
+
+def collect_stage_timings() -> Dict[str, float]:
+    """
+    Starts totalling time_stage() durations (seconds) for the current task
+    and the tasks it creates from here on; returns the dict they add to.
+    Concurrent stages (synthesis overlapping generation) are summed per stage.
+    """
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """
+    Sleeps for interval and records how late the loop woke up. Anything
+    blocking the loop (sync I/O, CPU-heavy code) shows up here.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,190 @@
+# backend/utils/model_tiering.py
+"""
+Per-turn choice between larger and smaller Groq models.
+
+Each stage has an ordered list of model tiers, smallest first
+(STT_MODEL_TIERS, LLM_MODEL_TIERS). A turn asks for a tier by what it
+holds: a clip of a few seconds, or a short acknowledgement ("ok,
+thanks"), gets the smallest; a long or emotionally heavy message gets
+the largest; anything in between the middle one. Then, while the chosen
+model's recent median latency is over the stage's budget, the turn
+steps down a tier. Latency is only remembered for TIER_WINDOW_SECONDS,
+so a model that was stepped away from gets traffic again once its slow
+samples have aged out, and is measured afresh.
+
+Swapping models is configuration only; with MODEL_TIERING=0 every turn
+uses the largest tier.
+"""
+import os
+import re
+import time
+import logging
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MODEL_TIERING = os.getenv("MODEL_TIERING", "1") == "1"
+# Smallest first; the last one is what every turn used before tiering
+STT_MODEL_TIERS = os.getenv("STT_MODEL_TIERS", "whisper-large-v3-turbo,whisper-large-v3")
+# "model:max_tokens", smallest first
+LLM_MODEL_TIERS = os.getenv("LLM_MODEL_TIERS", "llama-3.1-8b-instant:100,gemma2-9b-it:150")
+# Clips up to this long go to the smallest STT model
+TIER_SHORT_AUDIO_SECONDS = float(os.getenv("TIER_SHORT_AUDIO_SECONDS", "3"))
+# Messages up to this many words (and nothing heavy in them) go to the smallest LLM
+TIER_SHORT_TEXT_WORDS = int(os.getenv("TIER_SHORT_TEXT_WORDS", "6"))
+# Messages past this many words go to the largest LLM
+TIER_LONG_TEXT_WORDS = int(os.getenv("TIER_LONG_TEXT_WORDS", "40"))
+# Word beginnings that make a message emotionally heavy, comma-separated.
+# Crisis language never gets here: those turns get the fixed crisis reply.
+TIER_HEAVY_TERMS = os.getenv(
+    "TIER_HEAVY_TERMS",
+    "depress,anxi,panic,lonel,alone,griev,grief,loss,lost my,died,death,dying,funeral,hopeless,worthless,"
+    "trauma,abus,assault,ashamed,shame,guilt,scared,afraid,terrified,overwhelm,cry,crying,tears,"
+    "divorce,broke up,breakup,heartbroken,betray,hate myself,numb,empty,exhausted,can't cope",
+)
+# Median latency above which a stage steps down a tier
+STT_LATENCY_BUDGET_MS = float(os.getenv("STT_LATENCY_BUDGET_MS", "1500"))
+LLM_LATENCY_BUDGET_MS = float(os.getenv("LLM_LATENCY_BUDGET_MS", "2500"))
+# How long a latency sample counts, and how many a model needs before it can be judged
+TIER_WINDOW_SECONDS = float(os.getenv("TIER_WINDOW_SECONDS", "60"))
+TIER_MIN_SAMPLES = int(os.getenv("TIER_MIN_SAMPLES", "5"))
+
+# Seconds of speech in the utterance being transcribed, set by audio ingest
+speech_seconds: ContextVar[Optional[float]] = ContextVar("speech_seconds", default=None)
+
+_WORD = re.compile(r"\w+(?:'\w+)?")
+
+
+class LLMTier(NamedTuple):
+    model: str
+    max_tokens: int
+
+
+def _parse_stt_tiers(spec: str) -> List[str]:
+    return [name.strip() for name in spec.split(",") if name.strip()]
+
+
+def _parse_llm_tiers(spec: str) -> List[LLMTier]:
+    tiers = []
+    for item in spec.split(","):
+        model, _, max_tokens = item.strip().rpartition(":")
+        if not model:
+            # No ":max_tokens" given
+            model, max_tokens = max_tokens, "150"
+        if model:
+            tiers.append(LLMTier(model, int(max_tokens)))
+    return tiers
+
+
+def _heavy_pattern(spec: str) -> Optional[re.Pattern]:
+    terms = [term.strip() for term in spec.split(",") if term.strip()]
+    if not terms:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + ")", re.IGNORECASE)
+
+
+STT_TIERS = _parse_stt_tiers(STT_MODEL_TIERS) or ["whisper-large-v3"]
+LLM_TIERS = _parse_llm_tiers(LLM_MODEL_TIERS) or [LLMTier("gemma2-9b-it", 150)]
+_HEAVY = _heavy_pattern(TIER_HEAVY_TERMS)
+
+
+class LatencyWindow:
+    """A model's successful request latencies over the last TIER_WINDOW_SECONDS."""
+
+    def __init__(self, window: float = TIER_WINDOW_SECONDS):
+        self.window = window
+        self._samples = deque(maxlen=200)  # (monotonic time, seconds)
+
+    def record(self, seconds: float):
+        self._samples.append((time.monotonic(), seconds))
+
+    def median(self) -> Optional[float]:
+        """None until the window holds TIER_MIN_SAMPLES samples."""
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        if len(self._samples) < TIER_MIN_SAMPLES:
+            return None
+        ordered = sorted(seconds for _, seconds in self._samples)
+        return ordered[len(ordered) // 2]
+
+
+_latency: Dict[Tuple[str, str], LatencyWindow] = {}
+
+
+def record_latency(stage: str, model: str, seconds: float):
+    """Called by the provider modules after each successful request."""
+    window = _latency.get((stage, model))
+    if window is None:
+        window = _latency[(stage, model)] = LatencyWindow()
+    window.record(seconds)
+    metrics.MODEL_LATENCY.labels(stage, model).observe(seconds)
+
+
+def _pick(stage: str, models: List[str], wanted: int, reason: str, budget_ms: float) -> int:
+    index = wanted
+    while index > 0:
+        window = _latency.get((stage, models[index]))
+        median = window.median() if window is not None else None
+        if median is None or median * 1000 <= budget_ms:
+            break
+        logger.info("%s %s is at %.0f ms (budget %.0f ms), stepping down a tier", stage, models[index], median * 1000, budget_ms)
+        index -= 1
+        reason = "latency"
+    metrics.MODEL_TIER_CHOICES.labels(stage, models[index], reason).inc()
+    return index
+
+
+def stt_model(audio_bytes: bytes = b"") -> str:
+    """The Whisper model for an utterance, by its length and the models' recent latency."""
+    if not MODEL_TIERING or len(STT_TIERS) == 1:
+        return STT_TIERS[-1]
+    seconds = speech_seconds.get()
+    if seconds is None:
+        # Not through ingest (ingest off, streaming STT): WAV says how long it is
+        from utils.session_memory import wav_duration
+        seconds = wav_duration(audio_bytes)
+    if seconds is not None and seconds <= TIER_SHORT_AUDIO_SECONDS:
+        wanted, reason = 0, "short"
+    else:
+        # Unknown length counts as long: a wrong guess costs accuracy, not just time
+        wanted, reason = len(STT_TIERS) - 1, "long"
+    return STT_TIERS[_pick("stt", STT_TIERS, wanted, reason, STT_LATENCY_BUDGET_MS)]
+
+
+def llm_tier(user_message: str) -> LLMTier:
+    """The chat model and reply length for a message, by its length and weight and the models' recent latency."""
+    if not MODEL_TIERING or len(LLM_TIERS) == 1:
+        return LLM_TIERS[-1]
+    words = len(_WORD.findall(user_message))
+    if _HEAVY is not None and _HEAVY.search(user_message):
+        wanted, reason = len(LLM_TIERS) - 1, "heavy"
+    elif words > TIER_LONG_TEXT_WORDS:
+        wanted, reason = len(LLM_TIERS) - 1, "long"
+    elif words <= TIER_SHORT_TEXT_WORDS:
+        wanted, reason = 0, "short"
+    else:
+        wanted, reason = len(LLM_TIERS) // 2, "medium"
+    models = [tier.model for tier in LLM_TIERS]
+    return LLM_TIERS[_pick("llm", models, wanted, reason, LLM_LATENCY_BUDGET_MS)]
+
+
+def snapshot() -> dict:
+    """Tiers per stage with each model's current median latency."""
+    def describe(stage: str, models: List[str], budget_ms: float) -> dict:
+        medians = {}
+        for model in models:
+            window = _latency.get((stage, model))
+            median = window.median() if window is not None else None
+            medians[model] = round(median * 1000, 1) if median is not None else None
+        return {"tiers": models, "budget_ms": budget_ms, "median_ms": medians}
+
+    return {
+        "enabled": MODEL_TIERING,
+        "stt": describe("stt", STT_TIERS, STT_LATENCY_BUDGET_MS),
+        "llm": describe("llm", [tier.model for tier in LLM_TIERS], LLM_LATENCY_BUDGET_MS),
+    }
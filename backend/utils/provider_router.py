@@ -0,0 +1,372 @@
+# backend/utils/provider_router.py
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Routing settings (override via environment)
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_ATTEMPT_TIMEOUT = float(os.getenv("ROUTER_ATTEMPT_TIMEOUT", "20"))
+ROUTER_HEDGING = os.getenv("ROUTER_HEDGING", "1") == "1"
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "3.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "8.0"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+
+class ProviderUnavailable(Exception):
+    """Raised when every provider for a stage failed and there is no default."""
+
+
+class ProviderStats:
+    """
+    Rolling window of recent call outcomes for one provider.
+    """
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+
+    def record(self, latency: float, ok: bool):
+        self.calls += 1
+        self._outcomes.append(ok)
+        if ok:
+            # Only successful calls say how fast the provider really is
+            self._latencies.append(latency)
+        else:
+            self.failures += 1
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1.0 - sum(self._outcomes) / len(self._outcomes)
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after repeated failures; after BREAKER_OPEN_SECONDS one
+    trial call is let through (half-open) and its outcome decides whether
+    the breaker closes again or re-opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failures: int = BREAKER_FAILURES, error_rate: float = BREAKER_ERROR_RATE,
+                 open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.failure_threshold = failures
+        self.error_rate_threshold = error_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def available(self) -> bool:
+        """Like allow() but without claiming the half-open trial slot."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self._opened_at >= self.open_seconds
+        return not self._trial_in_flight
+
+    def release(self):
+        """Gives back the half-open trial slot of a call that ended without an outcome (cancelled)."""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        self._consecutive_failures = 0
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker closed")
+        self.state = self.CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self, stats: ProviderStats):
+        self._consecutive_failures += 1
+        too_many = self._consecutive_failures >= self.failure_threshold
+        too_often = stats.calls >= ROUTER_MIN_SAMPLES * 2 and stats.error_rate >= self.error_rate_threshold
+        if self.state == self.HALF_OPEN or too_many or too_often:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class Provider:
+    def __init__(self, name: str, call: Callable[..., Awaitable[Any]],
+                 is_failure: Optional[Callable[[Any], bool]] = None,
+                 stream: Optional[Callable[..., AsyncIterator[Any]]] = None):
+        self.name = name
+        self.call = call
+        self.stream = stream
+        self.is_failure = is_failure or (lambda result: False)
+        self.stats = ProviderStats()
+        # Streams are judged by their first chunk, which comes long before a whole result
+        self.first_chunk_stats = ProviderStats()
+        self.breaker = CircuitBreaker()
+
+    def stats_for(self, streaming: bool) -> ProviderStats:
+        return self.first_chunk_stats if streaming else self.stats
+
+
+class _OpenStream(NamedTuple):
+    """A stream that has produced its first chunk."""
+    first: Any
+    chunks: AsyncIterator[Any]
+
+
+class ProviderRouter:
+    """
+    Routes one pipeline stage (stt, llm, tts) to the fastest healthy
+    backend. A slow primary is hedged with the next provider after a
+    delay derived from its own p95 latency; failures move on to the next
+    provider immediately.
+    """
+
+    def __init__(self, stage: str, hedging: bool = ROUTER_HEDGING,
+                 attempt_timeout: float = ROUTER_ATTEMPT_TIMEOUT, default: Any = None):
+        self.stage = stage
+        self.hedging = hedging
+        self.attempt_timeout = attempt_timeout
+        self.default = default
+        self.providers: List[Provider] = []
+
+    def register(self, name: str, call: Callable[..., Awaitable[Any]],
+                 is_failure: Optional[Callable[[Any], bool]] = None,
+                 stream: Optional[Callable[..., AsyncIterator[Any]]] = None) -> Provider:
+        """
+        Adds a backend. call is an async function; it fails by raising or
+        by returning a result for which is_failure() is true (e.g. the
+        canned fallback text or empty audio). stream, if given, is an async
+        generator taking the same arguments, judged by its first chunk.
+        """
+        provider = Provider(name, call, is_failure, stream)
+        self.providers.append(provider)
+        return provider
+
+    def get(self, name: str) -> Optional[Provider]:
+        return next((p for p in self.providers if p.name == name), None)
+
+    def is_available(self, name: str) -> bool:
+        provider = self.get(name)
+        return provider is not None and provider.breaker.available()
+
+    def ranked(self, streaming: bool = False) -> List[Provider]:
+        """
+        Healthy providers, fastest first (when streaming: only those with a
+        stream, by time to first chunk). Providers without enough samples
+        keep their configured order behind the measured ones.
+        """
+        def speed(item):
+            index, provider = item
+            stats = provider.stats_for(streaming)
+            p50 = stats.percentile(0.5) if stats.samples >= ROUTER_MIN_SAMPLES else None
+            return (p50 is None, p50 or 0.0, index)
+
+        candidates = [(i, p) for i, p in enumerate(self.providers) if p.stream is not None or not streaming]
+        healthy = [(i, p) for i, p in candidates if p.breaker.available()]
+        if not healthy:
+            # Everything is tripped: try them all rather than fail outright
+            healthy = candidates
+        return [p for _, p in sorted(healthy, key=speed)]
+
+    def _hedge_delay(self, provider: Provider, streaming: bool = False) -> float:
+        stats = provider.stats_for(streaming)
+        if stats.samples < ROUTER_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, stats.percentile(0.95)))
+
+    @staticmethod
+    async def _open_stream(provider: Provider, args, kwargs) -> _OpenStream:
+        chunks = provider.stream(*args, **kwargs)
+        try:
+            first = await chunks.__anext__()
+        except BaseException:
+            await chunks.aclose()
+            raise
+        return _OpenStream(first, chunks)
+
+    async def _attempt(self, provider: Provider, args, kwargs, streaming: bool = False):
+        breaker = provider.breaker
+        allowed = breaker.allow()
+        if not allowed and any(p.breaker.available() for p in self.providers):
+            # Its half-open trial was claimed by another call since ranking; leave it to the others
+            return False, None
+        # Allowed, or every breaker is tripped and all are tried anyway
+        trial = allowed and breaker.state == CircuitBreaker.HALF_OPEN
+        start = time.monotonic()
+        result = None
+        settled = False
+        try:
+            try:
+                if streaming:
+                    opened = await asyncio.wait_for(self._open_stream(provider, args, kwargs), self.attempt_timeout)
+                    ok = not provider.is_failure(opened.first)
+                    if ok:
+                        result = opened
+                    else:
+                        # Fallback text instead of a reply: keep the text, drop the stream
+                        result = opened.first
+                        await opened.chunks.aclose()
+                else:
+                    result = await asyncio.wait_for(provider.call(*args, **kwargs), self.attempt_timeout)
+                    ok = not provider.is_failure(result)
+            except StopAsyncIteration:
+                logger.warning("%s provider %s streamed nothing", self.stage, provider.name)
+                ok = False
+            except asyncio.TimeoutError:
+                logger.warning("%s provider %s timed out after %ss", self.stage, provider.name, self.attempt_timeout)
+                ok = False
+            except Exception as e:
+                logger.warning("%s provider %s failed: %s", self.stage, provider.name, e)
+                ok = False
+            settled = True
+        finally:
+            if trial and not settled:
+                # Lost a hedge race or the turn was abandoned: says nothing about
+                # health, but the trial slot has to be given back or it is never tried again
+                breaker.release()
+
+        provider.stats_for(streaming).record(time.monotonic() - start, ok)
+        if ok:
+            provider.breaker.record_success()
+        else:
+            provider.breaker.record_failure(provider.stats)
+            if provider.breaker.state == CircuitBreaker.OPEN:
+                logger.warning("Circuit open for %s provider %s", self.stage, provider.name)
+        return ok, result
+
+    async def call(self, *args, **kwargs):
+        """
+        Runs the stage on the best provider, hedging and failing over as
+        needed. Returns the first successful result; if all fail, the last
+        failed result (e.g. a fallback reply) or the router default.
+        """
+        return await self._race(self.ranked(), args, kwargs)
+
+    async def stream(self, *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        Like call(), decided on the first chunk: a stream that raises,
+        times out or opens with failure text (a fallback reply) before its
+        first chunk is a failed attempt and is failed over, and a slow
+        first chunk is hedged. The winning stream's chunks are then passed
+        through as they come. Without a streaming provider this yields
+        call()'s result as a single chunk.
+        """
+        providers = self.ranked(streaming=True)
+        if not providers:
+            yield await self.call(*args, **kwargs)
+            return
+        result = await self._race(providers, args, kwargs, streaming=True)
+        if not isinstance(result, _OpenStream):
+            # Every stream failed: the last one's fallback text, or the default
+            yield result
+            return
+        try:
+            yield result.first
+            async for chunk in result.chunks:
+                yield chunk
+        finally:
+            await result.chunks.aclose()
+
+    async def _race(self, providers: List[Provider], args, kwargs, streaming: bool = False):
+        remaining = list(providers)
+        running: Dict[asyncio.Task, Provider] = {}
+        hedged = False
+        last_result = self.default
+        winner = None
+
+        def launch(retry: bool = True):
+            provider = remaining.pop(0)
+            if retry:
+                metrics.UPSTREAM_RETRIES.labels(provider.name).inc()
+            running[asyncio.create_task(self._attempt(provider, args, kwargs, streaming))] = provider
+
+        launch(retry=False)
+        try:
+            while running:
+                timeout = None
+                if self.hedging and not hedged and remaining:
+                    timeout = self._hedge_delay(next(iter(running.values())), streaming)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    logger.info("Hedging %s request to %s", self.stage, remaining[0].name)
+                    launch()
+                    continue
+
+                for task in done:
+                    running.pop(task)
+                    ok, result = task.result()
+                    if ok and winner is None:
+                        winner = result
+                    elif ok and streaming:
+                        # Both hedged streams opened in the same instant; keep one
+                        await result.chunks.aclose()
+                    elif not ok and result is not None:
+                        last_result = result
+                if winner is not None:
+                    return winner
+                if not running and remaining:
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+
+        if last_result is None:
+            raise ProviderUnavailable(f"No {self.stage} provider succeeded")
+        return last_result
+
+    def snapshot(self) -> dict:
+        snapshot = {}
+        for p in self.providers:
+            snapshot[p.name] = {"state": p.breaker.state, **p.stats.snapshot()}
+            if p.stream is not None:
+                snapshot[p.name]["first_chunk"] = p.first_chunk_stats.snapshot()
+        return snapshot
@@ -0,0 +1,119 @@
+# backend/utils/providers.py
+import os
+import asyncio
+import logging
+from typing import Dict
+
+from utils.provider_router import ProviderRouter
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated backends per stage, in order of preference
+STT_PROVIDERS = os.getenv("STT_PROVIDERS", "groq")
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "groq")
+TTS_PROVIDERS = os.getenv("TTS_PROVIDERS", "groq")
+
+
+def _stt_backend(name: str):
+    if name == "groq":
+        from utils.cloud_stt import transcribe_async
+        return transcribe_async, None
+    if name == "local":
+        import faster_whisper  # noqa: F401  (fail here, not inside a worker)
+        from utils.local_stt_engine import get_local_stt_engine
+        # Errors come back as exceptions, silence as "", as from Groq
+        return get_local_stt_engine().transcribe, None
+    raise ValueError(f"Unknown STT provider: {name}")
+
+
+def _llm_backend(name: str):
+    if name == "groq":
+        from utils.groq_ai import get_ai_response_async, FALLBACK_RESPONSES
+        return get_ai_response_async, lambda text: text in FALLBACK_RESPONSES
+    if name == "ollama":
+        from utils.local_ai import get_ai_response_async, FALLBACK_RESPONSE
+        return get_ai_response_async, lambda text: text == FALLBACK_RESPONSE
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def _llm_stream(name: str):
+    """The backend's token stream, routed (and failed over) like its whole-reply call."""
+    if name == "groq":
+        from utils.groq_ai import stream_ai_response
+        return stream_ai_response
+    if name == "ollama":
+        from utils.local_ai import stream_ai_response
+        return stream_ai_response
+    return None
+
+
+def _tts_backend(name: str):
+    if name == "groq":
+        from utils.groq_tts import text_to_speech_async
+        return text_to_speech_async, lambda audio: not audio
+    if name == "coqui":
+        import TTS  # noqa: F401  (fail here, not inside a worker)
+        from utils.local_tts_engine import text_to_speech_async as local_tts
+        return local_tts, lambda audio: not audio
+
+    if name == "elevenlabs":
+        from utils import cloud_tts as module
+    elif name == "google":
+        from utils import free_tts as module
+    else:
+        raise ValueError(f"Unknown TTS provider: {name}")
+
+    async def synthesize(text: str) -> bytes:
+        return await asyncio.to_thread(module.text_to_speech, text)
+    return synthesize, lambda audio: not audio
+
+
+_BACKENDS = {
+    "stt": (STT_PROVIDERS, _stt_backend, ""),
+    "llm": (LLM_PROVIDERS, _llm_backend, None),
+    "tts": (TTS_PROVIDERS, _tts_backend, b""),
+}
+
+# Stages whose backends can also stream their result
+_STREAMS = {"llm": _llm_stream}
+
+_routers: Dict[str, ProviderRouter] = {}
+
+
+def build_router(stage: str) -> ProviderRouter:
+    """
+    Creates the router for a stage from its *_PROVIDERS setting. Backends
+    whose dependencies are missing are skipped with an error log.
+    """
+    names, factory, default = _BACKENDS[stage]
+    router = ProviderRouter(stage, default=default)
+    for name in (n.strip() for n in names.split(",")):
+        if not name:
+            continue
+        try:
+            call, is_failure = factory(name)
+        except Exception as e:
+            logger.error("Could not load %s provider %s: %s", stage, name, e)
+            continue
+        stream = _STREAMS[stage](name) if stage in _STREAMS else None
+        router.register(name, call, is_failure, stream)
+    if not router.providers:
+        raise RuntimeError(f"No usable {stage} provider in '{names}'")
+    logger.info("%s providers: %s", stage, ', '.join((p.name for p in router.providers)))
+    return router
+
+
+def get_router(stage: str) -> ProviderRouter:
+    if stage not in _routers:
+        _routers[stage] = build_router(stage)
+    return _routers[stage]
+
+
+def uses(stage: str, name: str) -> bool:
+    """True if name is one of the configured backends for stage."""
+    names, _, _ = _BACKENDS[stage]
+    return name in (n.strip() for n in names.split(","))
+
+
+def snapshot() -> dict:
+    return {stage: router.snapshot() for stage, router in _routers.items()}
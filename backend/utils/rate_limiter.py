@@ -0,0 +1,329 @@
+# backend/utils/rate_limiter.py
+"""
+Process-wide rate limiting of upstream requests.
+
+Every upstream endpoint ("groq.completions", "groq.transcriptions",
+"groq.speech", ...) has a token bucket shared by all sessions. A request
+that can't go right away waits in the bucket's priority queue instead of
+failing: crisis-flagged sessions first, then a session's first turn,
+then everything else, then background work (summaries, prewarm).
+
+Buckets without a configured rate (RATE_LIMITS) let everything through
+until the provider pushes back: a 429's Retry-After, or rate-limit
+headers saying the quota is used up, pause the endpoint for everyone.
+The queue is then let go at the rate the provider allows, worked out
+from its x-ratelimit-* headers (limit, remaining, time until reset), so
+the retries neither land in the same instant nor trickle out slower
+than the quota refills. A provider that sends no such headers gets one
+request per Retry-After interval, jittered, and twice as slowly after
+every further 429.
+
+A request waits for its slot as long as its turn can afford: until
+TURN_LATENCY_BUDGET_MS after the turn started (RATE_LIMIT_MAX_WAIT for
+work outside a turn). Only then, or when the provider asks for a pause
+longer than that, does it give up so the caller can fail over.
+"""
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Proactive limits per endpoint as "name=requests/seconds", e.g.
+# "groq.completions=30/60,groq.transcriptions=20/60". Bursts of up to
+# `requests` go out at once. Endpoints not listed are only paused on 429s.
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+# How long after a turn starts its requests may still wait for a slot; past it they give up
+# (the caller then fails over)
+TURN_LATENCY_BUDGET_MS = float(os.getenv("TURN_LATENCY_BUDGET_MS", "8000"))
+# Longest a request outside a turn (summaries, prewarm) waits for a slot before giving up
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+# Times a 429 is retried once the pause is over
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+# Pause when a 429 comes without Retry-After
+RATE_LIMIT_DEFAULT_PAUSE = float(os.getenv("RATE_LIMIT_DEFAULT_PAUSE", "1"))
+# Least spacing between queued requests let go after a pause. Normally the spacing
+# comes from the provider's rate-limit headers; without them it is the pause itself,
+# the provider's estimate of when the next slot frees up
+RATE_LIMIT_SPREAD_MS = float(os.getenv("RATE_LIMIT_SPREAD_MS", "50"))
+
+# Request priorities; lower goes first
+CRISIS = 0
+FIRST_TURN = 1
+NORMAL = 2
+BACKGROUND = 3
+PRIORITY_NAMES = {CRISIS: "crisis", FIRST_TURN: "first_turn", NORMAL: "normal", BACKGROUND: "background"}
+
+# Priority of upstream requests made by the current task
+request_priority: ContextVar[int] = ContextVar("request_priority", default=NORMAL)
+# Monotonic time until which the current task's requests may wait for a slot; None outside a turn
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+_sequence = itertools.count()
+
+# "1m30.5s", "7.66s", "250ms" in x-ratelimit-reset-* headers
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class RateLimitTimeout(RuntimeError):
+    """A request used up its wait budget without getting a slot."""
+
+
+@contextmanager
+def priority(level: int):
+    """Runs the block's upstream requests at the given priority."""
+    token = request_priority.set(level)
+    # Background work started by a turn doesn't count against that turn's budget
+    deadline = request_deadline.set(None) if level == BACKGROUND else None
+    try:
+        yield
+    finally:
+        if deadline is not None:
+            request_deadline.reset(deadline)
+        request_priority.reset(token)
+
+
+def start_turn(level: int):
+    """
+    Marks the current task as working on a turn: its upstream requests run
+    at `level` and may wait for a slot until TURN_LATENCY_BUDGET_MS from now.
+    """
+    request_priority.set(level)
+    request_deadline.set(time.monotonic() + TURN_LATENCY_BUDGET_MS / 1000.0)
+
+
+def wait_budget() -> float:
+    """Seconds the current task's next request may wait for a slot."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return RATE_LIMIT_MAX_WAIT
+    return deadline - time.monotonic()
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in spec.split(","):
+        name, _, limit = item.partition("=")
+        if not name.strip() or not limit.strip():
+            continue
+        requests, _, seconds = limit.partition("/")
+        limits[name.strip()] = (float(requests) / float(seconds or 1), float(requests))
+    return limits
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in a Retry-After (seconds or HTTP date) or x-ratelimit-reset-* value."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if parts:
+        return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    One endpoint's request budget: `rate` requests per second with bursts
+    up to `burst` (rate None: unlimited unless paused). Waiters are served
+    in priority order, first come first served within a priority.
+    """
+
+    def __init__(self, name: str, rate: Optional[float] = None, burst: float = 1.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Set by a pause: the queue is let go one spaced step at a time until it is empty
+        self._spreading = False
+        self._spacing = 0.0
+        # Upper bound of the random factor on the spacing; no jitter when it is the provider's own rate
+        self._jitter = 1.0
+        self._next_release = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _wait_time(self, now: float) -> float:
+        """0 if a request may go now, else the seconds until one might."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self._spreading and now < self._next_release:
+            return self._next_release - now
+        if self.rate is None:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def _take(self, now: float):
+        if self.rate is not None:
+            self.tokens -= 1.0
+        if self._spreading:
+            self._next_release = now + self._spacing * random.uniform(1.0, self._jitter)
+
+    async def acquire(self, level: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """
+        Waits until a request may be sent. Returns the seconds spent
+        waiting; raises RateLimitTimeout after `timeout` (by default
+        the caller's wait_budget()).
+        """
+        level = request_priority.get() if level is None else level
+        now = time.monotonic()
+        if not self._waiters and self._wait_time(now) == 0.0:
+            self._take(now)
+            return 0.0
+        timeout = wait_budget() if timeout is None else timeout
+        if self.paused_until - now > timeout:
+            # Told to back off for longer than anyone will wait: fail now, not in `timeout` seconds
+            metrics.RATE_LIMIT_TIMEOUTS.labels(self.name).inc()
+            raise RateLimitTimeout(f"{self.name}: paused for {self.paused_until - now:.1f}s")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(_sequence), future))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, max(0.0, timeout))
+        except asyncio.TimeoutError:
+            metrics.RATE_LIMIT_TIMEOUTS.labels(self.name).inc()
+            raise RateLimitTimeout(f"{self.name}: no request slot within {timeout:.1f}s") from None
+        waited = time.monotonic() - now
+        metrics.RATE_LIMIT_WAIT.labels(self.name, PRIORITY_NAMES.get(level, str(level))).observe(waited)
+        return waited
+
+    def _dispatch(self):
+        """Lets go as many waiters as the bucket allows, then sleeps until the next could go."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            wait = self._wait_time(now)
+            if wait > 0.0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            self._take(now)
+            heapq.heappop(self._waiters)[2].set_result(None)
+        self._spreading = False
+
+    def pause(self, seconds: float, reason: str, allowed_rate: Optional[float] = None):
+        """
+        Holds every request to this endpoint for `seconds` (from Retry-After
+        or rate-limit headers), then lets the queue go at `allowed_rate`
+        requests per second, the provider's quota refill rate if known.
+        """
+        now = time.monotonic()
+        if now + seconds <= self.paused_until:
+            return
+        if now >= self.paused_until:
+            rejected_again = self._spreading and reason == "429"
+            if rejected_again or not self._spreading:
+                # Only the first of a burst of 429s is counted; the rest just extend the pause. Working
+                # off the queue at the allowed rate empties the quota every time, which isn't news.
+                metrics.RATE_LIMIT_PAUSES.labels(self.name, reason).inc()
+                logger.warning("Pausing %s requests for %.2fs (%s, %s queued)", self.name, seconds, reason, self.depth)
+            if allowed_rate:
+                spacing = 1.0 / allowed_rate
+                # Rejected again while working off the queue: the quota is tighter than the headers said
+                self._spacing = max(spacing, self._spacing * 1.25) if rejected_again else spacing
+                self._jitter = 1.0
+            elif self._spreading:
+                # Rejected again while working off the queue: the spacing was too tight
+                self._spacing = max(self._spacing * 2, seconds)
+                self._jitter = 1.3
+            else:
+                self._spacing = seconds
+                self._jitter = 1.3
+            self._spacing = max(RATE_LIMIT_SPREAD_MS / 1000.0, self._spacing)
+        self.paused_until = now + seconds
+        self._spreading = True
+        self._next_release = 0.0
+        if self.rate is not None:
+            self.tokens = 0.0
+        if self._waiters:
+            self._dispatch()
+
+
+_limits = _parse_limits(RATE_LIMITS)
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_bucket(name: str) -> TokenBucket:
+    bucket = _buckets.get(name)
+    if bucket is None:
+        rate, burst = _limits.get(name, (None, 1.0))
+        bucket = _buckets[name] = TokenBucket(name, rate, burst)
+        metrics.RATE_LIMIT_QUEUE_DEPTH.labels(name).set_function(lambda: bucket.depth)
+    return bucket
+
+
+def allowed_rate(headers) -> Optional[float]:
+    """
+    Requests per second the provider's quota refills at, from a response
+    that used it up: x-ratelimit-limit-requests over the time until it is
+    full again (x-ratelimit-reset-requests). None without those headers.
+    """
+    if headers.get("x-ratelimit-remaining-requests") != "0":
+        # Only an empty quota says how long all of it takes to come back
+        return None
+    try:
+        limit = float(headers.get("x-ratelimit-limit-requests") or 0)
+    except ValueError:
+        return None
+    reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+    if limit <= 0 or not reset:
+        return None
+    return limit / reset
+
+
+def observe(bucket: TokenBucket, status_code: int, headers) -> Optional[float]:
+    """
+    Reads a response's rate-limit signals. Pauses the bucket when the
+    provider says to back off and returns the pause for a 429, None if
+    the response isn't a rate-limit rejection.
+    """
+    rate = allowed_rate(headers)
+    if status_code == 429:
+        pause = parse_duration(headers.get("retry-after"))
+        if pause is None:
+            pause = 1.0 / rate if rate else RATE_LIMIT_DEFAULT_PAUSE
+        bucket.pause(pause, "429", rate)
+        return pause
+    # Groq (and OpenAI-style APIs) report the remaining quota on every response
+    if rate:
+        # The next request is allowed once one more has refilled, not once all of them have
+        bucket.pause(1.0 / rate, "requests_exhausted", rate)
+    if headers.get("x-ratelimit-remaining-tokens") == "0":
+        reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        if reset:
+            bucket.pause(reset, "tokens_exhausted")
+    return None
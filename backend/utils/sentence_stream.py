@@ -0,0 +1,37 @@
+# backend/utils/sentence_stream.py
+import re
+from typing import AsyncIterator
+
+# A sentence ends at . ! or ? (optionally followed by closing quotes/brackets)
+# and then whitespace. Requiring the trailing whitespace means we never cut
+# a sentence before we know the next token is not "5" in "3.5" or similar.
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+# Don't hand tiny fragments ("Oh.") to TTS on their own; merge them forward
+MIN_SENTENCE_CHARS = 20
+
+
+async def iter_sentences(tokens: AsyncIterator[str], min_chars: int = MIN_SENTENCE_CHARS) -> AsyncIterator[str]:
+    """
+    Regroups a stream of LLM text deltas into complete sentences.
+
+    Each sentence is yielded as soon as its terminating punctuation and the
+    following whitespace have arrived; whatever remains when the token
+    stream ends is yielded as the final sentence.
+    """
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        start = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            if match.end() - start < min_chars:
+                continue
+            sentence = buffer[start:match.end()].strip()
+            start = match.end()
+            if sentence:
+                yield sentence
+        buffer = buffer[start:]
+
+    tail = buffer.strip()
+    if tail:
+        yield tail
@@ -0,0 +1,154 @@
+# backend/utils/session_memory.py
+"""
+Limits on the audio a session can make the server hold, and the numbers
+behind /debug/memory.
+
+An uploaded utterance is checked as soon as its message has been read:
+over MAX_UTTERANCE_BYTES, or a WAV whose header says it is longer than
+MAX_UTTERANCE_SECONDS, and it is refused before anything decodes it.
+(server.py also caps WebSocket messages at MAX_UTTERANCE_BYTES, so the
+transport drops larger ones while they are still arriving.) Compressed
+uploads don't say how long they are; ingest stops decoding them at
+MAX_UTTERANCE_SECONDS instead.
+"""
+import gc
+import os
+import sys
+import struct
+import logging
+import tracemalloc
+from typing import Dict, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Largest uploaded utterance (one WebSocket binary message)
+MAX_UTTERANCE_BYTES = int(os.getenv("MAX_UTTERANCE_BYTES", str(8 * 1024 * 1024)))
+# Longest uploaded utterance; the streaming recognizer cuts at STT_MAX_UTTERANCE_MS
+MAX_UTTERANCE_SECONDS = float(os.getenv("MAX_UTTERANCE_SECONDS", "60"))
+# /debug/memory is off unless enabled: it lists sessions and tracemalloc slows every allocation
+MEMORY_DEBUG = os.getenv("MEMORY_DEBUG", "0") == "1"
+# Stack depth tracemalloc records per allocation; more frames, more overhead
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "1"))
+
+
+def wav_duration(audio: bytes) -> Optional[float]:
+    """Seconds of audio a WAV header announces, without decoding; None if it isn't readable WAV."""
+    if len(audio) < 12 or audio[:4] != b"RIFF" or audio[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= len(audio):
+        chunk_id = audio[offset:offset + 4]
+        (size,) = struct.unpack_from("<I", audio, offset + 4)
+        if chunk_id == b"fmt " and size >= 12:
+            if offset + 20 > len(audio):
+                # Truncated upload: the header ends inside the fmt chunk
+                return None
+            (byte_rate,) = struct.unpack_from("<I", audio, offset + 16)
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF; count what is actually there
+            available = len(audio) - offset - 8
+            data_size = size if 0 < size <= available else available
+            return data_size / byte_rate
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def check_utterance(audio: bytes) -> Optional[str]:
+    """Why an uploaded utterance is refused, or None if it is within the limits."""
+    if len(audio) > MAX_UTTERANCE_BYTES:
+        metrics.UTTERANCES_REJECTED.labels("size").inc()
+        return f"Utterance too large ({len(audio)} bytes, limit {MAX_UTTERANCE_BYTES})"
+    seconds = wav_duration(audio)
+    if seconds is not None and seconds > MAX_UTTERANCE_SECONDS:
+        metrics.UTTERANCES_REJECTED.labels("duration").inc()
+        return f"Utterance too long ({seconds:.1f}s, limit {MAX_UTTERANCE_SECONDS:.0f}s)"
+    return None
+
+
+class SessionUsage:
+    """Audio one session has sent, and how much of it the server still holds."""
+    __slots__ = ("received_bytes", "largest_message", "utterances", "rejected", "held_bytes")
+
+    def __init__(self):
+        self.received_bytes = 0
+        self.largest_message = 0
+        # Uploaded utterances transcribed, and refused by check_utterance
+        self.utterances = 0
+        self.rejected = 0
+        # Uploads waiting for (or in) transcription
+        self.held_bytes = 0
+
+    def received(self, size: int):
+        self.received_bytes += size
+        self.largest_message = max(self.largest_message, size)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def process_memory() -> Dict:
+    """Process-wide numbers: RSS, Python's own allocations and the garbage collector."""
+    return {
+        "rss_bytes": int(metrics.resident_memory_bytes()),
+        "python_allocated_blocks": sys.getallocatedblocks(),
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "tracemalloc": tracemalloc.is_tracing(),
+    }
+
+
+# Compared against by the next snapshot, so each one shows what grew in between
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def _statistics(stats, top: int):
+    return [
+        {"where": str(stat.traceback), "size_bytes": stat.size, "count": stat.count,
+         **({"size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff} if hasattr(stat, "size_diff") else {})}
+        for stat in stats[:top]
+    ]
+
+
+def tracemalloc_report(action: str, top: int = 20) -> Dict:
+    """
+    "start" begins tracing, "stop" ends it, "snapshot" returns the biggest
+    allocation sites and what changed since the previous snapshot. Blocks
+    while the snapshot is taken; call it from a thread.
+    """
+    global _last_snapshot
+    if action == "start":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            logger.warning("tracemalloc started (%s frames); allocations are slower until it is stopped", TRACEMALLOC_FRAMES)
+        _last_snapshot = tracemalloc.take_snapshot()
+        return {"tracing": True}
+    if action == "stop":
+        tracemalloc.stop()
+        _last_snapshot = None
+        logger.info("tracemalloc stopped")
+        return {"tracing": False}
+    if action != "snapshot":
+        return {"error": f"Unknown tracemalloc action: {action}"}
+    if not tracemalloc.is_tracing():
+        return {"error": "tracemalloc is not running; start it first"}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    report = {
+        "tracing": True,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": _statistics(snapshot.statistics("lineno"), top),
+    }
+    if _last_snapshot is not None:
+        report["growth"] = _statistics(snapshot.compare_to(_last_snapshot, "lineno"), top)
+    _last_snapshot = snapshot
+    return report
@@ -0,0 +1,422 @@
+# backend/utils/session_store.py
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import secrets
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Store settings (override via environment)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # memory, sqlite or redis
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_STORE_MAX_ENTRIES = int(os.getenv("SESSION_STORE_MAX_ENTRIES", "10000"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sessions.db"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_REDIS_TIMEOUT = float(os.getenv("SESSION_REDIS_TIMEOUT", "2"))
+# Write-behind batching for the sqlite and redis backends
+SESSION_FLUSH_MS = int(os.getenv("SESSION_FLUSH_MS", "250"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "64"))
+
+_TOKEN = re.compile(r"^[A-Za-z0-9_-]{16,128}$")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+def valid_token(token) -> bool:
+    return isinstance(token, str) and bool(_TOKEN.match(token))
+
+
+def _key(token: str) -> str:
+    # Tokens are bearer secrets: the store only ever sees a digest of them
+    return hashlib.sha256(token.encode("ascii")).hexdigest()
+
+
+def _dumps(state: dict) -> str:
+    return json.dumps(state, separators=(",", ":"))
+
+
+class SessionStore:
+    """
+    Conversation state by session token, so a client can reconnect (to
+    any worker, for the shared backends) and pick up where it left off.
+    States are JSON-serializable dicts and expire SESSION_TTL seconds
+    after their last save.
+    """
+    backend = ""
+
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+
+    async def start(self):
+        pass
+
+    async def load(self, token: str) -> Optional[dict]:
+        with metrics.SESSION_STORE_SECONDS.labels(self.backend, "load").time():
+            payload = await self._load(_key(token))
+        return json.loads(payload) if payload else None
+
+    async def save(self, token: str, state: dict):
+        await self._save(_key(token), _dumps(state))
+
+    async def delete(self, token: str):
+        await self._save(_key(token), None)
+
+    async def close(self):
+        pass
+
+    async def _load(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def _save(self, key: str, payload: Optional[str]):
+        """payload None deletes the entry."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process TTL/LRU store. Sessions survive reconnects but not a
+    restart, and are only visible to the worker that created them.
+    """
+    backend = "memory"
+
+    def __init__(self, ttl: int = SESSION_TTL, max_entries: int = SESSION_STORE_MAX_ENTRIES):
+        super().__init__(ttl)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, payload)
+
+    async def _load(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def _save(self, key: str, payload: Optional[str]):
+        self._entries.pop(key, None)
+        if payload is None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, payload)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class _BatchedStore(SessionStore):
+    """
+    Write-behind buffer for stores with real I/O. save() only records the
+    latest state per session; a background task writes everything dirty
+    in one transaction or pipeline every SESSION_FLUSH_MS, or as soon as
+    SESSION_FLUSH_BATCH sessions are waiting. Loads read the buffer first,
+    so a session always sees its own writes.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL, flush_ms: int = SESSION_FLUSH_MS,
+                 flush_batch: int = SESSION_FLUSH_BATCH):
+        super().__init__(ttl)
+        self.flush_interval = flush_ms / 1000.0
+        self.flush_batch = max(1, flush_batch)
+        self._dirty: Dict[str, Optional[str]] = {}
+        self._flushing: Dict[str, Optional[str]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def _load(self, key: str) -> Optional[str]:
+        for pending in (self._dirty, self._flushing):
+            if key in pending:
+                return pending[key]
+        return await self._read(key)
+
+    async def _save(self, key: str, payload: Optional[str]):
+        self._dirty[key] = payload
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+        if len(self._dirty) >= self.flush_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Writes every buffered save now."""
+        if not self._dirty:
+            return
+        self._flushing, self._dirty = self._dirty, {}
+        written = False
+        try:
+            with metrics.SESSION_STORE_SECONDS.labels(self.backend, "flush").time():
+                await self._write(self._flushing)
+            written = True
+        except Exception as e:
+            logger.warning("Session store flush of %s session(s) failed, will retry: %s", len(self._flushing), e)
+        finally:
+            if not written:
+                # Keep anything saved since the batch was taken; it is newer
+                for key, payload in self._flushing.items():
+                    self._dirty.setdefault(key, payload)
+            self._flushing = {}
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self):
+        # Let a flush in progress finish rather than cancel it halfway
+        self._closing = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+
+    async def _read(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def _write(self, batch: Dict[str, Optional[str]]):
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(_BatchedStore):
+    """
+    Local SQLite file. Survives restarts and is shared by the workers of
+    one host (WAL mode, so reads don't wait on the flusher). All database
+    work runs on one dedicated thread.
+    """
+    backend = "sqlite"
+
+    def __init__(self, path: str = SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-db")
+        self._db: Optional[sqlite3.Connection] = None
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=5000")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+            db.commit()
+            self._db = db
+            logger.info("Session store: sqlite at %s", self.path)
+        return self._db
+
+    async def start(self):
+        await self._call(self._connect)
+
+    def _read_sync(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT state FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write_sync(self, batch: Dict[str, Optional[str]]):
+        now = time.time()
+        db = self._connect()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO sessions (key, state, expires_at) VALUES (?, ?, ?)",
+                [(key, payload, now + self.ttl) for key, payload in batch.items() if payload is not None],
+            )
+            db.executemany(
+                "DELETE FROM sessions WHERE key = ?",
+                [(key,) for key, payload in batch.items() if payload is None],
+            )
+            db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    async def _read(self, key: str) -> Optional[str]:
+        return await self._call(self._read_sync, key)
+
+    async def _write(self, batch: Dict[str, Optional[str]]):
+        await self._call(self._write_sync, batch)
+
+    async def close(self):
+        await super().close()
+        if self._db is not None:
+            await self._call(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+
+class RedisError(Exception):
+    """An error reply from the Redis server."""
+
+
+def _encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        return RedisError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Unexpected Redis reply: {line[:40]!r}")
+
+
+class RedisSessionStore(_BatchedStore):
+    """
+    Any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...),
+    over one pipelined connection with a minimal built-in RESP client, so
+    no extra package is needed. Sessions are shared by every worker and
+    host pointed at the same server; expiry is left to the server.
+    """
+    backend = "redis"
+    KEY_PREFIX = "astra:session:"
+
+    def __init__(self, url: str = SESSION_REDIS_URL, timeout: float = SESSION_REDIS_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        handshake = []
+        if self.password:
+            handshake.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            handshake.append(("SELECT", self.db))
+        if handshake:
+            self._raise_errors(await self._send(handshake))
+        logger.info("Session store: redis at %s:%s/%s", self.host, self.port, self.db)
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _send(self, commands: List[tuple]) -> list:
+        self._writer.write(b"".join(_encode_command(*command) for command in commands))
+        await self._writer.drain()
+        return [await asyncio.wait_for(_read_reply(self._reader), self.timeout) for _ in commands]
+
+    @staticmethod
+    def _raise_errors(replies: list) -> list:
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    async def execute(self, commands: List[tuple]) -> list:
+        """
+        Sends the commands as one pipeline and returns their replies in
+        order. Reconnects and retries once if the connection was lost;
+        every command this store sends is idempotent.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return self._raise_errors(await self._send(commands))
+                except (OSError, EOFError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+                except BaseException:
+                    # A cancelled read leaves replies in flight; the connection can't be reused
+                    self._disconnect()
+                    raise
+
+    async def start(self):
+        await self.execute([("PING",)])
+
+    async def _read(self, key: str) -> Optional[str]:
+        reply = (await self.execute([("GET", self.KEY_PREFIX + key)]))[0]
+        return reply.decode("utf-8") if reply is not None else None
+
+    async def _write(self, batch: Dict[str, Optional[str]]):
+        commands = []
+        for key, payload in batch.items():
+            if payload is None:
+                commands.append(("DEL", self.KEY_PREFIX + key))
+            else:
+                commands.append(("SET", self.KEY_PREFIX + key, payload, "EX", self.ttl))
+        await self.execute(commands)
+
+    async def close(self):
+        await super().close()
+        self._disconnect()
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        if SESSION_STORE == "sqlite":
+            _store = SQLiteSessionStore()
+        elif SESSION_STORE == "redis":
+            _store = RedisSessionStore()
+        else:
+            if SESSION_STORE != "memory":
+                logger.error("Unknown SESSION_STORE '%s', using memory", SESSION_STORE)
+            _store = MemorySessionStore()
+    return _store
+
+
+async def close_session_store():
+    """Flushes buffered writes; call on shutdown."""
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
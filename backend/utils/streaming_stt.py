@@ -0,0 +1,269 @@
+# backend/utils/streaming_stt.py
+import os
+import io
+import wave
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Endpointing settings (override via environment)
+STREAM_SAMPLE_RATE = 16000
+FRAME_MS = 30
+SPEECH_START_MS = int(os.getenv("STT_SPEECH_START_MS", "90"))
+END_SILENCE_MS = int(os.getenv("STT_END_SILENCE_MS", "700"))
+PRE_ROLL_MS = int(os.getenv("STT_PRE_ROLL_MS", "300"))
+MAX_UTTERANCE_MS = int(os.getenv("STT_MAX_UTTERANCE_MS", "30000"))
+PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", "1000"))
+# Speech must be this many dB above the tracked noise floor
+SPEECH_MARGIN_DB = float(os.getenv("STT_SPEECH_MARGIN_DB", "12"))
+MIN_SPEECH_DBFS = float(os.getenv("STT_MIN_SPEECH_DBFS", "-50"))
+
+
+def pcm16_to_float(pcm: bytes) -> np.ndarray:
+    """
+    Converts little-endian 16-bit PCM to float32 samples in [-1, 1].
+    """
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def float_to_wav(samples: np.ndarray, sample_rate: int = STREAM_SAMPLE_RATE) -> bytes:
+    """
+    Encodes float32 samples as a 16-bit mono WAV held in memory.
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+class SampleBuffer:
+    """
+    Growable float32 buffer that keeps its storage between utterances, so a
+    session allocates once for its longest utterance instead of once per
+    frame and again for every partial and final transcription.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self._data = np.empty(capacity, dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated, used or not."""
+        return self._data.nbytes
+
+    def append(self, samples: np.ndarray):
+        end = self._size + len(samples)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:end] = samples
+        self._size = end
+
+    def view(self) -> np.ndarray:
+        """The samples so far, without a copy; only valid until the next append or clear."""
+        return self._data[:self._size]
+
+    def clear(self):
+        # Keeps the storage for the next utterance
+        self._size = 0
+
+
+class EnergyEndpointer:
+    """
+    Frame-level voice activity detector. Tracks an adaptive noise floor and
+    flags speech frames that sit well above it; an utterance ends after
+    END_SILENCE_MS of consecutive non-speech following speech.
+    """
+
+    def __init__(self, sample_rate: int = STREAM_SAMPLE_RATE):
+        self.frame_samples = sample_rate * FRAME_MS // 1000
+        self.start_frames = max(1, SPEECH_START_MS // FRAME_MS)
+        self.end_frames = max(1, END_SILENCE_MS // FRAME_MS)
+        self.noise_db = -60.0
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def frame_levels(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Per-frame RMS level in dBFS for all whole frames in samples.
+        """
+        frames = len(samples) // self.frame_samples
+        if frames == 0:
+            return np.empty(0, dtype=np.float32)
+        shaped = samples[:frames * self.frame_samples].reshape(frames, self.frame_samples)
+        rms = np.sqrt(np.mean(shaped * shaped, axis=1) + 1e-12)
+        return 20.0 * np.log10(rms)
+
+    def update(self, level_db: float) -> Optional[str]:
+        """
+        Feeds one frame level. Returns "start" or "end" on a state change.
+        """
+        is_speech = level_db > max(self.noise_db + SPEECH_MARGIN_DB, MIN_SPEECH_DBFS)
+        if not is_speech:
+            # Slowly follow the background level while nobody is talking
+            self.noise_db += 0.05 * (level_db - self.noise_db)
+
+        if not self.in_speech:
+            self._speech_run = self._speech_run + 1 if is_speech else 0
+            if self._speech_run >= self.start_frames:
+                self.in_speech = True
+                self._silence_run = 0
+                return "start"
+            return None
+
+        self._silence_run = 0 if is_speech else self._silence_run + 1
+        if self._silence_run >= self.end_frames:
+            self.in_speech = False
+            self._speech_run = 0
+            return "end"
+        return None
+
+
+async def _default_transcriber(samples: np.ndarray) -> str:
+    """
+    Transcribes through the STT provider router, as utterance mode does, so
+    both modes share its breakers, failover and hedging.
+    """
+    from utils import providers
+    return await providers.get_router("stt").call(float_to_wav(samples))
+
+
+class StreamingRecognizer:
+    """
+    Per-session incremental recognizer. Audio arrives as small PCM16 mono
+    chunks; partial transcripts are published while the user is still
+    talking and the final transcript is produced as soon as the endpointer
+    detects end of speech.
+    """
+
+    def __init__(self, sample_rate: int = STREAM_SAMPLE_RATE,
+                 transcribe: Optional[Callable[[np.ndarray], Awaitable[str]]] = None,
+                 on_partial: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.sample_rate = sample_rate
+        self.transcribe = transcribe or _default_transcriber
+        self.on_partial = on_partial
+        self.endpointer = EnergyEndpointer(STREAM_SAMPLE_RATE)
+        self._pending = np.empty(0, dtype=np.float32)
+        self._pre_roll = []
+        self._pre_roll_frames = max(1, PRE_ROLL_MS // FRAME_MS)
+        # Preallocated for a typical utterance; grows up to MAX_UTTERANCE_MS and stays there
+        self._utterance = SampleBuffer(STREAM_SAMPLE_RATE * 5)
+        self._since_partial = 0
+        self._partial_task: Optional[asyncio.Task] = None
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Audio storage held by this recognizer."""
+        return self._utterance.nbytes + self._pending.nbytes + sum(f.nbytes for f in self._pre_roll)
+
+    def _resample(self, samples: np.ndarray) -> np.ndarray:
+        if self.sample_rate == STREAM_SAMPLE_RATE or len(samples) == 0:
+            return samples
+        target = int(round(len(samples) * STREAM_SAMPLE_RATE / self.sample_rate))
+        positions = np.linspace(0, len(samples) - 1, target)
+        return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+    def _start_partial(self):
+        if self.on_partial is None or (self._partial_task and not self._partial_task.done()):
+            return
+        # A copy: the buffer keeps filling (and is reused) while this is transcribed
+        audio = self._utterance.view().copy()
+
+        async def run():
+            try:
+                text = (await self.transcribe(audio)).strip()
+                if text and self.endpointer.in_speech:
+                    await self.on_partial(text)
+            except Exception as e:
+                logger.warning("Partial transcription failed: %s", e)
+
+        self._partial_task = asyncio.create_task(run())
+
+    def _finish(self) -> Optional[Awaitable[str]]:
+        if self._partial_task and not self._partial_task.done():
+            self._partial_task.cancel()
+        self._since_partial = 0
+        self.endpointer.reset()
+        if len(self._utterance) == 0:
+            return None
+        # A copy: the buffer is reused for the next utterance while this one is transcribed
+        audio = self._utterance.view().copy()
+        self._utterance.clear()
+        logger.info("End of speech detected, transcribing %.2fs of audio", len(audio) / STREAM_SAMPLE_RATE)
+        return self._transcribe_final(audio)
+
+    async def _transcribe_final(self, audio: np.ndarray) -> str:
+        with metrics.time_stage("stt"):
+            return (await self.transcribe(audio)).strip()
+
+    def feed(self, pcm_chunk: bytes) -> Optional[Awaitable[str]]:
+        """
+        Adds a chunk of audio. When this chunk completed an utterance,
+        returns its final transcription (not yet awaited, so the caller can
+        keep reading audio meanwhile), otherwise None.
+        """
+        samples = self._resample(pcm16_to_float(pcm_chunk))
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+
+        frame_samples = self.endpointer.frame_samples
+        levels = self.endpointer.frame_levels(samples)
+        for index, level in enumerate(levels):
+            frame = samples[index * frame_samples:(index + 1) * frame_samples]
+            event = self.endpointer.update(float(level))
+
+            if event == "start":
+                self._utterance.clear()
+                for pre in self._pre_roll:
+                    self._utterance.append(pre)
+                self._utterance.append(frame)
+                self._pre_roll = []
+                continue
+
+            if self.endpointer.in_speech or event == "end":
+                self._utterance.append(frame)
+                self._since_partial += len(frame)
+                too_long = len(self._utterance) * 1000 >= MAX_UTTERANCE_MS * STREAM_SAMPLE_RATE
+                if event == "end" or too_long:
+                    self._pending = samples[(index + 1) * frame_samples:].copy()
+                    return self._finish()
+                if self._since_partial * 1000 >= PARTIAL_INTERVAL_MS * STREAM_SAMPLE_RATE:
+                    self._since_partial = 0
+                    self._start_partial()
+            else:
+                self._pre_roll.append(frame)
+                if len(self._pre_roll) > self._pre_roll_frames:
+                    self._pre_roll.pop(0)
+
+        self._pending = samples[len(levels) * frame_samples:].copy()
+        return None
+
+    def flush(self) -> Optional[Awaitable[str]]:
+        """
+        Forces end of utterance (e.g. the client pressed stop) and returns
+        the transcription of whatever speech has been collected, or None if
+        there is none.
+        """
+        if len(self._utterance) and len(self._pending):
+            self._utterance.append(self._pending)
+        self._pending = np.empty(0, dtype=np.float32)
+        self._pre_roll = []
+        return self._finish()
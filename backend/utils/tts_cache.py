@@ -0,0 +1,343 @@
+# backend/utils/tts_cache.py
+import os
+import re
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import wraps
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Memory tier size limit and optional on-disk tier (override via environment)
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "")
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+# A full disk tier is pruned down to this fraction of its limit, so it isn't walked again on the next write
+TTS_CACHE_DISK_PRUNE_TO = 0.9
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text so trivially different spellings of the same reply
+    (extra spaces, unicode composition) share one cache entry.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(text: str, voice: str, model: str, audio_format: str) -> str:
+    """
+    Content address for one synthesized clip.
+    """
+    material = "\x1f".join((normalize_text(text), voice or "", model or "", audio_format or ""))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """A synthesis in progress and how many callers are waiting for it."""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class TTSCache:
+    """
+    Two-tier cache of synthesized audio: a byte-bounded in-memory LRU in
+    front of an optional directory of content-addressed files that
+    survives restarts.
+
+    get/put block on the disk tier and are for sync TTS backends, which
+    run off the event loop. On the loop, use get_or_fill (or
+    get_async/put_async): disk I/O goes to a thread, and concurrent misses
+    on one key share a single synthesis.
+    """
+
+    def __init__(self, max_bytes: int = TTS_CACHE_MAX_BYTES, disk_dir: str = TTS_CACHE_DIR,
+                 disk_max_bytes: int = TTS_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._disk_lock = threading.Lock()
+        # Bytes in the disk tier; counted by the first write, then kept up to date by each one
+        self._disk_bytes: Optional[int] = None
+        # Syntheses in progress by key, for get_or_fill; only touched on the event loop
+        self._flights: Dict[str, _Flight] = {}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            logger.info("TTS disk cache enabled at %s", self.disk_dir)
+
+    # -- memory tier -----------------------------------------------------
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = audio
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    # -- disk tier -------------------------------------------------------
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("TTS disk cache read failed: %s", e)
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("TTS disk cache write failed: %s", e)
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(audio) - replaced
+            if self._disk_bytes > self.disk_max_bytes:
+                self._disk_bytes = self._prune_disk()
+
+    def _disk_files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _prune_disk(self) -> int:
+        """
+        Removes the least recently modified files until the disk tier is
+        back under TTS_CACHE_DISK_PRUNE_TO of its limit. Returns the bytes
+        left; the walk also corrects any drift in the running count.
+        """
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * TTS_CACHE_DISK_PRUNE_TO
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+    # -- public API ------------------------------------------------------
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return audio
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        audio = self._read_disk(key) if self.disk_dir else None
+        if audio is not None:
+            self._remember(key, audio)
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+        return audio
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio = self._get_memory(key)
+        return audio if audio is not None else self._get_disk(key)
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        audio = self._get_memory(key)
+        if audio is not None:
+            return audio
+        if not self.disk_dir:
+            # Just counts the miss
+            return self._get_disk(key)
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            # Never cache failed syntheses
+            return
+        self._remember(key, audio)
+        if self.disk_dir:
+            self._write_disk(key, audio)
+
+    async def put_async(self, key: str, audio: bytes):
+        if not audio:
+            return
+        self._remember(key, audio)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, audio)
+
+    async def get_or_fill(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Cached audio for `key`, or else what synthesize() returns, cached.
+        Concurrent misses on one key wait for a single synthesis, which is
+        cancelled only once every caller waiting for it has been.
+        """
+        audio = await self.get_async(key)
+        if audio is not None:
+            return audio
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(self._fill(key, synthesize)))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                # Nobody else wants it: don't leave the upstream request running
+                self._land(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def _fill(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        audio = await synthesize()
+        await self.put_async(key, audio)
+        return audio
+
+    def _land(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+    if _cache is None:
+        _cache = TTSCache()
+    return _cache
+
+
+def cached_tts(backend: str, model: str, audio_format: str, default_voice: str = ""):
+    """
+    Decorator that puts the shared cache in front of a TTS backend's
+    text_to_speech(text[, voice]) function. Works for sync and async
+    functions alike.
+    """
+    def decorator(func: Callable):
+        takes_voice = "voice" in inspect.signature(func).parameters
+
+        def key_for(text: str, voice: Optional[str]) -> str:
+            return make_key(text, f"{backend}:{voice or default_voice}", model, audio_format)
+
+        def call_args(text: str, voice: Optional[str]):
+            if takes_voice and voice is not None:
+                return (text,), {"voice": voice}
+            return (text,), {}
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(text: str, voice: Optional[str] = None) -> bytes:
+                args, kwargs = call_args(text, voice)
+                return await get_tts_cache().get_or_fill(key_for(text, voice), lambda: func(*args, **kwargs))
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(text: str, voice: Optional[str] = None) -> bytes:
+            cache = get_tts_cache()
+            key = key_for(text, voice)
+            audio = cache.get(key)
+            if audio is not None:
+                return audio
+            args, kwargs = call_args(text, voice)
+            audio = func(*args, **kwargs)
+            cache.put(key, audio)
+            return audio
+        return wrapper
+
+    return decorator
+
+
+async def prewarm(phrases: Iterable[str], synthesize: Callable) -> int:
+    """
+    Synthesizes fixed phrases (crisis response, fallback replies) ahead of
+    time so their first use is served from the cache. Returns the number
+    of phrases that ended up cached.
+    """
+    warmed = 0
+    for phrase in phrases:
+        try:
+            # Background work: live turns go first if the provider is rate-limiting us
+            with rate_limiter.priority(rate_limiter.BACKGROUND):
+                audio = await synthesize(phrase)
+        except Exception as e:
+            logger.warning("TTS prewarm failed for a phrase: %s", e)
+            continue
+        if audio:
+            warmed += 1
+    logger.info("TTS cache prewarmed %s phrases", warmed)
+    return warmed
@@ -3,12 +3,19 @@
 from TTS.api import TTS
 import numpy as np
 import io
-import soundfile as sf
-import tempfile
 import os
+import logging
+import soundfile as sf
+
+from utils.tts_cache import cached_tts
+from utils.log_pipeline import redact
+
+logger = logging.getLogger(__name__)
 
 # Cache the TTS model
 _tts_model = None
+TTS_MODEL_NAME = os.getenv("COQUI_TTS_MODEL", "tts_models/en/ljspeech/tacotron2-DDC_ph")
+TTS_SAMPLE_RATE = 22050  # ljspeech models output 22.05 kHz
 
 def get_tts_model():
     """
@@ -16,13 +23,22 @@ def get_tts_model():
     """
     global _tts_model
     if _tts_model is None:
-        print("Loading TTS model... (This may take a moment)")
+        logger.info("Loading TTS model %s... (This may take a moment)", TTS_MODEL_NAME)
         # Using a fast and high-quality English voice model
         # You can explore other models: https://tts.readthedocs.io/en/latest/models.html
-        _tts_model = TTS("tts_models/en/ljspeech/tacotron2-DDC_ph")
-        print("TTS model loaded!")
+        _tts_model = TTS(TTS_MODEL_NAME)
+        logger.info("TTS model loaded")
     return _tts_model
 
+def encode_wav(audio_array, sample_rate: int = TTS_SAMPLE_RATE) -> bytes:
+    """
+    Encodes synthesized samples as WAV bytes in memory.
+    """
+    buffer = io.BytesIO()
+    sf.write(buffer, np.asarray(audio_array), sample_rate, format="WAV")
+    return buffer.getvalue()
+
+@cached_tts("coqui", TTS_MODEL_NAME, "wav", default_voice="ljspeech")
 def text_to_speech(text: str) -> bytes:
     """
     Converts text to speech audio bytes.
@@ -37,24 +53,16 @@ def text_to_speech(text: str) -> bytes:
         tts = get_tts_model()
         
         # Generate speech as numpy array
-        print(f"Generating speech for: '{text}'")
+        logger.info("Generating speech for: '%s'", redact(text))
         audio_array = tts.tts(text=text)
         
-        # Convert numpy array to WAV bytes
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            # Save as WAV file
-            sf.write(tmp_file.name, audio_array, 22050)  # 22.05 kHz sample rate
-            # Read back as bytes
-            with open(tmp_file.name, "rb") as f:
-                wav_bytes = f.read()
-        
-        # Clean up
-        os.unlink(tmp_file.name)
+        # Convert numpy array to WAV bytes in memory
+        wav_bytes = encode_wav(audio_array)
         
-        print(f"Generated audio: {len(wav_bytes)} bytes")
+        logger.info("Generated audio: %s bytes", len(wav_bytes))
         return wav_bytes
         
     except Exception as e:
-        print(f"Error in TTS generation: {e}")
+        logger.error("Error in TTS generation: %s", e)
         # Return empty bytes if TTS fails
         return b""
\ No newline at end of file
@@ -0,0 +1,221 @@
+# backend/utils/turn_scheduler.py
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Scheduling settings (override via environment)
+TURN_INBOX_SIZE = int(os.getenv("TURN_INBOX_SIZE", "4"))
+# Cancel the reply in flight as soon as a newer utterance turns out to contain speech
+TURN_BARGE_IN = os.getenv("TURN_BARGE_IN", "1") == "1"
+
+
+class Turn:
+    """
+    One reply to the user: the (possibly coalesced) transcript it answers,
+    plus the reply sentences the client has already been sent.
+    """
+    __slots__ = ("text", "utterances", "spoken")
+
+    def __init__(self, text: str, utterances: int):
+        self.text = text
+        self.utterances = utterances
+        self.spoken: List[str] = []
+
+
+class TurnScheduler:
+    """
+    Runs a session's turns one at a time in the background so the receive
+    loop never blocks on a reply.
+
+    Audio utterances start transcribing the moment they arrive. When one
+    yields speech while a reply is being generated, that reply is cancelled
+    (barge-in), which also cancels its upstream LLM and TTS requests.
+    Utterances that pile up behind a turn are coalesced into one transcript
+    instead of being answered one by one, and the text of a turn cut off
+    by barge-in before the client heard any of it is carried into the next
+    one, so nothing the user said is lost. The inbox is bounded; on overflow
+    its two oldest utterances are merged into one, never dropped.
+
+    respond(turn) generates and sends a reply. on_cancel(turn, reason) is
+    told about every turn that ends without a complete reply: "barge_in",
+    "stop", or "no_speech" when the utterances held no speech at all.
+    on_error(exc) is told about a turn that failed.
+    """
+
+    def __init__(self, transcribe: Callable[[bytes], Awaitable[str]],
+                 respond: Callable[[Turn], Awaitable[None]],
+                 on_cancel: Optional[Callable[[Turn, str], Awaitable[None]]] = None,
+                 on_error: Optional[Callable[[Exception], Awaitable[None]]] = None,
+                 max_pending: int = TURN_INBOX_SIZE, barge_in: bool = TURN_BARGE_IN):
+        self.transcribe = transcribe
+        self.respond = respond
+        self.on_cancel = on_cancel
+        self.on_error = on_error
+        self.max_pending = max(1, max_pending)
+        self.barge_in = barge_in
+        self._pending: Deque[asyncio.Future] = deque()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._current: Optional[asyncio.Task] = None
+        self._cancel_reason: Optional[str] = None
+        # Transcripts still waiting for an answer, oldest first
+        self._carry: List[str] = []
+        self._collecting = False
+
+    @property
+    def busy(self) -> bool:
+        return self._current is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def idle(self) -> bool:
+        """Nothing queued, being transcribed or being answered."""
+        return self._current is None and not self._pending and not self._collecting and not self._carry
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    def submit_audio(self, audio_bytes: bytes):
+        """Queues a complete utterance; transcription starts right away."""
+        self._submit(asyncio.create_task(self.transcribe(audio_bytes)))
+
+    def submit_transcription(self, transcription: Awaitable[str]):
+        """Queues an utterance whose transcription is already under way (streaming STT)."""
+        self._submit(asyncio.ensure_future(transcription))
+
+    def submit_text(self, text: str):
+        """Queues an utterance that is already transcribed (streaming STT)."""
+        transcript = asyncio.get_running_loop().create_future()
+        transcript.set_result(text)
+        self._submit(transcript)
+
+    def stop(self) -> bool:
+        """
+        Cancels the reply in flight, e.g. on an explicit "stop" from the
+        client. Utterances already queued are still answered. Returns
+        whether there was anything to cancel.
+        """
+        return self._cancel_current("stop")
+
+    async def close(self):
+        """Cancels everything: the worker, the turn in flight and pending transcriptions."""
+        tasks = [t for t in (self._worker, self._current) if t is not None]
+        tasks.extend(self._pending)
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = self._current = None
+
+    def _submit(self, transcript: asyncio.Future):
+        self._pending.append(transcript)
+        if self.barge_in:
+            transcript.add_done_callback(self._on_transcript)
+        if len(self._pending) > self.max_pending:
+            # Dropping one could lose a crisis disclosure; they are answered together anyway
+            oldest = [self._pending.popleft(), self._pending.popleft()]
+            self._pending.appendleft(asyncio.ensure_future(self._merge(oldest)))
+            logger.warning("Turn inbox full (%s), merged the oldest pending utterances", self.max_pending)
+        self._wakeup.set()
+
+    def _on_transcript(self, transcript: asyncio.Future):
+        if transcript.cancelled() or transcript.exception() is not None:
+            return
+        if transcript.result().strip():
+            self._cancel_current("barge_in")
+
+    def _cancel_current(self, reason: str) -> bool:
+        if self._current is None or self._current.done() or self._cancel_reason:
+            return False
+        self._cancel_reason = reason
+        self._current.cancel()
+        return True
+
+    async def _merge(self, transcripts: List[asyncio.Future]) -> str:
+        """The transcripts as one, oldest first; failed or empty ones are skipped."""
+        texts = await self._gather(transcripts)
+        if len(texts) > 1:
+            metrics.UTTERANCES_COALESCED.inc(len(texts) - 1)
+        return " ".join(texts)
+
+    async def _collect(self) -> List[str]:
+        """Transcripts of everything pending, oldest first; failed or empty ones are skipped."""
+        batch = list(self._pending)
+        self._pending.clear()
+        return await self._gather(batch)
+
+    @staticmethod
+    async def _gather(transcripts: List[asyncio.Future]) -> List[str]:
+        texts = []
+        for result in await asyncio.gather(*transcripts, return_exceptions=True):
+            if isinstance(result, BaseException):
+                if not isinstance(result, asyncio.CancelledError):
+                    logger.error("Transcription failed: %s", result)
+                continue
+            if result and result.strip():
+                texts.append(result.strip())
+        return texts
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            batch_size = len(self._pending)
+            self._collecting = True
+            try:
+                self._carry.extend(await self._collect())
+            finally:
+                self._collecting = False
+            if self._pending:
+                # More speech arrived while transcribing: answer it all at once
+                self._wakeup.set()
+                continue
+            if not self._carry:
+                if batch_size:
+                    # Tell the client it isn't getting a reply rather than leave it waiting
+                    await self._notify(self.on_cancel, Turn("", batch_size), "no_speech")
+                continue
+            if len(self._carry) > 1:
+                metrics.UTTERANCES_COALESCED.inc(len(self._carry) - 1)
+            turn = Turn(" ".join(self._carry), len(self._carry))
+            self._carry = []
+
+            self._cancel_reason = None
+            self._current = asyncio.create_task(self.respond(turn))
+            # asyncio.wait doesn't propagate the turn's cancellation into the worker
+            await asyncio.wait([self._current])
+            current, self._current = self._current, None
+
+            if current.cancelled():
+                reason = self._cancel_reason or "cancelled"
+                metrics.TURNS_CANCELLED.labels(reason).inc()
+                logger.info("Turn cancelled (%s) after %s spoken sentence(s)", reason, len(turn.spoken))
+                if reason == "barge_in" and not turn.spoken:
+                    # The client heard nothing, so the question is still open. Not
+                    # after a "stop": the user doesn't want it answered.
+                    self._carry.insert(0, turn.text)
+                await self._notify(self.on_cancel, turn, reason)
+            elif current.exception() is not None:
+                logger.error("Turn failed: %s", current.exception())
+                await self._notify(self.on_error, current.exception())
+            self._cancel_reason = None
+
+    async def _notify(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            await callback(*args)
+        except Exception as e:
+            logger.warning("Turn callback failed: %s", e)
@@ -0,0 +1,95 @@
+# backend/utils/ws_protocol.py
+"""
+Wire protocol for the /ws endpoint.
+
+Version 1 (legacy, default): replies are text frames. A full reply is a
+JSON object {"text": ..., "audio": <base64 WAV>}; streamed replies are
+{"type": "segment", "seq": n, "text": ..., "audio": <base64>} messages.
+
+Version 2 (opt-in with {"type": "hello", "protocol": 2}): every audio
+segment is announced by a small JSON text frame
+
+    {"type": "audio", "turn": t, "seq": n, "text": ..., "format": "wav", "bytes": len}
+
+and immediately followed by one binary frame carrying the raw audio:
+
+    +---------+-----------------+------------------+
+    | version | seq (uint32 BE) | audio bytes ...  |
+    |  1 byte |     4 bytes     |                  |
+    +---------+-----------------+------------------+
+
+A turn always ends with {"type": "turn_end", "turn": t, "text": ..., "segments": k}.
+"""
+import struct
+
+LEGACY_PROTOCOL = 1
+BINARY_PROTOCOL = 2
+SUPPORTED_PROTOCOLS = (LEGACY_PROTOCOL, BINARY_PROTOCOL)
+
+FRAME_HEADER = struct.Struct(">BI")
+
+
+def negotiate_protocol(requested) -> int:
+    """
+    Picks the protocol version to use for a client's requested version,
+    falling back to the legacy JSON format for anything unknown.
+    """
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return LEGACY_PROTOCOL
+    if requested in SUPPORTED_PROTOCOLS:
+        return requested
+    if requested > max(SUPPORTED_PROTOCOLS):
+        # Newer client: speak the newest version we know
+        return max(SUPPORTED_PROTOCOLS)
+    return LEGACY_PROTOCOL
+
+
+def pack_audio_frame(seq: int, audio_bytes: bytes) -> bytes:
+    """
+    Prefixes raw audio with the binary frame header.
+    """
+    return FRAME_HEADER.pack(BINARY_PROTOCOL, seq & 0xFFFFFFFF) + audio_bytes
+
+
+def unpack_audio_frame(frame: bytes):
+    """
+    Splits a binary frame into (version, seq, audio). The audio part is a
+    memoryview so large payloads are not copied.
+    """
+    version, seq = FRAME_HEADER.unpack_from(frame)
+    return version, seq, memoryview(frame)[FRAME_HEADER.size:]
+
+
+def guess_audio_format(audio_bytes: bytes) -> str:
+    """
+    Identifies the container of synthesized audio from its magic bytes,
+    since TTS backends differ (Groq and Coqui: WAV, ElevenLabs and Google: MP3).
+    Also knows what browsers record (WebM, MP4) for naming STT uploads.
+    """
+    head = bytes(audio_bytes[:12])
+    if head.startswith(b"RIFF"):
+        return "wav"
+    if head.startswith(b"OggS"):
+        return "ogg"
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head.startswith(b"\x1aE\xdf\xa3"):
+        return "webm"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head.startswith(b"ID3") or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mpeg"
+    return "wav"
+
+
+def audio_message(turn: int, seq: int, text: str, audio_format: str, size: int) -> dict:
+    return {
+        "type": "audio",
+        "turn": turn,
+        "seq": seq,
+        "text": text,
+        "format": audio_format,
+        "bytes": size,
+    }
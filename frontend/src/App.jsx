@@ -11,17 +11,42 @@ function App() {
   const websocketRef = useRef(null);
   const audioRef = useRef(null);
 
+  // Streamed reply segments waiting to be played, in order
+  const segmentQueueRef = useRef([]);
+  const segmentPlayingRef = useRef(false);
+  const turnEndedRef = useRef(true);
+  // Metadata for binary audio frames, keyed by frame sequence id
+  const pendingFramesRef = useRef(new Map());
+
+  // Binary frame header: 1 byte protocol version + 4 byte big-endian sequence id
+  const FRAME_HEADER_BYTES = 5;
+
+  // Reply audio formats this browser can play, most compact first
+  const playableFormats = () => {
+    const probe = document.createElement('audio');
+    const candidates = [
+      ['opus', 'audio/ogg; codecs="opus"'],
+      ['mp3', 'audio/mpeg'],
+      ['wav', 'audio/wav'],
+    ];
+    return candidates.filter(([, mime]) => probe.canPlayType(mime) !== '').map(([name]) => name);
+  };
+
+  // Convert base64 audio from the server to a playable blob
+  const base64ToBlob = (base64Audio, format = 'wav') => {
+    const byteCharacters = atob(base64Audio);
+    const byteArray = new Uint8Array(byteCharacters.length);
+    for (let i = 0; i < byteCharacters.length; i++) {
+      byteArray[i] = byteCharacters.charCodeAt(i);
+    }
+    return new Blob([byteArray], { type: `audio/${format}` });
+  };
+
   // Function to play audio from base64 data
-  const playAudio = (base64Audio) => {
+  const playAudio = (base64Audio, format) => {
     try {
       // Convert base64 to audio blob
-      const byteCharacters = atob(base64Audio);
-      const byteNumbers = new Array(byteCharacters.length);
-      for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
-      }
-      const byteArray = new Uint8Array(byteNumbers);
-      const audioBlob = new Blob([byteArray], { type: 'audio/wav' });
+      const audioBlob = base64ToBlob(base64Audio, format);
       
       // Create audio URL and play
       const audioUrl = URL.createObjectURL(audioBlob);
@@ -63,6 +88,68 @@ function App() {
     }
   };
 
+  // Play the next streamed segment, or finish the turn once all have played
+  const playNextSegment = () => {
+    const next = segmentQueueRef.current.shift();
+    if (!next) {
+      segmentPlayingRef.current = false;
+      if (turnEndedRef.current) {
+        setStatus('Ready to listen');
+        setIsProcessing(false);
+      }
+      return;
+    }
+
+    segmentPlayingRef.current = true;
+    const audioUrl = URL.createObjectURL(next);
+    const audio = new Audio(audioUrl);
+    audioRef.current = audio;
+
+    audio.onplay = () => {
+      setStatus('AI is speaking...');
+      setIsProcessing(true);
+    };
+    audio.onended = () => {
+      URL.revokeObjectURL(audioUrl);
+      playNextSegment();
+    };
+    audio.onerror = (error) => {
+      console.error('Segment playback error:', error);
+      URL.revokeObjectURL(audioUrl);
+      playNextSegment();
+    };
+    audio.play();
+  };
+
+  const enqueueSegment = (audioBlob) => {
+    segmentQueueRef.current.push(audioBlob);
+    if (!segmentPlayingRef.current) {
+      playNextSegment();
+    }
+  };
+
+  // Drop whatever is playing or queued from the current reply
+  const stopPlayback = () => {
+    segmentQueueRef.current = [];
+    pendingFramesRef.current.clear();
+    segmentPlayingRef.current = false;
+    turnEndedRef.current = true;
+    if (audioRef.current) {
+      audioRef.current.onended = null;
+      audioRef.current.pause();
+    }
+  };
+
+  // Cut the AI off: stop local playback and cancel the reply on the server
+  const interruptReply = () => {
+    stopPlayback();
+    if (websocketRef.current && websocketRef.current.readyState === WebSocket.OPEN) {
+      websocketRef.current.send(JSON.stringify({ type: 'stop' }));
+    }
+    setIsProcessing(false);
+    setStatus('Ready to listen');
+  };
+
   // Add useEffect to handle WebSocket connection
   useEffect(() => {
     // Function to connect to the WebSocket
@@ -71,23 +158,73 @@ function App() {
         // Connect to the correct WebSocket endpoint
         const backendUrl = import.meta.env.VITE_WS_URL || 'wss://astra-backend-4phc.onrender.com/ws';
         const socket = new WebSocket(backendUrl);
+        socket.binaryType = 'arraybuffer';
         websocketRef.current = socket;
 
         socket.onopen = () => {
           console.log('WebSocket connection established');
+          // Ask for streamed, sentence-by-sentence replies as binary audio frames,
+          // compressed to the smallest format this browser can play, and pick
+          // up the conversation from before a reload or dropped connection
+          socket.send(JSON.stringify({
+            type: 'hello',
+            protocol: 2,
+            stream: true,
+            formats: playableFormats(),
+            session: sessionStorage.getItem('astraSession'),
+          }));
           setStatus('Ready to listen');
         };
 
         socket.onmessage = async (event) => {
+          if (event.data instanceof ArrayBuffer) {
+            // Raw audio frame announced by a preceding "audio" message
+            const view = new DataView(event.data);
+            const seq = view.getUint32(1);
+            const meta = pendingFramesRef.current.get(seq);
+            pendingFramesRef.current.delete(seq);
+            const format = meta ? meta.format : 'wav';
+            enqueueSegment(new Blob([event.data.slice(FRAME_HEADER_BYTES)], { type: `audio/${format}` }));
+            return;
+          }
+
           console.log('Received from server:', event.data);
           
           try {
             // Try to parse as JSON (which contains audio)
             const data = JSON.parse(event.data);
-            if (data.text && data.audio) {
+            if (data.type === 'hello') {
+              console.log('Server accepted hello:', data);
+              if (data.session) {
+                sessionStorage.setItem('astraSession', data.session);
+              }
+            } else if (data.type === 'audio') {
+              turnEndedRef.current = false;
+              pendingFramesRef.current.set(data.seq, data);
+              setStatus(`AI: ${data.text}`);
+            } else if (data.type === 'segment') {
+              turnEndedRef.current = false;
+              setStatus(`AI: ${data.text}`);
+              if (data.audio) {
+                enqueueSegment(base64ToBlob(data.audio, data.format));
+              }
+            } else if (data.type === 'turn_end') {
+              turnEndedRef.current = true;
+              setStatus(data.crisis ? `CRISIS: ${data.text}` : `AI: ${data.text}`);
+              if (!segmentPlayingRef.current) {
+                setIsProcessing(false); // Nothing left to play
+              }
+            } else if (data.type === 'turn_cancelled') {
+              // Superseded by a newer utterance, stopped, or nothing was heard
+              stopPlayback();
+              if (data.reason === 'no_speech') {
+                setStatus("Didn't catch that. Please try again.");
+                setIsProcessing(false);
+              }
+            } else if (data.text && data.audio) {
               setStatus(`AI: ${data.text}`);
               // Play the audio
-              playAudio(data.audio);
+              playAudio(data.audio, data.format);
             }
           } catch {
             // Fallback to text-only handling
@@ -256,11 +393,10 @@ return (
     <div className="status">{status}</div>
     <button
       className={`mic-button ${isRecording ? 'recording' : ''}`}
-      onClick={isRecording ? stopRecording : startRecording}
-      disabled={isProcessing || status.includes('speaking')}
+      onClick={isRecording ? stopRecording : (isProcessing || status.includes('speaking')) ? interruptReply : startRecording}
     >
-      {isProcessing ? '🔄 Processing' : 
-       status.includes('speaking') ? '🔊 AI Speaking' :
+      {status.includes('speaking') ? '✋ Interrupt' :
+       isProcessing ? '🔄 Processing' :
        isRecording ? '⏹️ Stop' : '🎤 Start Talking'}
     </button>
     <PrivacyNotice />